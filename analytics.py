@@ -0,0 +1,95 @@
+"""Agregados vectorizados sobre las carteras filtradas"""
+import numpy as np
+import pandas as pd
+
+from data_loader import ACTIVITY_TYPES
+
+
+def _segment_starts(counts):
+    """Índice de inicio de cada segmento contiguo dado su tamaño"""
+    starts = np.zeros(len(counts), dtype=np.int64)
+    np.cumsum(counts[:-1], out=starts[1:])
+    return starts
+
+
+def top_k_per_group(frame, k, group_col='Investor', sort_col='% of Portfolio', groups=None):
+    """Las k filas de mayor `sort_col` de cada grupo, en una sola operación vectorizada
+
+    Con `groups` solo se devuelven esos grupos y en ese orden; si no, en el orden
+    de las categorías. Los empates se resuelven como nlargest(keep='first').
+    """
+    if groups is None:
+        codes = frame[group_col].cat.codes.to_numpy()
+    else:
+        # Position of each category among the requested groups (-1 if not requested),
+        # looked up by code; the trailing -1 slot maps missing values (code -1)
+        wanted = pd.Index(pd.unique(pd.Index(groups)))
+        lookup = np.append(wanted.get_indexer(frame[group_col].cat.categories), -1)
+        codes = lookup[frame[group_col].cat.codes.to_numpy()]
+    values = frame[sort_col].to_numpy(dtype=np.float64)
+
+    # Rows outside the requested groups and missing values never make the cut
+    candidates = np.flatnonzero((codes >= 0) & ~np.isnan(values))
+    order = candidates[np.lexsort((-values[candidates], codes[candidates]))]
+
+    group_sorted = codes[order]
+    sizes = np.bincount(group_sorted, minlength=group_sorted.max() + 1 if len(order) else 0)
+    rank = np.arange(len(order)) - _segment_starts(sizes)[group_sorted]
+
+    return frame.iloc[order[rank < k]]
+
+
+def top_k(scores, k):
+    """Posiciones de los k mayores valores, de mayor a menor (empates: menor posición primero)"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+
+    # argpartition finds the k-th largest in O(n); every value tied with it stays a
+    # candidate so ties resolve by position, not by where the partition left them
+    kth = scores[np.argpartition(-scores, k - 1)[k - 1]]
+    candidates = np.flatnonzero(scores >= kth)
+    return candidates[np.lexsort((candidates, -scores[candidates]))][:k]
+
+
+def investor_metrics(frame):
+    """Tabla de métricas por inversor calculada en una sola pasada"""
+    investors = frame['Investor'].cat.categories
+    n_investors = len(investors)
+    n_stocks = max(len(frame['Stock'].cat.categories), 1)
+    investor_codes = frame['Investor'].cat.codes.to_numpy().astype(np.int64)
+    stock_codes = frame['Stock'].cat.codes.to_numpy().astype(np.int64)
+    weights = np.nan_to_num(frame['% of Portfolio'].to_numpy(dtype=np.float64))
+    values = np.nan_to_num(frame['Value_Clean'].to_numpy(dtype=np.float64))
+    activity_codes = pd.Categorical(frame['Activity_Type'], categories=ACTIVITY_TYPES).codes.astype(np.int64)
+
+    # Stable sort by investor, then weight descending: the rank inside each
+    # segment is what nlargest(k) would have picked
+    order = np.lexsort((-weights, investor_codes))
+    investor_sorted, weight_sorted = investor_codes[order], weights[order]
+    positions = np.bincount(investor_sorted, minlength=n_investors)
+    rank = np.arange(len(order)) - _segment_starts(positions)[investor_sorted]
+
+    def per_investor(data):
+        return np.bincount(investor_sorted, weights=data, minlength=n_investors)
+
+    weight_sum = per_investor(weight_sorted)
+    unique_pairs = np.unique(investor_codes * n_stocks + stock_codes)
+    activity_mix = np.bincount(
+        investor_codes * len(ACTIVITY_TYPES) + activity_codes, minlength=n_investors * len(ACTIVITY_TYPES)
+    ).reshape(n_investors, len(ACTIVITY_TYPES))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        metrics = pd.DataFrame({
+            'Posiciones': positions,
+            'Num_Acciones': np.bincount(unique_pairs // n_stocks, minlength=n_investors),
+            'Valor_Total': per_investor(values[order]),
+            'Top1': per_investor(np.where(rank == 0, weight_sorted, 0)),
+            'Concentracion_Top5': per_investor(np.where(rank < 5, weight_sorted, 0)),
+            'HHI': per_investor(weight_sorted ** 2),
+            'Peso_Promedio': weight_sum / positions,
+            'Ratio_Compra': (activity_mix[:, 0] + activity_mix[:, 1]) / positions * 100,
+            **{activity: activity_mix[:, i] for i, activity in enumerate(ACTIVITY_TYPES)},
+        }, index=pd.Index(investors, name='Investor'))
+
+    return metrics[positions > 0]
@@ -0,0 +1,296 @@
+"""Benchmarks de las etapas de datos del dashboard
+
+Uso: python benchmark.py {parse,memory,topk,similarity,minhash,sunburst}
+"""
+import argparse
+import re
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+from analytics import top_k_per_group
+from data_loader import CSV_PATH, clean_holdings, parse_holdings
+from hierarchy import sunburst_hierarchy
+from holdings_store import HoldingsStore
+from minhash import MinHashSignatures, lsh_bands
+from similarity import SIMILARITY_METRICS, common_holdings, overlap_pairs, similarity_matrix
+
+
+def _timeit(func, repeat=3):
+    """Mejor tiempo de `repeat` ejecuciones, en segundos"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _scaled_raw(rows, distinct=False):
+    """CSV de ejemplo repetido hasta `rows` filas
+
+    Con distinct=True cada copia renombra inversores, tickers y porcentajes de
+    actividad, de modo que los valores distintos crecen con el número de filas.
+    """
+    raw = pd.read_csv(CSV_PATH)
+    reps = -(-rows // len(raw))
+    if not distinct:
+        return pd.concat([raw] * reps, ignore_index=True).iloc[:rows]
+
+    copies = []
+    for copy in range(reps):
+        clone = raw.copy()
+        clone['Investor'] = clone['Investor'] + f" #{copy}"
+        clone['Stock'] = f"{copy}" + clone['Stock']
+        # "Add 2.61%" -> "Add 2.61<copy>%": a new string that still parses
+        clone['RecentActivity'] = clone['RecentActivity'].str.replace('%', f"{copy}%", regex=False)
+        copies.append(clone)
+    return pd.concat(copies, ignore_index=True).iloc[:rows]
+
+
+def _universe(n_investors, keep=1.0, seed=0):
+    """Universo limpio con `n_investors` inversores, clonando las carteras del CSV
+
+    Con keep < 1 cada clon conserva solo esa fracción (aleatoria) de sus posiciones,
+    para que los clones se parezcan sin ser idénticos.
+    """
+    raw = pd.read_csv(CSV_PATH)
+    rng = np.random.default_rng(seed)
+    copies = []
+    for copy in range(-(-n_investors // raw['Investor'].nunique())):
+        clone = raw[rng.random(len(raw)) < keep].copy() if keep < 1 else raw.copy()
+        clone['Investor'] = clone['Investor'] + f" #{copy}"
+        copies.append(clone)
+    universe = pd.concat(copies, ignore_index=True)
+    keep = universe['Investor'].isin(universe['Investor'].unique()[:n_investors])
+    return clean_holdings(universe[keep].reset_index(drop=True))
+
+
+def legacy_parse(df):
+    """Parser fila a fila original de load_data(), conservado como referencia"""
+    df['Activity_Type'] = df['RecentActivity'].apply(lambda x:
+        'Mantener' if pd.isna(x) else
+        'Compra' if x == 'Buy' else
+        'Añadir' if 'Add' in str(x) else
+        'Reducir' if 'Reduce' in str(x) else
+        'Mantener'
+    )
+    df['Activity_Percentage'] = df['RecentActivity'].apply(lambda x:
+        float(re.findall(r'[\d.]+', str(x))[0]) if pd.notna(x) and re.findall(r'[\d.]+', str(x)) else 0
+    )
+    df['Ticker'] = df['Stock'].apply(lambda x: x.split(' - ')[0] if pd.notna(x) and ' - ' in x else x)
+    df['Company'] = df['Stock'].apply(lambda x: x.split(' - ')[1] if pd.notna(x) and ' - ' in x else x)
+    return df
+
+
+def bench_parse(sizes):
+    print(f"{'filas':>10} {'distintos':>10} {'apply (µs/fila)':>16} {'vectorizado (µs/fila)':>22} {'speedup':>8}")
+    # Tiling the CSV keeps ~3.7k distinct strings, which favours the factorized
+    # path; the distinct case grows them with the row count instead
+    for rows, distinct in [(rows, distinct) for rows in sizes for distinct in (False, True)]:
+        raw = _scaled_raw(rows, distinct)
+        n_distinct = raw['Stock'].nunique() + raw['RecentActivity'].nunique()
+        cols = ['Activity_Type', 'Activity_Percentage', 'Ticker', 'Company']
+
+        expected = legacy_parse(raw.copy())[cols]
+        result = parse_holdings(raw.copy())[cols]
+        for col in cols:
+            assert np.array_equal(expected[col].to_numpy(), result[col].to_numpy()), col
+
+        repeat = 3 if rows <= 100_000 else 1
+        t_legacy = _timeit(lambda: legacy_parse(raw.copy()), repeat)
+        t_vector = _timeit(lambda: parse_holdings(raw.copy()), repeat)
+        print(f"{rows:>10,} {n_distinct:>10,} {t_legacy / rows * 1e6:>16.3f} {t_vector / rows * 1e6:>22.3f} "
+              f"{t_legacy / t_vector:>7.1f}x")
+
+
+def bench_memory(sizes):
+    for rows in sizes:
+        raw = _scaled_raw(rows)
+        wide = clean_holdings(raw.copy(), compact=False)
+        compact = clean_holdings(raw.copy())
+
+        before = wide.memory_usage(deep=True, index=False)
+        after = compact.memory_usage(deep=True, index=False)
+        print(f"\n{rows:,} filas: {before.sum() / rows:,.1f} -> {after.sum() / rows:,.1f} bytes/fila "
+              f"({before.sum() / after.sum():.1f}x)")
+        print(f"{'columna':>22} {'antes':>10} {'después':>10}  dtype")
+        for col in before.index:
+            if col in after.index:
+                print(f"{col:>22} {before[col] / rows:>10.1f} {after[col] / rows:>10.1f}  {compact[col].dtype}")
+            else:
+                print(f"{col:>22} {before[col] / rows:>10.1f} {'-':>10}  (eliminada)")
+
+
+def bench_topk(investor_counts, k):
+    print(f"{'inversores':>10} {'filas':>8} {'bucle (ms)':>11} {'vectorizado (ms)':>17} {'speedup':>8}")
+    for n_investors in investor_counts:
+        frame = _universe(n_investors)
+        investors = list(frame['Investor'].unique())
+
+        def loop():
+            return pd.concat([frame[frame['Investor'] == investor].nlargest(k, '% of Portfolio')
+                              for investor in investors])
+
+        expected = loop()
+        result = top_k_per_group(frame, k, groups=investors)
+        assert expected.index.equals(result.index)
+
+        t_loop = _timeit(loop, 1 if n_investors > 200 else 3)
+        t_vector = _timeit(lambda: top_k_per_group(frame, k, groups=investors))
+        print(f"{n_investors:>10,} {len(frame):>8,} {t_loop * 1e3:>11.1f} {t_vector * 1e3:>17.2f} {t_loop / t_vector:>7.0f}x")
+
+
+def bench_similarity(investor_counts, min_common):
+    metrics = list(SIMILARITY_METRICS)
+    print(f"{'inversores':>10} {'pivot+corr (ms)':>16} " + " ".join(f"{m + ' (ms)':>22}" for m in metrics))
+    for n_investors in investor_counts:
+        matrix = HoldingsStore(_universe(n_investors), 'bench').matrix
+        investors = list(matrix.investors)
+
+        def legacy():
+            pivot = matrix.pivot(investors)
+            counts = (pivot > 0).sum(axis=1)
+            return pivot.loc[counts[counts >= min_common].index].corr()
+
+        # The dense path is only run where it still fits comfortably in memory
+        t_legacy = float('nan')
+        if n_investors <= 1_000:
+            expected = legacy()
+            result = similarity_matrix(matrix, investors, 'pearson', min_common)
+            assert np.allclose(expected.to_numpy(), result.to_numpy(), atol=1e-9, equal_nan=True)
+            t_legacy = _timeit(legacy, 1)
+
+        times = [_timeit(lambda: similarity_matrix(matrix, investors, metric, min_common), 1) for metric in metrics]
+        print(f"{n_investors:>10,} {t_legacy * 1e3:>16.1f} " + " ".join(f"{t * 1e3:>22.1f}" for t in times))
+
+
+def bench_minhash(perms, thresholds, investor_counts, query_threshold):
+    # Exactness on the shipped CSV against plain set intersections, as the views did them
+    store = HoldingsStore(clean_holdings(pd.read_csv(CSV_PATH)), 'bench')
+    holdings = {investor: set(group['Stock']) for investor, group in store.frame.groupby('Investor', observed=True)}
+    rows = store.matrix.investor_codes(list(holdings))
+    names = store.investors[rows]
+    pairs = [(a, b) for a in range(len(rows)) for b in range(a + 1, len(rows))]
+    exact = np.array([len(holdings[names[a]] & holdings[names[b]]) / len(holdings[names[a]] | holdings[names[b]])
+                      for a, b in pairs])
+    left, right = np.array(pairs).T
+
+    print(f"{'firma':>6} {'umbral':>7} {'bandas':>9} {'error medio':>12} {'pares reales':>13} {'recall':>7} {'precisión':>10}")
+    for num_perm in perms:
+        signatures = MinHashSignatures(store.matrix.ownership, num_perm)
+        error = np.abs(signatures.jaccard(rows[left], rows[right]) - exact).mean()
+        # The estimator's standard error is at most 0.5/sqrt(num_perm)
+        assert error <= 1 / np.sqrt(num_perm), error
+        for threshold in thresholds:
+            if lsh_bands(num_perm, threshold) is None:
+                print(f"{num_perm:>6} {threshold:>7.2f} {'exacto':>9} {error:>12.4f}")
+                continue
+            bands, band_rows = lsh_bands(num_perm, threshold)
+            i, j, _, _ = signatures.similar_pairs(rows, threshold)
+            found = set(zip(i.tolist(), j.tolist()))
+            truth = {pair for pair, jaccard in zip(pairs, exact) if jaccard >= threshold}
+            hits = len(found & truth)
+            recall = hits / len(truth) if truth else float('nan')
+            precision = hits / len(found) if found else float('nan')
+            print(f"{num_perm:>6} {threshold:>7.2f} {bands:>4}x{band_rows:<4} {error:>12.4f} {len(truth):>13} "
+                  f"{recall:>7.2f} {precision:>10.2f}")
+
+    # Scale: clones keep half their positions so same-origin pairs sit near J = 1/3
+    print(f"\n{'inversores':>10} {'exacto B·Bᵀ (ms)':>17} {'firmas (ms)':>12} {'LSH J>=' + str(query_threshold) + ' (ms)':>16} {'pares':>8}")
+    for n_investors in investor_counts:
+        ownership = HoldingsStore(_universe(n_investors, keep=0.5), 'bench').matrix.ownership
+        everyone = np.arange(ownership.shape[0])
+        t_exact = _timeit(lambda: overlap_pairs(common_holdings(ownership), 1), 1)
+        t_build = _timeit(lambda: MinHashSignatures(ownership, perms[0]), 1)
+        signatures = MinHashSignatures(ownership, perms[0])
+        t_query = _timeit(lambda: signatures.similar_pairs(everyone, query_threshold), 1)
+        found = len(signatures.similar_pairs(everyone, query_threshold)[0])
+        print(f"{n_investors:>10,} {t_exact * 1e3:>17.1f} {t_build * 1e3:>12.1f} {t_query * 1e3:>16.1f} {found:>8,}")
+
+
+def bench_sunburst(investor_counts, k):
+    print(f"{'inversores':>10} {'nodos':>7} {'px.sunburst (ms)':>17} {'jerarquía (ms)':>15} {'go.Sunburst (ms)':>17} {'speedup':>8}")
+    for n_investors in investor_counts:
+        frame = _universe(n_investors)
+        top = top_k_per_group(frame, k, groups=list(frame['Investor'].unique()))
+
+        def legacy():
+            # The view's former path: string groups via apply, then px builds the rings
+            grouped = top.assign(
+                Activity_Group=top['Activity_Type'].apply(
+                    lambda x: '🟢 Comprando' if x in ['Compra', 'Añadir'] else '🔴 Vendiendo' if x == 'Reducir' else '⚪ Manteniendo'),
+                Display_Value=top['% of Portfolio'])
+            return px.sunburst(grouped, path=['Investor', 'Activity_Group', 'Stock'], values='Display_Value',
+                               color='% of Portfolio', custom_data=['Value', 'Shares', 'RecentActivity'])
+
+        def direct(nodes):
+            return go.Figure(go.Sunburst(ids=nodes['ids'], parents=nodes['parents'], labels=nodes['labels'],
+                                         values=nodes['values'], branchvalues='total',
+                                         marker=dict(colors=nodes['colors'], coloraxis='coloraxis'),
+                                         customdata=nodes[['Value', 'Shares', 'RecentActivity']]))
+
+        trace = legacy().data[0]
+        nodes = sunburst_hierarchy(top)
+        expected = pd.DataFrame({'parents': trace.parents, 'values': trace.values,
+                                 'colors': trace.marker.colors}, index=trace.ids).sort_index()
+        result = nodes.set_index('ids').sort_index()
+        assert expected.index.equals(result.index) and (expected['parents'] == result['parents']).all()
+        assert np.allclose(expected['values'].astype(float), result['values'])
+        assert np.allclose(expected['colors'].astype(float), result['colors'], equal_nan=True)
+
+        t_legacy = _timeit(legacy, 1)
+        t_nodes = _timeit(lambda: sunburst_hierarchy(top))
+        t_figure = _timeit(lambda: direct(nodes))
+        print(f"{n_investors:>10,} {len(nodes):>7,} {t_legacy * 1e3:>17.1f} {t_nodes * 1e3:>15.1f} {t_figure * 1e3:>17.1f} "
+              f"{t_legacy / (t_nodes + t_figure):>7.0f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest='bench', required=True)
+
+    parse = sub.add_parser('parse', help='parser de actividad/ticker: apply vs vectorizado')
+    parse.add_argument('--sizes', type=int, nargs='+', default=[3_690, 100_000, 1_000_000])
+
+    memory = sub.add_parser('memory', help='bytes por fila del DataFrame antes/después de compactar')
+    memory.add_argument('--sizes', type=int, nargs='+', default=[3_690, 100_000])
+
+    topk = sub.add_parser('topk', help='top-k por inversor: bucle nlargest vs top_k_per_group')
+    topk.add_argument('--investors', type=int, nargs='+', default=[20, 200, 2_000])
+    topk.add_argument('-k', type=int, default=15)
+
+    similarity = sub.add_parser('similarity', help='matriz de similitud: pivot+corr denso vs motor disperso')
+    similarity.add_argument('--investors', type=int, nargs='+', default=[81, 1_000, 5_000])
+    similarity.add_argument('--min-common', type=int, default=1)
+
+    minhash = sub.add_parser('minhash', help='MinHash/LSH: exactitud frente a conjuntos y tiempos')
+    minhash.add_argument('--perms', type=int, nargs='+', default=[64, 128, 256])
+    minhash.add_argument('--thresholds', type=float, nargs='+', default=[0.2, 0.3, 0.5])
+    minhash.add_argument('--investors', type=int, nargs='+', default=[81, 1_000, 5_000])
+    minhash.add_argument('--query-threshold', type=float, default=0.5)
+
+    sunburst = sub.add_parser('sunburst', help='anillos del sunburst: px.sunburst vs jerarquía desde códigos')
+    sunburst.add_argument('--investors', type=int, nargs='+', default=[20, 200])
+    sunburst.add_argument('-k', type=int, default=15)
+
+    args = parser.parse_args()
+    if args.bench == 'parse':
+        bench_parse(args.sizes)
+    elif args.bench == 'memory':
+        bench_memory(args.sizes)
+    elif args.bench == 'topk':
+        bench_topk(args.investors, args.k)
+    elif args.bench == 'similarity':
+        bench_similarity(args.investors, args.min_common)
+    elif args.bench == 'minhash':
+        bench_minhash(args.perms, args.thresholds, args.investors, args.query_threshold)
+    elif args.bench == 'sunburst':
+        bench_sunburst(args.investors, args.k)
+
+
+if __name__ == '__main__':
+    main()
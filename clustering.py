@@ -0,0 +1,48 @@
+"""Agrupamiento jerárquico de inversores sobre una matriz de similitud"""
+import numpy as np
+import pandas as pd
+from scipy.cluster import hierarchy
+from scipy.spatial.distance import squareform
+
+
+class InvestorClustering:
+    """Linkage de una matriz de similitud: orden de hojas del dendrograma y grupos
+
+    Se construye una vez por selección; reordenar otra matriz de los mismos inversores
+    o cortar el árbol en otro número de grupos no vuelve a calcular el linkage.
+    """
+
+    def __init__(self, similarity, method='average'):
+        self.investors = similarity.index
+        values = similarity.to_numpy(dtype=np.float64)
+
+        # Distance 1 - s (0..1, or 0..2 for Pearson); undefined pairs count as the farthest
+        distances = 1 - values
+        distances = np.where(np.isnan(distances), np.nanmax(distances, initial=1.0), distances)
+        distances = np.maximum((distances + distances.T) / 2, 0)
+        np.fill_diagonal(distances, 0)
+
+        if len(self.investors) >= 2:
+            condensed = squareform(distances, checks=False)
+            self.linkage = hierarchy.linkage(condensed, method=method)
+            self.linkage = hierarchy.optimal_leaf_ordering(self.linkage, condensed)
+            leaves = hierarchy.leaves_list(self.linkage)
+        else:
+            self.linkage = np.empty((0, 4))
+            leaves = np.arange(len(self.investors))
+        self.order = self.investors[leaves]
+
+    def reorder(self, matrix):
+        """Filas y columnas de `matrix` en el orden de hojas del dendrograma"""
+        order = self.order[self.order.isin(matrix.index)]
+        return matrix.loc[order, order]
+
+    def labels(self, n_clusters):
+        """Grupo de cada inversor en orden de hojas, numerados de izquierda a derecha desde 1"""
+        if len(self.linkage) == 0:
+            return pd.Series(1, index=self.order, name='Grupo')
+        clusters = hierarchy.fcluster(self.linkage, n_clusters, criterion='maxclust')
+        clusters = pd.Series(clusters, index=self.investors).loc[self.order]
+        # fcluster ids are arbitrary; renumber them as they appear along the leaves
+        first_seen = {cluster: i + 1 for i, cluster in enumerate(pd.unique(clusters))}
+        return clusters.map(first_seen).rename('Grupo')
@@ -0,0 +1,129 @@
+"""Cubo de agregados precalculado sobre (inversor | acción, actividad, tramo de peso)"""
+import numpy as np
+import pandas as pd
+
+from data_loader import ACTIVITY_TYPES
+
+# The sidebar slider moves in 0.5 steps from 0 to 50; bucket b holds weights in
+# [b * STEP, (b + 1) * STEP) and the last one everything from 50% up
+WEIGHT_STEP = 0.5
+WEIGHT_BUCKETS = 101
+
+
+def _suffix_sum(cells):
+    """Acumulado desde el último tramo de peso: la celda b agrega todos los pesos >= b * STEP"""
+    return np.flip(np.cumsum(np.flip(cells, axis=-1), axis=-1), axis=-1)
+
+
+def _suffix_max(cells):
+    return np.flip(np.maximum.accumulate(np.flip(cells, axis=-1), axis=-1), axis=-1)
+
+
+class HoldingsCube:
+    """Sumas por (inversor, actividad, tramo) y (acción, actividad, tramo) acumuladas a lo largo del peso
+
+    Cualquier combinación de actividades y peso mínimo del slider se responde sumando
+    unas pocas celdas, sin volver a filtrar ni agrupar las filas. Las posiciones se
+    cuentan por fila: HoldingsStore fusiona los pares inversor-acción repetidos al
+    cargar, así que cada fila es un titular distinto.
+    """
+
+    def __init__(self, frame):
+        self.investors = pd.Index(frame['Investor'].cat.categories, name='Investor')
+        self.stocks = pd.Index(frame['Stock'].cat.categories, name='Stock')
+
+        weights = frame['% of Portfolio'].to_numpy(dtype=np.float64)
+        activity = pd.Categorical(frame['Activity_Type'], categories=ACTIVITY_TYPES).codes.astype(np.int64)
+        investor_codes = frame['Investor'].cat.codes.to_numpy().astype(np.int64)
+        stock_codes = frame['Stock'].cat.codes.to_numpy().astype(np.int64)
+
+        # Rows without a weight never pass a ">= min_portfolio" filter, so they stay out
+        rows = np.flatnonzero((activity >= 0) & ~np.isnan(weights) & (investor_codes >= 0) & (stock_codes >= 0))
+        weights, activity = weights[rows], activity[rows]
+        buckets = np.clip(np.floor(weights / WEIGHT_STEP), 0, WEIGHT_BUCKETS - 1).astype(np.int64)
+        values = np.nan_to_num(frame['Value_Clean'].to_numpy(dtype=np.float64)[rows])
+        activity_pct = np.nan_to_num(frame['Activity_Percentage'].to_numpy(dtype=np.float64)[rows])
+
+        cell = activity * WEIGHT_BUCKETS + buckets
+        n_cells = len(ACTIVITY_TYPES) * WEIGHT_BUCKETS
+
+        def cube(codes, n_groups, data=None, dtype=np.float64):
+            flat = np.bincount(codes * n_cells + cell, weights=data, minlength=n_groups * n_cells)
+            return _suffix_sum(flat.reshape(n_groups, len(ACTIVITY_TYPES), WEIGHT_BUCKETS)).astype(dtype)
+
+        n_investors, n_stocks = len(self.investors), len(self.stocks)
+        investor_rows, stock_rows = investor_codes[rows], stock_codes[rows]
+
+        self.investor_positions = cube(investor_rows, n_investors, dtype=np.int32)
+        self.investor_value = cube(investor_rows, n_investors, values)
+        self.investor_weight = cube(investor_rows, n_investors, weights)
+        self.investor_weight_sq = cube(investor_rows, n_investors, weights ** 2)
+
+        self.stock_positions = cube(stock_rows, n_stocks, dtype=np.int32)
+        self.stock_value = cube(stock_rows, n_stocks, values)
+        self.stock_weight = cube(stock_rows, n_stocks, weights)
+        self.stock_activity_pct = cube(stock_rows, n_stocks, activity_pct)
+
+        # Max is not additive, but a suffix maximum answers ">= threshold" just the same
+        stock_max = np.full(n_stocks * n_cells, -np.inf)
+        np.maximum.at(stock_max, stock_rows * n_cells + cell, weights)
+        self.stock_weight_max = _suffix_max(stock_max.reshape(n_stocks, len(ACTIVITY_TYPES), WEIGHT_BUCKETS))
+
+    def _slice(self, activity_filter, min_portfolio):
+        """Índices de actividad y tramo que corresponden a un estado del sidebar"""
+        bucket = min_portfolio / WEIGHT_STEP
+        if bucket != int(bucket) or not 0 <= bucket < WEIGHT_BUCKETS:
+            raise ValueError(f"min_portfolio must be a multiple of {WEIGHT_STEP} between 0 and "
+                             f"{(WEIGHT_BUCKETS - 1) * WEIGHT_STEP}, got {min_portfolio}")
+        activities = [ACTIVITY_TYPES.index(a) for a in ACTIVITY_TYPES if a in activity_filter]
+        return activities, int(bucket)
+
+    def investor_totals(self, activity_filter, min_portfolio):
+        """Posiciones, valor, HHI, peso promedio y mezcla de actividad por inversor con posiciones"""
+        activities, bucket = self._slice(activity_filter, min_portfolio)
+        by_activity = self.investor_positions[:, :, bucket]
+        positions = by_activity[:, activities].sum(axis=1)
+        buys = by_activity[:, [a for a in activities if a < 2]].sum(axis=1)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            totals = pd.DataFrame({
+                'Posiciones': positions,
+                'Valor_Total': self.investor_value[:, activities, bucket].sum(axis=1),
+                'HHI': self.investor_weight_sq[:, activities, bucket].sum(axis=1),
+                'Peso_Promedio': self.investor_weight[:, activities, bucket].sum(axis=1) / positions,
+                'Ratio_Compra': buys / positions * 100,
+                **{activity: by_activity[:, i] * (i in activities) for i, activity in enumerate(ACTIVITY_TYPES)},
+            }, index=self.investors)
+
+        return totals[positions > 0]
+
+    def stock_totals(self, activity_filter, min_portfolio):
+        """Métricas por acción (inversores, valor, pesos, compras) del estado de filtros, leídas del cubo"""
+        activities, bucket = self._slice(activity_filter, min_portfolio)
+        positions = self.stock_positions[:, activities, bucket].sum(axis=1)
+        buys = self.stock_positions[:, [a for a in activities if a < 2], bucket].sum(axis=1)
+        weight_max = self.stock_weight_max[:, activities, bucket].max(axis=1, initial=-np.inf)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            totals = pd.DataFrame({
+                'Num_Inversores': positions,
+                'Valor_Total': self.stock_value[:, activities, bucket].sum(axis=1),
+                'Cartera_Promedio': self.stock_weight[:, activities, bucket].sum(axis=1) / positions,
+                'Cartera_Max': weight_max,
+                'Conteo_Compra_Añadir': buys,
+                'Actividad_Promedio': self.stock_activity_pct[:, activities, bucket].sum(axis=1) / positions,
+            }, index=self.stocks)
+
+        return totals[positions > 0]
+
+    def totals(self, activity_filter, min_portfolio):
+        """Cifras globales: inversores, acciones, posiciones, valor y posiciones de compra"""
+        activities, bucket = self._slice(activity_filter, min_portfolio)
+        investor_positions = self.investor_positions[:, :, bucket]
+        return {
+            'investors': int(np.count_nonzero(investor_positions[:, activities].sum(axis=1))),
+            'stocks': int(np.count_nonzero(self.stock_positions[:, activities, bucket].sum(axis=1))),
+            'positions': int(investor_positions[:, activities].sum()),
+            'value': float(self.investor_value[:, activities, bucket].sum()),
+            'buy_positions': int(investor_positions[:, [a for a in activities if a < 2]].sum()),
+        }
@@ -0,0 +1,252 @@
+"""Carga y limpieza de las carteras de Dataroma con caché columnar en disco"""
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+CSV_PATH = 'dataroma_holdings_complete.csv'
+SNAPSHOT_DIR = '.snapshots'
+
+# Bump whenever clean_holdings() changes its output so old snapshots are rebuilt
+SNAPSHOT_VERSION = 4
+
+ACTIVITY_TYPES = ['Compra', 'Añadir', 'Reducir', 'Mantener']
+
+# $/%-decorated CSV columns and the float column each one is parsed into
+PRICE_COLUMNS = {
+    'ReportedPrice*': 'Reported_Price',
+    'Current Price': 'Current_Price',
+    '+/-Reported Price': 'Reported_Change_Pct',
+    '52Week Low': 'Low_52W',
+    '52Week High': 'High_52W',
+}
+
+# Raw columns nothing reads once the frame is cleaned (prices live on as floats)
+DROPPED_COLUMNS = ['History', 'Unnamed: 7', 'Page', *PRICE_COLUMNS]
+
+# Low-cardinality text columns stored dictionary-encoded
+CATEGORY_COLUMNS = ['Investor', 'Stock', 'Ticker', 'Company', 'Activity_Type', 'RecentActivity']
+
+# Weights and percentages only need float32; prices and dollar values keep float64
+FLOAT32_COLUMNS = ['% of Portfolio', 'Activity_Percentage', 'Reported_Change_Pct',
+                   'Range_Position_52W', 'Unrealized_Move_Pct']
+
+
+def _to_number(values):
+    """Convertir textos como "$1,234.50" o "-3.2%" a float (NaN si no es numérico)"""
+    if values.dtype.kind in 'biuf':
+        return values.astype(float)
+    return pd.to_numeric(values.str.replace(r'[$,%]', '', regex=True), errors='coerce')
+
+
+def parse_prices(df):
+    """Normalizar las columnas de precios a float y derivar métricas de precio"""
+    for raw_col, clean_col in PRICE_COLUMNS.items():
+        if raw_col in df.columns:
+            df[clean_col] = _to_number(df[raw_col])
+        else:
+            df[clean_col] = np.nan
+
+    current = df['Current_Price']
+    low, high = df['Low_52W'], df['High_52W']
+
+    # Where the current price sits inside the 52-week range (0 = low, 100 = high)
+    span = (high - low).where(high > low)
+    df['Range_Position_52W'] = ((current - low) / span * 100).clip(0, 100)
+
+    # Move since the price the filer reported; fall back to Dataroma's own figure
+    move = (current / df['Reported_Price'].where(df['Reported_Price'] > 0) - 1) * 100
+    df['Unrealized_Move_Pct'] = move.fillna(df['Reported_Change_Pct'])
+
+    df['Market_Value'] = df['Shares'] * current
+
+    return df
+
+
+def _parse_activity(activity):
+    """Tipo y porcentaje de actividad para cada texto de RecentActivity"""
+    activity_text = activity.fillna('').astype(str)
+
+    # Same precedence as the old row-wise rules; NaN and anything unknown mean Hold
+    activity_type = np.select(
+        [
+            activity_text.eq('Buy'),
+            activity_text.str.contains('Add', regex=False),
+            activity_text.str.contains('Reduce', regex=False),
+        ],
+        ACTIVITY_TYPES[:3],
+        default='Mantener'
+    )
+
+    # First number in the activity text ("Add 3.06%" -> 3.06), 0 when there is none
+    activity_pct = pd.to_numeric(
+        activity_text.str.extract(r'([\d.]+)', expand=False), errors='coerce'
+    ).fillna(0).to_numpy()
+
+    return activity_type, activity_pct
+
+
+def _parse_stock(stock):
+    """Ticker y compañía de cada texto con formato TICKER - Compañía"""
+    parts = stock.str.split(' - ', n=2, expand=True)
+
+    # Names without the separator keep the raw value in both columns
+    has_separator = stock.str.contains(' - ', regex=False).fillna(False).astype(bool)
+    ticker = parts[0].where(has_separator, stock)
+    company = (parts[1] if 1 in parts.columns else stock).where(has_separator, stock)
+
+    return ticker.to_numpy(), company.to_numpy()
+
+
+def parse_holdings(df):
+    """Derivar Activity_Type, Activity_Percentage, Ticker y Company con operaciones vectorizadas"""
+    # Holdings files repeat the same few thousand strings, so the string kernels
+    # run once per distinct value and the results are broadcast back by code
+    activity_codes, activity_uniques = pd.factorize(df['RecentActivity'], use_na_sentinel=False)
+    activity_type, activity_pct = _parse_activity(pd.Series(activity_uniques, dtype=object))
+    df['Activity_Type'] = pd.Series(activity_type[activity_codes], index=df.index, dtype=str)
+    df['Activity_Percentage'] = activity_pct[activity_codes]
+
+    stock_codes, stock_uniques = pd.factorize(df['Stock'], use_na_sentinel=False)
+    ticker, company = _parse_stock(pd.Series(stock_uniques, dtype=object))
+    df['Ticker'] = pd.Series(ticker[stock_codes], index=df.index, dtype=df['Stock'].dtype)
+    df['Company'] = pd.Series(company[stock_codes], index=df.index, dtype=df['Stock'].dtype)
+
+    return df
+
+
+def compact_holdings(df):
+    """Reducir la memoria del DataFrame limpio: categorías, float32/int32 y sin columnas muertas"""
+    df = df.drop(columns=[col for col in DROPPED_COLUMNS if col in df.columns])
+
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            # Lexical categories keep sort_values() ordering identical to plain strings
+            df[col] = df[col].astype('category')
+
+    for col in FLOAT32_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype(np.float32)
+
+    # Share counts go to int32 only when every value fits (no NaN, below 2**31)
+    shares = df.get('Shares')
+    if shares is not None and shares.dtype.kind == 'i':
+        info = np.iinfo(np.int32)
+        if shares.empty or (shares.min() >= info.min and shares.max() <= info.max):
+            df['Shares'] = shares.astype(np.int32)
+
+    return df
+
+
+def clean_holdings(df, compact=True):
+    """Limpiar el CSV crudo y derivar las columnas de análisis"""
+    # Clean numeric columns
+    numeric_cols = ['% of Portfolio', 'Shares']
+    for col in numeric_cols:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    # Clean Value column (remove $ and commas)
+    if 'Value' in df.columns:
+        df['Value_Clean'] = _to_number(df['Value'])
+
+    parse_holdings(df)
+    parse_prices(df)
+
+    return compact_holdings(df) if compact else df
+
+
+def _file_digest(path):
+    """Hash SHA-256 del contenido de un fichero"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_manifest(path):
+    try:
+        with open(path, encoding='utf-8') as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_json(path, data):
+    with open(path, 'w', encoding='utf-8') as fh:
+        json.dump(data, fh)
+
+
+def write_atomic(path, write):
+    """Escribir `path` con `write(tmp_path)` sobre un temporal que luego se renombra"""
+    # Write to a private temp file and rename so concurrent server workers
+    # never observe a half-written snapshot
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _resolve_snapshot(csv_path, snapshot_dir):
+    stat = os.stat(csv_path)
+    manifest = _read_manifest(os.path.join(snapshot_dir, 'manifest.json'))
+
+    # mtime + size is the fast path; the content hash is only recomputed when
+    # they change, and a touched-but-identical file still maps to the same key
+    if (manifest.get('mtime_ns') == stat.st_mtime_ns
+            and manifest.get('size') == stat.st_size
+            and manifest.get('source') == os.path.abspath(csv_path)):
+        digest = manifest['sha256']
+    else:
+        digest = _file_digest(csv_path)
+
+    return f"v{SNAPSHOT_VERSION}-{digest[:16]}", digest, stat
+
+
+def snapshot_key(csv_path=CSV_PATH, snapshot_dir=SNAPSHOT_DIR):
+    """Clave de la instantánea: versión del pipeline + hash del contenido del CSV"""
+    return _resolve_snapshot(csv_path, snapshot_dir)[0]
+
+
+def load_holdings(csv_path=CSV_PATH, snapshot_dir=SNAPSHOT_DIR):
+    """Cargar el DataFrame limpio, reutilizando la instantánea Parquet si el CSV no cambió"""
+    key, digest, stat = _resolve_snapshot(csv_path, snapshot_dir)
+    snapshot_path = os.path.join(snapshot_dir, f"holdings-{key}.parquet")
+
+    if os.path.exists(snapshot_path):
+        df = pd.read_parquet(snapshot_path)
+    else:
+        df = clean_holdings(pd.read_csv(csv_path))
+        try:
+            os.makedirs(snapshot_dir, exist_ok=True)
+            write_atomic(snapshot_path, lambda p: df.to_parquet(p, index=False))
+
+            # Drop snapshots of older CSV versions or pipeline versions
+            for name in os.listdir(snapshot_dir):
+                if name.startswith('holdings-') and name.endswith('.parquet') and name != os.path.basename(snapshot_path):
+                    os.remove(os.path.join(snapshot_dir, name))
+        except OSError:
+            # A read-only checkout still works, it just parses the CSV every time
+            return df
+
+    manifest = {
+        'source': os.path.abspath(csv_path),
+        'mtime_ns': stat.st_mtime_ns,
+        'size': stat.st_size,
+        'sha256': digest,
+        'snapshot': os.path.basename(snapshot_path),
+    }
+    manifest_path = os.path.join(snapshot_dir, 'manifest.json')
+    if _read_manifest(manifest_path) != manifest:
+        try:
+            write_atomic(manifest_path, lambda p: _write_json(p, manifest))
+        except OSError:
+            pass
+
+    return df
@@ -0,0 +1,98 @@
+"""Caché LRU de artefactos derivados acotada por un presupuesto de memoria"""
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from data_loader import ACTIVITY_TYPES
+
+
+def filter_key(activity_filter, min_portfolio):
+    """Forma canónica de los filtros globales: mismo estado, misma clave"""
+    activities = tuple(activity for activity in ACTIVITY_TYPES if activity in activity_filter)
+    return activities, round(float(min_portfolio), 4)
+
+
+def estimate_nbytes(value, _seen=None):
+    """Tamaño aproximado en memoria de un artefacto (frames, arrays, matrices dispersas, objetos)"""
+    seen = set() if _seen is None else _seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if hasattr(usage, 'sum') else usage)
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if sparse.issparse(value):
+        return sum(getattr(value, name).nbytes for name in ('data', 'indices', 'indptr', 'row', 'col')
+                   if isinstance(getattr(value, name, None), np.ndarray))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_nbytes(k, seen) + estimate_nbytes(v, seen)
+                                          for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(estimate_nbytes(item, seen) for item in value)
+    if hasattr(value, '__dict__'):
+        return sys.getsizeof(value) + estimate_nbytes(vars(value), seen)
+    return sys.getsizeof(value)
+
+
+class DerivedCache:
+    """Caché LRU compartida entre sesiones, con expulsión por bytes y estadísticas de uso"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_compute(self, key, compute):
+        """Devolver el artefacto de `key`, calculándolo con `compute()` si no está en caché"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+
+        # Compute outside the lock so one slow artifact never blocks other sessions;
+        # two sessions racing on the same key just compute it twice
+        value = compute()
+        nbytes = estimate_nbytes(value)
+
+        with self._lock:
+            if nbytes > self.max_bytes or key in self._entries:
+                return value
+            self._entries[key] = (value, nbytes)
+            self.resident_bytes += nbytes
+            while self.resident_bytes > self.max_bytes:
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self.resident_bytes -= evicted_bytes
+                self.evictions += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.resident_bytes = 0
+
+    def stats(self):
+        """Aciertos, fallos, tasa de acierto, expulsiones y tamaño residente"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'resident_bytes': self.resident_bytes,
+                'max_bytes': self.max_bytes,
+            }
@@ -0,0 +1,96 @@
+"""Caché de figuras Plotly indexada por la huella de sus datos de entrada"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from payload import payload_bytes
+
+
+def _update(digest, value):
+    """Añadir `value` a la huella, con una etiqueta de tipo para que formas distintas no colisionen"""
+    if isinstance(value, pd.DataFrame):
+        digest.update(b'frame')
+        _update(digest, [str(column) for column in value.columns])
+        _update(digest, [str(dtype) for dtype in value.dtypes])
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, (pd.Series, pd.Index)):
+        digest.update(b'series' if isinstance(value, pd.Series) else b'index')
+        _update(digest, [str(value.name), str(value.dtype)])
+        digest.update(pd.util.hash_pandas_object(value, index=isinstance(value, pd.Series)).to_numpy().tobytes())
+    elif isinstance(value, np.ndarray):
+        digest.update(f"array{value.dtype}{value.shape}".encode())
+        if value.dtype == object:
+            digest.update(pd.util.hash_pandas_object(pd.Series(value.ravel()), index=False).to_numpy().tobytes())
+        else:
+            digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, dict):
+        digest.update(f"dict{len(value)}".encode())
+        for key in sorted(value, key=repr):
+            _update(digest, key)
+            _update(digest, value[key])
+    elif isinstance(value, (list, tuple)):
+        digest.update(f"{type(value).__name__}{len(value)}".encode())
+        for item in value:
+            _update(digest, item)
+    else:
+        digest.update(f"{type(value).__name__}:{value!r}".encode())
+
+
+def fingerprint(*parts):
+    """Huella blake2b de los datos y parámetros de un gráfico: mismas entradas, misma huella"""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        _update(digest, part)
+    return digest.hexdigest()
+
+
+class FigureCache:
+    """Figuras ya construidas por (gráfico, huella), con expulsión LRU y contadores por gráfico
+
+    Cada construcción mide además los bytes que la figura envía al navegador; es
+    el coste que se paga en cada rerun aunque la figura salga de la caché.
+
+    Las figuras se comparten entre sesiones: quien las recibe solo debe dibujarlas,
+    nunca modificarlas.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {}
+
+    def get_or_build(self, name, key, build):
+        """Devolver la figura de `name` para la huella `key`, construyéndola con `build()` si falta"""
+        with self._lock:
+            counter = self.counters.setdefault(name, {'hits': 0, 'misses': 0, 'bytes': 0})
+            if (name, key) in self._entries:
+                self._entries.move_to_end((name, key))
+                counter['hits'] += 1
+                figure, counter['bytes'] = self._entries[(name, key)]
+                return figure
+            counter['misses'] += 1
+
+        # Plotly construction, validation and measuring run outside the lock
+        figure = build()
+        size = payload_bytes(figure)
+
+        with self._lock:
+            counter['bytes'] = size
+            self._entries[(name, key)] = (figure, size)
+            self._entries.move_to_end((name, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return figure
+
+    def stats(self):
+        """Aciertos, fallos, tasa de acierto y bytes de la última figura servida por gráfico, de más a menos consultado"""
+        with self._lock:
+            counters = pd.DataFrame.from_dict(self.counters, orient='index', columns=['hits', 'misses', 'bytes'])
+        counters.index.name = 'Gráfico'
+        lookups = counters['hits'] + counters['misses']
+        counters['hit_rate'] = counters['hits'] / lookups.where(lookups > 0)
+        return counters.loc[lookups.sort_values(ascending=False, kind='stable').index]
@@ -0,0 +1,81 @@
+"""Jerarquía inversor → grupo de actividad → acción para go.Sunburst, construida desde los códigos"""
+import numpy as np
+import pandas as pd
+
+from data_loader import ACTIVITY_TYPES
+
+ACTIVITY_GROUPS = ['🟢 Comprando', '🔴 Vendiendo', '⚪ Manteniendo']
+
+# Group of each entry of ACTIVITY_TYPES: buys and adds are buying, reduces selling
+_ACTIVITY_GROUP = np.array([0, 0, 1, 2])
+
+
+def _aggregate(keys, weights, custom):
+    """Nodos de un nivel: suma de pesos, color medio ponderado y customdata común (o "(?)")"""
+    nodes, inverse = np.unique(keys, return_inverse=True)
+    values = np.bincount(inverse, weights=weights, minlength=len(nodes))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Colour is the weight itself, so its value-weighted mean is Σw² / Σw
+        colors = np.bincount(inverse, weights=weights * weights, minlength=len(nodes)) / values
+
+    # A node keeps a hover field only if every leaf below it agrees, as px does
+    node_custom = []
+    for codes, labels in custom:
+        low = np.full(len(nodes), np.iinfo(np.int64).max)
+        high = np.full(len(nodes), -1)
+        np.minimum.at(low, inverse, codes)
+        np.maximum.at(high, inverse, codes)
+        node_custom.append(np.where(low == high, labels[np.clip(low, 0, len(labels) - 1)], '(?)'))
+    return nodes, inverse, values, colors, node_custom
+
+
+def sunburst_hierarchy(frame, custom_columns=('Value', 'Shares', 'RecentActivity')):
+    """ids / parents / labels / values / colores / customdata de los tres anillos del sunburst
+
+    Cada nivel se agrega con np.unique + bincount sobre claves enteras
+    (inversor, grupo, acción); el texto solo se ensambla al final para los nodos.
+    """
+    investor_names = frame['Investor'].cat.categories.to_numpy(dtype=str)
+    stock_names = frame['Stock'].cat.categories.to_numpy(dtype=str)
+    investors = frame['Investor'].cat.codes.to_numpy().astype(np.int64)
+    stocks = frame['Stock'].cat.codes.to_numpy().astype(np.int64)
+    activity = pd.Categorical(frame['Activity_Type'], categories=ACTIVITY_TYPES).codes
+    groups = np.where(activity >= 0, _ACTIVITY_GROUP[activity], len(ACTIVITY_GROUPS) - 1).astype(np.int64)
+    weights = np.nan_to_num(frame['% of Portfolio'].to_numpy(dtype=np.float64))
+
+    # Hover fields are strings in the figure, so they are compared as strings;
+    # a missing value is its own code and stays missing
+    custom = []
+    for column in custom_columns:
+        codes, labels = pd.factorize(frame[column].astype(str), use_na_sentinel=False)
+        custom.append((codes.astype(np.int64), np.asarray(labels, dtype=object)))
+
+    n_groups, n_stocks = len(ACTIVITY_GROUPS), len(stock_names)
+    group_keys = investors * n_groups + groups
+    levels = [
+        _aggregate(group_keys * n_stocks + stocks, weights, custom),
+        _aggregate(group_keys, weights, custom),
+        _aggregate(investors, weights, custom),
+    ]
+
+    group_labels = np.asarray(ACTIVITY_GROUPS)
+    leaf_keys, mid_keys, root_keys = (level[0] for level in levels)
+    root_ids = investor_names[root_keys]
+    mid_ids = np.char.add(np.char.add(investor_names[mid_keys // n_groups], '/'), group_labels[mid_keys % n_groups])
+    leaf_parents = mid_ids[np.searchsorted(mid_keys, leaf_keys // n_stocks)]
+    leaf_ids = np.char.add(np.char.add(leaf_parents, '/'), stock_names[leaf_keys % n_stocks])
+
+    # Leaves first, then the activity ring, then the investors, like px.sunburst
+    ids = [leaf_ids, mid_ids, root_ids]
+    parents = [leaf_parents, investor_names[mid_keys // n_groups], np.full(len(root_keys), '')]
+    labels = [stock_names[leaf_keys % n_stocks], group_labels[mid_keys % n_groups], root_ids]
+    hierarchy = pd.DataFrame({
+        'ids': np.concatenate(ids),
+        'parents': np.concatenate(parents),
+        'labels': np.concatenate(labels),
+        'values': np.concatenate([level[2] for level in levels]),
+        'colors': np.concatenate([level[3] for level in levels]),
+    })
+    for i, column in enumerate(custom_columns):
+        hierarchy[column] = np.concatenate([level[4][i] for level in levels])
+    return hierarchy
@@ -0,0 +1,318 @@
+"""Almacén inmutable de carteras compartido entre todas las sesiones de Streamlit"""
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from cube import HoldingsCube
+
+
+class ReadOnlyHoldingsError(TypeError):
+    """Se intentó modificar in situ el conjunto de datos compartido"""
+
+
+def _refuse(*args, **kwargs):
+    raise ReadOnlyHoldingsError(
+        "The shared holdings frame is read-only; derive a new frame "
+        "(filter, .assign(), .copy()) instead of mutating it in place"
+    )
+
+
+class _ReadOnlyIndexer:
+    """Envoltorio de .loc/.iloc/.at/.iat que permite leer pero no asignar"""
+
+    def __init__(self, indexer):
+        self._indexer = indexer
+
+    def __getitem__(self, key):
+        return self._indexer[key]
+
+    def __call__(self, *args, **kwargs):
+        return _ReadOnlyIndexer(self._indexer(*args, **kwargs))
+
+    __setitem__ = _refuse
+
+
+class FrozenFrame(pd.DataFrame):
+    """DataFrame de solo lectura; todo lo que se deriva de él es un DataFrame normal"""
+
+    @property
+    def _constructor(self):
+        # Filters, selections and copies produce plain, mutable frames
+        return pd.DataFrame
+
+    @property
+    def loc(self):
+        return _ReadOnlyIndexer(super().loc)
+
+    @property
+    def iloc(self):
+        return _ReadOnlyIndexer(super().iloc)
+
+    @property
+    def at(self):
+        return _ReadOnlyIndexer(super().at)
+
+    @property
+    def iat(self):
+        return _ReadOnlyIndexer(super().iat)
+
+    def __setattr__(self, name, value):
+        if name in ('index', 'columns'):
+            _refuse()
+        super().__setattr__(name, value)
+
+    # Column assignment/removal and update() fail loudly
+    __setitem__ = _refuse
+    __delitem__ = _refuse
+    insert = _refuse
+    pop = _refuse
+    update = _refuse
+
+
+def _guard_inplace(name):
+    method = getattr(pd.DataFrame, name)
+
+    def guarded(self, *args, **kwargs):
+        if kwargs.get('inplace'):
+            _refuse()
+        return method(self, *args, **kwargs)
+
+    guarded.__name__ = name
+    guarded.__doc__ = method.__doc__
+    return guarded
+
+
+# The same methods still work on FrozenFrame when they return a new frame
+for _name in ('bfill', 'clip', 'drop', 'drop_duplicates', 'dropna', 'eval', 'ffill', 'fillna',
+              'interpolate', 'mask', 'query', 'rename', 'rename_axis', 'replace', 'reset_index',
+              'set_index', 'sort_index', 'sort_values', 'where'):
+    setattr(FrozenFrame, _name, _guard_inplace(_name))
+
+
+def freeze(frame):
+    """Construir un FrozenFrame cuyos arrays subyacentes son de solo lectura"""
+    columns = {}
+    for col in frame.columns:
+        series = frame[col]
+        if isinstance(series.dtype, np.dtype):
+            values = series.to_numpy(copy=True)
+            values.setflags(write=False)
+        elif isinstance(series.dtype, pd.CategoricalDtype):
+            codes = series.cat.codes.to_numpy(copy=True)
+            codes.setflags(write=False)
+            values = pd.Categorical.from_codes(codes, dtype=series.dtype)
+        else:
+            # Arrow-backed string columns are immutable already
+            values = series.array
+        columns[col] = values
+
+    # copy=False keeps the read-only buffers instead of consolidating them
+    frozen = pd.DataFrame(columns, index=frame.index, copy=False)
+    return FrozenFrame(frozen, copy=False)
+
+
+def merge_duplicate_positions(frame):
+    """Una fila por par (inversor, acción): la primera, con el peso medio de las repetidas
+
+    Un par repetido es la misma posición declarada dos veces; fusionarla al cargar
+    hace que el cubo, la matriz y el índice de acciones la cuenten una sola vez,
+    con el mismo peso medio que daba pivot_table.
+    """
+    valid = ((frame['Investor'].cat.codes >= 0) & (frame['Stock'].cat.codes >= 0)).to_numpy()
+    repeated = frame.duplicated(['Investor', 'Stock']).to_numpy() & valid
+    if not repeated.any():
+        return frame
+
+    weights = frame['% of Portfolio']
+    mean_weights = weights.groupby([frame['Investor'], frame['Stock']], observed=True, sort=False).transform('mean')
+    merged = frame.assign(**{'% of Portfolio': weights.where(~valid, mean_weights).astype(weights.dtype)})
+    return merged[~repeated].reset_index(drop=True)
+
+
+class HoldingsMatrix:
+    """Matrices dispersas inversor × acción: pesos (% de cartera) y propiedad booleana"""
+
+    def __init__(self, weights, investors, stocks):
+        self.weights = weights
+        # Ownership shares the weights' structure, so positions that round to
+        # 0.00% of the portfolio still count as held
+        self.ownership = sparse.csr_matrix(
+            (np.ones(weights.nnz, dtype=bool), weights.indices, weights.indptr), shape=weights.shape
+        )
+        self.investors = investors
+        self.stocks = stocks
+
+    def investor_codes(self, names):
+        """Filas de los inversores dados, en el mismo orden y sin los desconocidos"""
+        codes = self.investors.get_indexer(names)
+        return codes[codes >= 0]
+
+    def stock_codes(self, names):
+        """Columnas de las acciones dadas, en el mismo orden y sin las desconocidas"""
+        codes = self.stocks.get_indexer(names)
+        return codes[codes >= 0]
+
+    def pivot(self, investors, stocks=None):
+        """Tabla acción × inversor de pesos, equivalente a pivot_table(fill_value=0)"""
+        rows = np.sort(self.investor_codes(investors))
+        weights, owned = self.weights[rows], self.ownership[rows]
+
+        cols = np.arange(self.weights.shape[1])
+        if stocks is not None:
+            cols = np.sort(self.stock_codes(stocks))
+            weights, owned = weights[:, cols], owned[:, cols]
+
+        # Like pivot_table, only stocks and investors with at least one holding appear
+        keep_rows = owned.getnnz(axis=1) > 0
+        keep_cols = owned.getnnz(axis=0) > 0
+        values = weights[keep_rows][:, keep_cols].toarray().T
+
+        return pd.DataFrame(
+            values,
+            index=pd.Index(self.stocks[cols[keep_cols]], name='Stock'),
+            columns=pd.Index(self.investors[rows[keep_rows]], name='Investor')
+        )
+
+
+class StockIndex:
+    """Índice invertido acción → listas ordenadas de (código de inversor, fila del frame)"""
+
+    def __init__(self, stock_codes, investor_codes, rows, investors, stocks):
+        # Postings come sorted by (stock, investor, row); indptr delimits each stock like a CSC matrix
+        self.stock_codes = stock_codes
+        self.investor_codes = investor_codes
+        self.rows = rows
+        self.investors = investors
+        self.stocks = stocks
+
+        self.indptr = np.zeros(len(stocks) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(stock_codes, minlength=len(stocks)), out=self.indptr[1:])
+
+        # The store merged repeated positions, so each posting is a distinct holder
+        self.holder_counts = np.diff(self.indptr)
+
+    def postings(self, stock):
+        """Códigos de inversor y filas del frame de una acción (vistas, sin copia)"""
+        code = self.stocks.get_loc(stock)
+        start, end = self.indptr[code], self.indptr[code + 1]
+        return self.investor_codes[start:end], self.rows[start:end]
+
+    def most_held(self, k):
+        """Las k acciones con más inversores, como groupby('Stock')['Investor'].nunique().nlargest(k)"""
+        held = np.flatnonzero(self.holder_counts)
+        # Stable sort on the negated count keeps nlargest's tie order (first category wins)
+        top = held[np.argsort(-self.holder_counts[held], kind='stable')[:k]]
+        return pd.Series(self.holder_counts[top], index=self.stocks[top], name='Investor')
+
+    def restrict(self, mask):
+        """Índice con solo las filas del frame marcadas en `mask`"""
+        # Masking keeps the postings sorted, so no re-sort is needed
+        keep = mask[self.rows]
+        return StockIndex(self.stock_codes[keep], self.investor_codes[keep], self.rows[keep],
+                          self.investors, self.stocks)
+
+
+class InvestorLayout:
+    """Tramos [inicio, fin) de la cartera de cada inversor en un frame agrupado por inversor"""
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.investors = pd.Index(frame['Investor'].cat.categories, name='Investor')
+        codes = frame['Investor'].cat.codes.to_numpy()
+
+        # The frame is clustered, so each investor is one run of equal codes
+        bounds = np.concatenate(([0], np.flatnonzero(np.diff(codes)) + 1, [len(codes)]))
+        block_codes = codes[bounds[:-1]]
+        if len(np.unique(block_codes)) != len(block_codes):
+            raise ValueError("Frame rows are not clustered by investor")
+
+        self.starts = np.zeros(len(self.investors), dtype=np.int64)
+        self.stops = np.zeros(len(self.investors), dtype=np.int64)
+        valid = block_codes >= 0
+        self.starts[block_codes[valid]] = bounds[:-1][valid]
+        self.stops[block_codes[valid]] = bounds[1:][valid]
+
+    def portfolio(self, investor):
+        """Filas de un inversor como corte contiguo del frame, sin recorrerlo entero"""
+        code = self.investors.get_indexer([investor])[0]
+        if code < 0:
+            return self.frame.iloc[:0]
+        return self.frame.iloc[self.starts[code]:self.stops[code]]
+
+    def portfolios(self, investors):
+        """Filas de varios inversores en el orden del frame, como frame[Investor.isin(investors)]"""
+        codes = self.investors.get_indexer(pd.Index(investors).unique())
+        codes = codes[codes >= 0]
+        starts = np.sort(self.starts[codes])
+        lengths = self.stops[codes][np.argsort(self.starts[codes])] - starts
+
+        # Expand the runs into row positions: each run shifts arange() to its own start
+        rows = np.arange(lengths.sum()) + np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        return self.frame.iloc[rows]
+
+
+class HoldingsStore:
+    """Conjunto de datos limpio e inmutable que todas las sesiones referencian sin copiarlo"""
+
+    def __init__(self, frame, snapshot):
+        self.snapshot = snapshot
+        frame = merge_duplicate_positions(frame)
+
+        # Cluster rows by investor (investors in first-appearance order, rows in file
+        # order) so a portfolio is a contiguous slice; a grouped file is left untouched
+        investor_codes = frame['Investor'].cat.codes.to_numpy()
+        _, first_seen = np.unique(investor_codes, return_index=True)
+        # One spare slot at the end catches code -1 (missing investor)
+        block_rank = np.empty(investor_codes.max() + 2 if len(investor_codes) else 1, dtype=np.int64)
+        block_rank[investor_codes[np.sort(first_seen)]] = np.arange(len(first_seen))
+        order = np.argsort(block_rank[investor_codes], kind='stable')
+        if (order != np.arange(len(order))).any():
+            frame = frame.iloc[order].reset_index(drop=True)
+
+        self.frame = freeze(frame)
+        self.cube = HoldingsCube(self.frame)
+
+        # Integer codes of the dictionary-encoded columns drive every sparse structure
+        self.investors = pd.Index(frame['Investor'].cat.categories, name='Investor')
+        self.stocks = pd.Index(frame['Stock'].cat.categories, name='Stock')
+        investor_codes = frame['Investor'].cat.codes.to_numpy().astype(np.int32)
+        stock_codes = frame['Stock'].cat.codes.to_numpy().astype(np.int32)
+
+        # Matrix entries in CSR order (investor, then stock) and the frame row behind each
+        rows = np.flatnonzero((investor_codes >= 0) & (stock_codes >= 0))
+        self._entry_rows = rows[np.lexsort((stock_codes[rows], investor_codes[rows]))]
+        self._entry_investors = investor_codes[self._entry_rows]
+        self._entry_stocks = stock_codes[self._entry_rows]
+        self._entry_weights = np.nan_to_num(frame['% of Portfolio'].to_numpy()[self._entry_rows])
+
+        self.matrix = self.holdings_matrix()
+
+        postings = np.lexsort((self._entry_rows, self._entry_investors, self._entry_stocks))
+        self.stock_index = StockIndex(
+            self._entry_stocks[postings], self._entry_investors[postings], self._entry_rows[postings],
+            self.investors, self.stocks
+        )
+
+    def __len__(self):
+        return len(self.frame)
+
+    def filter_mask(self, activity_filter, min_portfolio):
+        """Máscara booleana de filas con las actividades seleccionadas y un peso mínimo"""
+        frame = self.frame
+        mask = frame['Activity_Type'].isin(activity_filter) & (frame['% of Portfolio'] >= min_portfolio)
+        return mask.to_numpy()
+
+    def holdings_matrix(self, mask=None):
+        """Matriz inversor × acción restringida a las filas de `mask` (todas si es None)"""
+        keep = slice(None) if mask is None else mask[self._entry_rows]
+        investors = self._entry_investors[keep]
+
+        # Entries are already in CSR order and one per (investor, stock) pair, since
+        # the store merged repeated positions, so masking them is all the slicing needed
+        indptr = np.zeros(len(self.investors) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(investors, minlength=len(self.investors)), out=indptr[1:])
+        weights = sparse.csr_matrix(
+            (self._entry_weights[keep], self._entry_stocks[keep], indptr),
+            shape=(len(self.investors), len(self.stocks))
+        )
+        return HoldingsMatrix(weights, self.investors, self.stocks)
@@ -0,0 +1,40 @@
+"""Puntuación de calor por acción con pesos configurables y selección top-k"""
+import numpy as np
+
+from analytics import top_k
+
+# Score component -> default weight (the shares the dashboard has always used)
+HOT_SCORE_WEIGHTS = {
+    'Num_Inversores': 30,
+    'Valor_Total': 25,
+    'Cartera_Promedio': 20,
+    'Conteo_Compra_Añadir': 15,
+    'Cartera_Max': 10,
+}
+
+
+class HotScorer:
+    """Componentes normalizados una sola vez; cambiar pesos o k solo repite un producto y un top-k"""
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        components = metrics[list(HOT_SCORE_WEIGHTS)].to_numpy(dtype=np.float64)
+
+        # Each component is scaled by its maximum (1 when the maximum is not positive)
+        maxima = np.nanmax(components, axis=0, initial=0)
+        maxima[~(maxima > 0)] = 1
+        self.components = np.nan_to_num(components / maxima)
+
+    def scores(self, weights):
+        """Puntuación 0-100 de cada acción para los pesos dados"""
+        weight_vector = np.array([weights.get(name, 0) for name in HOT_SCORE_WEIGHTS], dtype=np.float64)
+        total = weight_vector.sum()
+        if total <= 0:
+            return np.zeros(len(self.metrics))
+        return self.components @ (weight_vector / total) * 100
+
+    def top(self, weights, k):
+        """Las k acciones más calientes con su Puntuacion_Calor, de mayor a menor"""
+        scores = self.scores(weights)
+        picked = top_k(scores, k)
+        return self.metrics.iloc[picked].assign(Puntuacion_Calor=scores[picked])
@@ -3,9 +3,23 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
+import os
 import numpy as np
 from datetime import datetime
-import re
+
+from data_loader import ACTIVITY_TYPES, load_holdings, snapshot_key
+from holdings_store import HoldingsStore, InvestorLayout, freeze
+from derived_cache import DerivedCache, filter_key
+from figure_cache import FigureCache, fingerprint
+from hierarchy import sunburst_hierarchy
+from payload import collapse_tail, render_mode, trim_precision
+from minhash import MinHashSignatures, min_lsh_threshold
+from clustering import InvestorClustering
+from similarity import HolderMasks, InvestorNeighbors, common_holdings, overlap_pairs, similarity_matrix
+from analytics import investor_metrics, top_k_per_group
+from hot_scores import HOT_SCORE_WEIGHTS, HotScorer
+from sweep import sweep_summary, threshold_sweeps
+from styles import load_style_factors
 
 # Page configuration
 st.set_page_config(
@@ -192,43 +206,25 @@ st.markdown("""
     """, unsafe_allow_html=True)
 
 # Load data function
-@st.cache_data
-def load_data():
-    """Cargar y preprocesar los datos"""
-    df = pd.read_csv('dataroma_holdings_complete.csv')
-    
-    # Clean numeric columns
-    numeric_cols = ['% of Portfolio', 'Shares']
-    for col in numeric_cols:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-    
-    # Clean Value column (remove $ and commas)
-    if 'Value' in df.columns:
-        df['Value_Clean'] = df['Value'].str.replace(r'[$,]', '', regex=True)
-        df['Value_Clean'] = pd.to_numeric(df['Value_Clean'], errors='coerce')
-    
-    # Extract activity type and percentage
-    df['Activity_Type'] = df['RecentActivity'].apply(lambda x: 
-        'Mantener' if pd.isna(x) else  # NaN means Hold position
-        'Compra' if x == 'Buy' else
-        'Añadir' if 'Add' in str(x) else 
-        'Reducir' if 'Reduce' in str(x) else 
-        'Mantener'  # Default to Hold for any other case
-    )
-    
-    df['Activity_Percentage'] = df['RecentActivity'].apply(lambda x: 
-        float(re.findall(r'[\d.]+', str(x))[0]) if pd.notna(x) and re.findall(r'[\d.]+', str(x)) else 0
-    )
-    
-    # Extract stock ticker
-    df['Ticker'] = df['Stock'].apply(lambda x: x.split(' - ')[0] if pd.notna(x) and ' - ' in x else x)
-    df['Company'] = df['Stock'].apply(lambda x: x.split(' - ')[1] if pd.notna(x) and ' - ' in x else x)
-    
-    return df
+@st.cache_resource(max_entries=1)
+def load_store(snapshot):
+    """Cargar y preprocesar los datos una sola vez para todas las sesiones"""
+    # `snapshot` only keys the cache, so an edited CSV replaces the store on the next rerun
+    return HoldingsStore(load_holdings(), snapshot)
+
+# Load the data (shared and read-only: derive new frames instead of mutating it)
+store = load_store(snapshot_key())
+df = store.frame
 
-# Load the data
-df = load_data()
+@st.cache_resource(max_entries=1)
+def load_neighbors(snapshot):
+    """Índice de inversores similares sobre las carteras completas de la instantánea"""
+    return InvestorNeighbors(store.matrix)
+
+@st.cache_resource(max_entries=1)
+def load_styles(snapshot):
+    """Factores de estilo de la instantánea, persistidos junto a ella en disco"""
+    return load_style_factors(store)
 
 # Title with gradient and attribution
 st.markdown("<h1>🚀 Dashboard de Análisis de Superinversores</h1>", unsafe_allow_html=True)
@@ -272,6 +268,20 @@ with st.sidebar:
             default=default_comp
         )
     
+    if view_mode == "🔥 Matriz de Acciones Calientes":
+        with st.expander("⚖️ Pesos de la Puntuación de Calor"):
+            hot_score_labels = {
+                'Num_Inversores': "Número de inversores",
+                'Valor_Total': "Valor total invertido",
+                'Cartera_Promedio': "Peso promedio en cartera",
+                'Conteo_Compra_Añadir': "Actividad de compra",
+                'Cartera_Max': "Posición máxima",
+            }
+            hot_score_weights = {
+                name: st.slider(label, 0, 100, HOT_SCORE_WEIGHTS[name], 5, key=f"hot_weight_{name}")
+                for name, label in hot_score_labels.items()
+            }
+    
     # Activity filter
     st.markdown("### 🔧 Filtros Globales")
     activity_filter = st.multiselect(
@@ -290,9 +300,55 @@ with st.sidebar:
     st.markdown("---")
     st.info("💡 Consejo: ¡Usa los gráficos 3D para explorar relaciones multidimensionales en los datos!")
 
-# Filter data based on sidebar selections
-filtered_df = df[df['Activity_Type'].isin(activity_filter)]
-filtered_df = filtered_df[filtered_df['% of Portfolio'] >= min_portfolio]
+@st.cache_resource
+def load_derived_cache(max_mb):
+    """Caché de artefactos derivados (frames filtrados, matrices, métricas) compartida entre sesiones"""
+    return DerivedCache(max_mb * 1024 ** 2)
+
+# Budget for everything derived from the filter state; set SUPERINVESTORS_CACHE_MB to tune it
+derived_cache = load_derived_cache(int(os.environ.get('SUPERINVESTORS_CACHE_MB', 256)))
+
+# Normalized filter state: the same selection in any order hits the same entries
+filter_state = (store.snapshot, *filter_key(activity_filter, min_portfolio))
+
+def derived(name, compute, *params):
+    """Artefacto `name` para el estado de filtros actual (y `params`), calculado una sola vez"""
+    return derived_cache.get_or_compute((name, *filter_state, *params), compute)
+
+@st.cache_resource
+def load_figure_cache(max_entries):
+    """Figuras Plotly ya construidas, compartidas entre sesiones"""
+    return FigureCache(max_entries)
+
+figure_cache = load_figure_cache(int(os.environ.get('SUPERINVESTORS_FIGURE_CACHE', 128)))
+
+# Positions drawn one by one per chart; smaller ones are summed into "Otros"
+point_budget = int(os.environ.get('SUPERINVESTORS_POINT_BUDGET', 150))
+
+def show_figure(name, build, *inputs):
+    """Dibujar el gráfico `name`, reconstruyéndolo solo si cambian sus entradas"""
+    # `inputs` must cover everything `build` reads that can change between reruns
+    figure = figure_cache.get_or_build(name, fingerprint(*inputs), lambda: trim_precision(build()))
+    st.plotly_chart(figure, use_container_width=True)
+
+# Filter data based on sidebar selections (shared between sessions, so read-only)
+filter_mask = derived('mask', lambda: store.filter_mask(activity_filter, min_portfolio))
+filtered_df = derived('filtered', lambda: freeze(store.frame[filter_mask]))
+
+# Filtering keeps the store's investor clustering, so each portfolio stays a contiguous slice
+portfolios = derived('layout', lambda: InvestorLayout(filtered_df))
+
+# Investor × stock structure shared by the heatmap, correlation, network and comparative views
+holdings_matrix = derived('matrix', lambda: store.holdings_matrix(filter_mask))
+
+# Stock → holders posting lists for the popularity rankings and per-stock lookups
+stock_index = derived('stock_index', lambda: store.stock_index.restrict(filter_mask))
+
+# Per-investor positions, value, concentration and activity mix read by every view
+investor_stats = derived('investor_metrics', lambda: investor_metrics(filtered_df))
+
+# Additive per-investor totals straight from the precomputed cube (no row scan)
+investor_totals = store.cube.investor_totals(activity_filter, min_portfolio)
 
 # Main content area based on view selection
 if view_mode == "🌟 Universo de Carteras":
@@ -302,40 +358,32 @@ if view_mode == "🌟 Universo de Carteras":
     # Key metrics with gradient cards - more compact
     col1, col2, col3, col4, col5, col6 = st.columns(6)
     
+    # Headline figures for the current sidebar state, summed from cube cells
+    headline = store.cube.totals(activity_filter, min_portfolio)
+    
     with col1:
-        st.metric("Inversores", f"{filtered_df['Investor'].nunique()}", delta="🎯")
+        st.metric("Inversores", f"{headline['investors']}", delta="🎯")
     with col2:
-        st.metric("Acciones", f"{filtered_df['Stock'].nunique()}", delta="📈")
+        st.metric("Acciones", f"{headline['stocks']}", delta="📈")
     with col3:
-        total_value = filtered_df['Value_Clean'].sum() / 1e9
+        total_value = headline['value'] / 1e9
         st.metric("AUM Total", f"${total_value:.1f}B", delta="💰")
     with col4:
-        num_investors = filtered_df['Investor'].nunique()
+        num_investors = headline['investors']
         if num_investors > 0:
-            avg_holdings = len(filtered_df) / num_investors
+            avg_holdings = headline['positions'] / num_investors
         else:
             avg_holdings = 0
         st.metric("Promedio Pos.", f"{avg_holdings:.0f}", delta="📊")
     with col5:
-        if not filtered_df.empty:
-            # Calculate average Top 5 concentration more safely
-            investors_conc = []
-            for inv in filtered_df['Investor'].unique():
-                inv_df = filtered_df[filtered_df['Investor'] == inv]
-                if not inv_df.empty:
-                    top5_sum = inv_df.nlargest(5, '% of Portfolio')['% of Portfolio'].sum()
-                    investors_conc.append(top5_sum)
-            
-            if investors_conc:
-                concentration = sum(investors_conc) / len(investors_conc)
-            else:
-                concentration = 0
+        if not investor_stats.empty:
+            concentration = investor_stats['Concentracion_Top5'].mean()
         else:
             concentration = 0
         st.metric("Top5 Prom.", f"{concentration:.1f}%", delta="🔥")
     with col6:
-        if not filtered_df.empty and len(filtered_df) > 0:
-            buy_activity = (filtered_df['Activity_Type'].isin(['Compra', 'Añadir'])).sum() / len(filtered_df) * 100
+        if headline['positions'] > 0:
+            buy_activity = headline['buy_positions'] / headline['positions'] * 100
         else:
             buy_activity = 0
         st.metric("Actividad Compra", f"{buy_activity:.1f}%", delta="📈")
@@ -352,7 +400,7 @@ if view_mode == "🌟 Universo de Carteras":
         col_select1, col_select2 = st.columns([3, 1])
         with col_select1:
             all_investors_sunburst = sorted(filtered_df['Investor'].unique())
-            default_selection = filtered_df.groupby('Investor')['Value_Clean'].sum().nlargest(10).index.tolist()
+            default_selection = investor_totals['Valor_Total'].nlargest(10).index.tolist()
             
             # Add quick selection buttons
             quick_select = st.radio(
@@ -363,9 +411,9 @@ if view_mode == "🌟 Universo de Carteras":
             )
             
             if quick_select == "Top 10 por valor":
-                default_selection = filtered_df.groupby('Investor')['Value_Clean'].sum().nlargest(10).index.tolist()
+                default_selection = investor_totals['Valor_Total'].nlargest(10).index.tolist()
             elif quick_select == "Top 5 por valor":
-                default_selection = filtered_df.groupby('Investor')['Value_Clean'].sum().nlargest(5).index.tolist()
+                default_selection = investor_totals['Valor_Total'].nlargest(5).index.tolist()
             else:
                 default_selection = []  # Let user select manually
             
@@ -402,82 +450,75 @@ if view_mode == "🌟 Universo de Carteras":
             st.info("💡 Usa el selector arriba para elegir qué inversores quieres analizar en detalle.")
         else:
             # Prepare enhanced sunburst data using selected investors
-            sunburst_data = filtered_df[filtered_df['Investor'].isin(selected_investors_sunburst)].copy()
+            sunburst_data = portfolios.portfolios(selected_investors_sunburst)
             
             if sunburst_data.empty:
                 st.warning("No se encontraron datos para los inversores seleccionados.")
             else:
-                # Add activity layer
-                sunburst_data['Activity_Group'] = sunburst_data['Activity_Type'].apply(
-                    lambda x: '🟢 Comprando' if x in ['Compra', 'Añadir'] else '🔴 Vendiendo' if x == 'Reducir' else '⚪ Manteniendo'
-                )
-                
                 # Get top holdings per investor for clarity using the slider value
-                sunburst_filtered = []
-                for investor in selected_investors_sunburst:
-                    investor_data = sunburst_data[sunburst_data['Investor'] == investor].nlargest(max_stocks_per_investor, '% of Portfolio')
-                    if not investor_data.empty:
-                        sunburst_filtered.append(investor_data)
+                sunburst_final = top_k_per_group(sunburst_data, max_stocks_per_investor, groups=selected_investors_sunburst)
                 
-                if len(sunburst_filtered) == 0:
+                if sunburst_final.empty:
                     st.warning("No hay datos disponibles para visualización con los filtros actuales.")
                 else:
-                    sunburst_final = pd.concat(sunburst_filtered)
-                    
-                    # Calculate proper values for sizing
-                    sunburst_final['Display_Value'] = sunburst_final['% of Portfolio']
+                    # Rings built from the category codes once per selection, not re-grouped by px
+                    sunburst_nodes = derived('sunburst', lambda: sunburst_hierarchy(sunburst_final),
+                                             tuple(selected_investors_sunburst), max_stocks_per_investor)
                     
                     # Create the main sunburst chart with enhanced aesthetics
-                    fig_sunburst = px.sunburst(
-                        sunburst_final,
-                        path=['Investor', 'Activity_Group', 'Stock'],
-                        values='Display_Value',
-                        color='% of Portfolio',
-                        color_continuous_scale=[
-                            [0, '#440154'],     # Dark purple
-                            [0.2, '#31688e'],   # Blue
-                            [0.4, '#35b779'],   # Green
-                            [0.6, '#fde725'],   # Yellow
-                            [0.8, '#ff6b6b'],   # Red
-                            [1, '#c92a2a']      # Dark red
-                        ],
-                        title='',
-                        hover_data={'Value': ':$,.0f', '% of Portfolio': ':.2f%'},
-                        custom_data=['Value', 'Shares', 'RecentActivity']
-                    )
-                    
-                    # Update layout for better aesthetics
-                    fig_sunburst.update_traces(
-                        textinfo='label+percent entry',
-                        hovertemplate='<b>%{label}</b><br>' +
-                                     'Cartera: %{color:.2f}%<br>' +
-                                     'Valor: %{customdata[0]}<br>' +
-                                     'Acciones: %{customdata[1]:,.0f}<br>' +
-                                     'Actividad: %{customdata[2]}<br>' +
-                                     '<extra></extra>',
-                        marker=dict(line=dict(color='white', width=2))
-                    )
+                    def build_sunburst():
+                        fig_sunburst = go.Figure(go.Sunburst(
+                            ids=sunburst_nodes['ids'],
+                            parents=sunburst_nodes['parents'],
+                            labels=sunburst_nodes['labels'],
+                            values=sunburst_nodes['values'],
+                            branchvalues='total',
+                            marker=dict(
+                                colors=sunburst_nodes['colors'],
+                                coloraxis='coloraxis',
+                                line=dict(color='white', width=2)
+                            ),
+                            customdata=sunburst_nodes[['Value', 'Shares', 'RecentActivity']],
+                            textinfo='label+percent entry',
+                            hovertemplate='<b>%{label}</b><br>' +
+                                         'Cartera: %{color:.2f}%<br>' +
+                                         'Valor: %{customdata[0]}<br>' +
+                                         'Acciones: %{customdata[1]:,.0f}<br>' +
+                                         'Actividad: %{customdata[2]}<br>' +
+                                         '<extra></extra>'
+                        ))
                     
-                    fig_sunburst.update_layout(
-                        height=850,
-                        paper_bgcolor='rgba(0,0,0,0)',
-                        font=dict(color='white', size=14),
-                        margin=dict(t=30, l=0, r=0, b=0),
-                        coloraxis_colorbar=dict(
-                            title="% Cartera",
-                            thicknessmode="pixels",
-                            thickness=15,
-                            lenmode="pixels",
-                            len=300,
-                            yanchor="middle",
-                            y=0.5,
-                            ticks="outside",
-                            tickcolor='white',
-                            tickfont=dict(color='white')
+                        fig_sunburst.update_layout(
+                            height=850,
+                            paper_bgcolor='rgba(0,0,0,0)',
+                            font=dict(color='white', size=14),
+                            margin=dict(t=30, l=0, r=0, b=0),
+                            coloraxis=dict(
+                                colorscale=[
+                                    [0, '#440154'],     # Dark purple
+                                    [0.2, '#31688e'],   # Blue
+                                    [0.4, '#35b779'],   # Green
+                                    [0.6, '#fde725'],   # Yellow
+                                    [0.8, '#ff6b6b'],   # Red
+                                    [1, '#c92a2a']      # Dark red
+                                ],
+                                colorbar=dict(
+                                    title="% Cartera",
+                                    thicknessmode="pixels",
+                                    thickness=15,
+                                    lenmode="pixels",
+                                    len=300,
+                                    yanchor="middle",
+                                    y=0.5,
+                                    ticks="outside",
+                                    tickcolor='white',
+                                    tickfont=dict(color='white')
+                                )
+                            )
                         )
-                    )
+                        return fig_sunburst
                     
-                    st.plotly_chart(fig_sunburst, use_container_width=True)
+                    show_figure('sunburst', build_sunburst, sunburst_nodes)
                     
                     # Show current visualization stats
                     num_investors_shown = sunburst_final['Investor'].nunique()
@@ -527,9 +568,7 @@ if view_mode == "🌟 Universo de Carteras":
         
         if not filtered_df.empty:
             # Most active investor
-            most_active = filtered_df.groupby('Investor')['Activity_Type'].apply(
-                lambda x: (x.isin(['Compra', 'Añadir'])).sum()
-            ).nlargest(1)
+            most_active = (investor_totals['Compra'] + investor_totals['Añadir']).nlargest(1)
             
             if not most_active.empty:
                 st.markdown(f"**Más Activo:**  \n{most_active.index[0][:25]}")
@@ -540,7 +579,7 @@ if view_mode == "🌟 Universo de Carteras":
             st.markdown("---")
             
             # Top stock by investor count
-            top_stock = filtered_df.groupby('Stock')['Investor'].nunique().nlargest(1)
+            top_stock = stock_index.most_held(1)
             
             if not top_stock.empty:
                 st.markdown(f"**Acción Más Popular:**  \n{top_stock.index[0].split(' - ')[0]}")
@@ -553,35 +592,38 @@ if view_mode == "🌟 Universo de Carteras":
             # Activity summary pie
             st.markdown("### 🎯 Resumen de Actividad")
             activity_dist = filtered_df['Activity_Type'].value_counts()
+            activity_dist = activity_dist[activity_dist > 0]
             
             if not activity_dist.empty:
-                fig_activity = px.pie(
-                    values=activity_dist.values,
-                    names=activity_dist.index,
-                    color_discrete_map={
-                        'Compra': '#10B981',
-                        'Añadir': '#60A5FA',
-                        'Reducir': '#F87171',
-                        'Mantener': '#9CA3AF'
-                    },
-                    hole=0.6
-                )
+                def build_activity():
+                    fig_activity = px.pie(
+                        values=activity_dist.values,
+                        names=activity_dist.index,
+                        color_discrete_map={
+                            'Compra': '#10B981',
+                            'Añadir': '#60A5FA',
+                            'Reducir': '#F87171',
+                            'Mantener': '#9CA3AF'
+                        },
+                        hole=0.6
+                    )
                 
-                fig_activity.update_traces(
-                    textposition='outside',
-                    textinfo='label+percent',
-                    marker=dict(line=dict(color='white', width=2))
-                )
+                    fig_activity.update_traces(
+                        textposition='outside',
+                        textinfo='label+percent',
+                        marker=dict(line=dict(color='white', width=2))
+                    )
                 
-                fig_activity.update_layout(
-                    height=300,
-                    showlegend=False,
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    font=dict(color='white', size=10),
-                    margin=dict(t=0, l=0, r=0, b=0)
-                )
+                    fig_activity.update_layout(
+                        height=300,
+                        showlegend=False,
+                        paper_bgcolor='rgba(0,0,0,0)',
+                        font=dict(color='white', size=10),
+                        margin=dict(t=0, l=0, r=0, b=0)
+                    )
+                    return fig_activity
                 
-                st.plotly_chart(fig_activity, use_container_width=True)
+                show_figure('activity', build_activity, activity_dist)
             else:
                 st.info("Sin datos de actividad con los filtros actuales")
         else:
@@ -622,30 +664,32 @@ if view_mode == "🌟 Universo de Carteras":
             """)
         
         if not filtered_df.empty:
-            hot_stocks = filtered_df.groupby('Stock')['Investor'].nunique().nlargest(15)
+            hot_stocks = stock_index.most_held(15)
             
             if not hot_stocks.empty:
-                fig_hot = px.bar(
-                    x=hot_stocks.values,
-                    y=hot_stocks.index,
-                    orientation='h',
-                    color=hot_stocks.values,
-                    color_continuous_scale='YlOrRd',
-                    labels={'x': 'Número de Inversores', 'y': ''}
-                )
+                def build_hot():
+                    fig_hot = px.bar(
+                        x=hot_stocks.values,
+                        y=hot_stocks.index,
+                        orientation='h',
+                        color=hot_stocks.values,
+                        color_continuous_scale='YlOrRd',
+                        labels={'x': 'Número de Inversores', 'y': ''}
+                    )
                 
-                fig_hot.update_layout(
-                    height=450,
-                    showlegend=False,
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    font=dict(color='white', size=9),
-                    margin=dict(l=0, r=0, t=0, b=0),
-                    xaxis=dict(showgrid=False),
-                    yaxis=dict(showgrid=False)
-                )
+                    fig_hot.update_layout(
+                        height=450,
+                        showlegend=False,
+                        paper_bgcolor='rgba(0,0,0,0)',
+                        plot_bgcolor='rgba(0,0,0,0)',
+                        font=dict(color='white', size=9),
+                        margin=dict(l=0, r=0, t=0, b=0),
+                        xaxis=dict(showgrid=False),
+                        yaxis=dict(showgrid=False)
+                    )
+                    return fig_hot
                 
-                st.plotly_chart(fig_hot, use_container_width=True)
+                show_figure('hot', build_hot, hot_stocks)
             else:
                 st.info("Sin datos de acciones disponibles")
         else:
@@ -671,11 +715,11 @@ elif view_mode == "🎯 Inteligencia de Portafolio":
         )
         
         if quick_select_intel == "Top 20 por valor":
-            default_intel = filtered_df.groupby('Investor')['Value_Clean'].sum().nlargest(20).index.tolist()
+            default_intel = investor_totals['Valor_Total'].nlargest(20).index.tolist()
         elif quick_select_intel == "Top 10 por valor":
-            default_intel = filtered_df.groupby('Investor')['Value_Clean'].sum().nlargest(10).index.tolist()
+            default_intel = investor_totals['Valor_Total'].nlargest(10).index.tolist()
         elif quick_select_intel == "Top 5 por valor":
-            default_intel = filtered_df.groupby('Investor')['Value_Clean'].sum().nlargest(5).index.tolist()
+            default_intel = investor_totals['Valor_Total'].nlargest(5).index.tolist()
         else:
             default_intel = []
         
@@ -691,7 +735,7 @@ elif view_mode == "🎯 Inteligencia de Portafolio":
     with col_intel2:
         st.metric("Inversores seleccionados", len(selected_investors_intel))
         if selected_investors_intel:
-            total_positions = filtered_df[filtered_df['Investor'].isin(selected_investors_intel)]['Stock'].nunique()
+            total_positions = portfolios.portfolios(selected_investors_intel)['Stock'].nunique()
             st.metric("Acciones únicas", total_positions)
     
     if not selected_investors_intel:
@@ -699,14 +743,16 @@ elif view_mode == "🎯 Inteligencia de Portafolio":
         st.stop()
     
     # Filter data for selected investors
-    intel_df = filtered_df[filtered_df['Investor'].isin(selected_investors_intel)]
+    intel_df = portfolios.portfolios(selected_investors_intel)
     
     st.markdown("---")
     
     # Create sub-tabs for different analyses
-    tab1, tab2, tab3 = st.tabs(["📊 Análisis de Concentración", "🎯 Puntuación de Diversidad", "🔮 Reconocimiento de Patrones"])
+    tab1, tab2, tab3 = st.tabs(["📊 Análisis de Concentración", "🎯 Puntuación de Diversidad", "🔮 Reconocimiento de Patrones"], key="intel_tabs", on_change="rerun")
     
-    with tab1:
+    @st.fragment
+    def concentration_tab():
+        """Radar multidimensional y comparación de carteras"""
         st.markdown("### 📊 Análisis Multidimensional de Inversores")
         
         # Refine selection for radar chart from pre-selected investors
@@ -744,60 +790,61 @@ elif view_mode == "🎯 Inteligencia de Portafolio":
             """)
         
         if selected_radar:
-            # Create radar chart for selected investors using intel_df
+            # Create radar chart for selected investors from the metrics table
             radar_data = []
             for investor in selected_radar:
-                investor_df = intel_df[intel_df['Investor'] == investor]
-                if not investor_df.empty:
-                    max_stocks = investor_df['Stock'].nunique()
-                    max_portfolio = investor_df['% of Portfolio'].max()
-                    mean_portfolio = investor_df['% of Portfolio'].mean()
-                    buy_add_count = (investor_df['Activity_Type'].isin(['Compra', 'Añadir'])).sum()
-                    total_count = len(investor_df)
-                    total_value = investor_df['Value_Clean'].sum()
-                    
+                if investor in investor_stats.index:
+                    stats = investor_stats.loc[investor]
                     radar_data.append({
                         'Investor': investor,
-                        'Posiciones': min((max_stocks / 50) * 100, 100) if max_stocks > 0 else 0,
-                        'Top1': max_portfolio if max_portfolio > 0 else 0,
-                        'Pos_Promedio': (mean_portfolio * 10) if mean_portfolio > 0 else 0,
-                        'Actividad_Compra': (buy_add_count / total_count * 100) if total_count > 0 else 0,
-                        'Valor': min(total_value / 1e8, 100) if total_value > 0 else 0
+                        'Posiciones': min((stats['Num_Acciones'] / 50) * 100, 100),
+                        'Top1': max(stats['Top1'], 0),
+                        'Pos_Promedio': max(stats['Peso_Promedio'] * 10, 0),
+                        'Actividad_Compra': stats['Ratio_Compra'],
+                        'Valor': min(max(stats['Valor_Total'], 0) / 1e8, 100)
                     })
             
             if radar_data:
-                fig_radar = go.Figure()
+                def build_radar():
+                    fig_radar = go.Figure()
                 
-                categories = ['Posiciones', 'Top1', 'Pos_Promedio', 'Actividad_Compra', 'Valor']
+                    categories = ['Posiciones', 'Top1', 'Pos_Promedio', 'Actividad_Compra', 'Valor']
                 
-                for item in radar_data:
-                    fig_radar.add_trace(go.Scatterpolar(
-                        r=[item.get(cat, 0) for cat in categories],
-                        theta=categories,
-                        fill='toself',
-                        name=item['Investor'][:25]
-                    ))
+                    for item in radar_data:
+                        fig_radar.add_trace(go.Scatterpolar(
+                            r=[item.get(cat, 0) for cat in categories],
+                            theta=categories,
+                            fill='toself',
+                            name=item['Investor'][:25]
+                        ))
                 
-                fig_radar.update_layout(
-                    polar=dict(
-                        radialaxis=dict(
-                            visible=True,
-                            range=[0, 100]
-                        )),
-                    showlegend=True,
-                    title=f"Comparación de Perfiles - {len(selected_radar)} Inversores",
-                    height=600,
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    font=dict(color='white')
-                )
+                    fig_radar.update_layout(
+                        polar=dict(
+                            radialaxis=dict(
+                                visible=True,
+                                range=[0, 100]
+                            )),
+                        showlegend=True,
+                        title=f"Comparación de Perfiles - {len(selected_radar)} Inversores",
+                        height=600,
+                        paper_bgcolor='rgba(0,0,0,0)',
+                        font=dict(color='white')
+                    )
+                    return fig_radar
                 
-                st.plotly_chart(fig_radar, use_container_width=True)
+                show_figure('radar', build_radar, radar_data, len(selected_radar))
             else:
                 st.info("No hay datos disponibles para los inversores seleccionados")
         else:
             st.warning("Por favor selecciona al menos un inversor para el análisis radar")
     
-    with tab2:
+    with tab1:
+        if tab1.open:
+            concentration_tab()
+    
+    @st.fragment
+    def diversity_tab():
+        """Puntuación de diversidad y riesgo de concentración"""
         st.markdown("### 🎯 Análisis de Diversidad de Cartera")
         
         # Optionally refine selection for diversity analysis
@@ -831,14 +878,10 @@ elif view_mode == "🎯 Inteligencia de Portafolio":
             
             # Calculate diversity score for selected investors
             if selected_investors_div:
-                div_df = intel_df[intel_df['Investor'].isin(selected_investors_div)]
-                diversity_scores = div_df.groupby('Investor').apply(
-                    lambda x: pd.Series({
-                        'Num_Acciones': x['Stock'].nunique(),
-                        'HHI': (x['% of Portfolio'] ** 2).sum(),  # Herfindahl index
-                        'Concentracion_Top5': x.nlargest(5, '% of Portfolio')['% of Portfolio'].sum()
-                    })
-                ).reset_index()
+                diversity_scores = investor_stats.loc[
+                    investor_stats.index.isin(selected_investors_div),
+                    ['Num_Acciones', 'HHI', 'Concentracion_Top5']  # HHI = Herfindahl index
+                ].reset_index()
                 
                 if not diversity_scores.empty:
                     max_num = diversity_scores['Num_Acciones'].max()
@@ -853,26 +896,29 @@ elif view_mode == "🎯 Inteligencia de Portafolio":
                         
                         diversity_scores['Puntuacion_Diversidad'] = num_component + hhi_component + top5_component
                     
-                    fig_diversity = px.scatter(
-                        diversity_scores,
-                        x='Num_Acciones',
-                        y='Puntuacion_Diversidad',
-                        size='Concentracion_Top5',
-                        color='Puntuacion_Diversidad',
-                        hover_data=['Investor'],
-                        color_continuous_scale='Turbo',
-                        title=f'Panorama de Diversidad - {len(selected_investors_div)} Inversores Seleccionados',
-                        labels={'Num_Acciones': 'Número de Posiciones', 'Puntuacion_Diversidad': 'Puntuación de Diversidad (0-100)'}
-                    )
+                    def build_diversity():
+                        fig_diversity = px.scatter(
+                            diversity_scores,
+                            x='Num_Acciones',
+                            y='Puntuacion_Diversidad',
+                            size='Concentracion_Top5',
+                            color='Puntuacion_Diversidad',
+                            hover_data=['Investor'],
+                            color_continuous_scale='Turbo',
+                            render_mode=render_mode(len(diversity_scores)),
+                            title=f'Panorama de Diversidad - {len(selected_investors_div)} Inversores Seleccionados',
+                            labels={'Num_Acciones': 'Número de Posiciones', 'Puntuacion_Diversidad': 'Puntuación de Diversidad (0-100)'}
+                        )
                     
-                    fig_diversity.update_layout(
-                        height=500,
-                        paper_bgcolor='rgba(0,0,0,0)',
-                        plot_bgcolor='rgba(0,0,0,0)',
-                        font=dict(color='white')
-                    )
+                        fig_diversity.update_layout(
+                            height=500,
+                            paper_bgcolor='rgba(0,0,0,0)',
+                            plot_bgcolor='rgba(0,0,0,0)',
+                            font=dict(color='white')
+                        )
+                        return fig_diversity
                     
-                    st.plotly_chart(fig_diversity, use_container_width=True)
+                    show_figure('diversity', build_diversity, diversity_scores, len(selected_investors_div))
                 else:
                     st.info("No hay datos de diversidad disponibles para los inversores seleccionados")
             else:
@@ -908,28 +954,42 @@ elif view_mode == "🎯 Inteligencia de Portafolio":
             if selected_investors_box:
                 box_data = intel_df[intel_df['Investor'].isin(selected_investors_box)]
                 
-                fig_box = px.box(
-                    box_data,
-                    x='Investor',
-                    y='% of Portfolio',
-                    color='Investor',
-                    title=f'Distribución del Tamaño de Posición - {len(selected_investors_box)} Inversores Seleccionados'
-                )
+                def build_box():
+                    # One trace per investor named after it: the category comes from the
+                    # trace name instead of repeating the investor in an x array per position
+                    fig_box = go.Figure([
+                        go.Box(
+                            y=positions['% of Portfolio'],
+                            name=investor,
+                            hovertemplate='Investor=%{x}<br>% of Portfolio=%{y}<extra></extra>'
+                        )
+                        for investor, positions in box_data.groupby('Investor', observed=True, sort=False)
+                    ])
                 
-                fig_box.update_layout(
-                    height=500,
-                    showlegend=False,
-                    xaxis_tickangle=-45,
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    font=dict(color='white', size=9)
-                )
+                    fig_box.update_layout(
+                        title=f'Distribución del Tamaño de Posición - {len(selected_investors_box)} Inversores Seleccionados',
+                        xaxis_title='Investor',
+                        yaxis_title='% of Portfolio',
+                        height=500,
+                        showlegend=False,
+                        xaxis_tickangle=-45,
+                        paper_bgcolor='rgba(0,0,0,0)',
+                        plot_bgcolor='rgba(0,0,0,0)',
+                        font=dict(color='white', size=9)
+                    )
+                    return fig_box
                 
-                st.plotly_chart(fig_box, use_container_width=True)
+                show_figure('box', build_box, box_data, len(selected_investors_box))
             else:
                 st.warning("Por favor selecciona al menos un inversor para ver la distribución")
     
-    with tab3:
+    with tab2:
+        if tab2.open:
+            diversity_tab()
+    
+    @st.fragment
+    def patterns_tab():
+        """Reconocimiento de patrones de trading"""
         st.markdown("### 🔮 Reconocimiento de Patrones de Trading")
         
         # Use pre-selected investors for trading patterns
@@ -956,54 +1016,62 @@ elif view_mode == "🎯 Inteligencia de Portafolio":
         
         # Analyze trading patterns for selected investors
         if selected_investors_pattern:
-            pattern_df = intel_df[intel_df['Investor'].isin(selected_investors_pattern)]
-            if not pattern_df.empty:
-                pattern_data = pattern_df.groupby(['Investor', 'Activity_Type']).size().unstack(fill_value=0)
+            pattern_stats = investor_stats[investor_stats.index.isin(selected_investors_pattern)]
+            if not pattern_stats.empty:
+                pattern_data = pattern_stats[ACTIVITY_TYPES].assign(Agresividad=pattern_stats['Ratio_Compra'])
                 
                 if not pattern_data.empty:
-                    # Calculate aggressiveness safely
-                    total_sum = pattern_data.sum(axis=1)
-                    total_sum = total_sum.replace(0, 1)  # Avoid division by zero
-                    pattern_data['Agresividad'] = (pattern_data.get('Compra', 0) + pattern_data.get('Añadir', 0)) / total_sum * 100
                     pattern_data = pattern_data.sort_values('Agresividad', ascending=False)
                     
-                    fig_pattern = px.bar(
-                        pattern_data.reset_index(),
-                        x='Investor',
-                        y='Agresividad',
-                        color='Agresividad',
-                        color_continuous_scale='RdYlGn',
-                        title=f'Puntuación de Agresividad en Trading - {len(selected_investors_pattern)} Inversores Seleccionados',
-                        labels={'Agresividad': 'Puntuación de Agresividad (%)'}
-                    )
+                    def build_pattern():
+                        fig_pattern = px.bar(
+                            pattern_data.reset_index(),
+                            x='Investor',
+                            y='Agresividad',
+                            color='Agresividad',
+                            color_continuous_scale='RdYlGn',
+                            title=f'Puntuación de Agresividad en Trading - {len(selected_investors_pattern)} Inversores Seleccionados',
+                            labels={'Agresividad': 'Puntuación de Agresividad (%)'}
+                        )
                     
-                    fig_pattern.update_layout(
-                        height=500,
-                        xaxis_tickangle=-45,
-                        paper_bgcolor='rgba(0,0,0,0)',
-                        plot_bgcolor='rgba(0,0,0,0)',
-                        font=dict(color='white', size=10)
-                    )
+                        fig_pattern.update_layout(
+                            height=500,
+                            xaxis_tickangle=-45,
+                            paper_bgcolor='rgba(0,0,0,0)',
+                            plot_bgcolor='rgba(0,0,0,0)',
+                            font=dict(color='white', size=10)
+                        )
+                        return fig_pattern
                     
-                    st.plotly_chart(fig_pattern, use_container_width=True)
+                    show_figure('pattern', build_pattern, pattern_data, len(selected_investors_pattern))
                 else:
                     st.info("No hay datos de patrones disponibles")
             else:
                 st.info("No hay datos disponibles para los inversores seleccionados")
         else:
             st.warning("Por favor selecciona al menos un inversor para ver los patrones de trading")
+    
+    with tab3:
+        if tab3.open:
+            patterns_tab()
 
 elif view_mode == "🔥 Matriz de Acciones Calientes":
     st.markdown("## 🔥 Matriz Avanzada de Acciones Calientes", unsafe_allow_html=True)
     
+    # Shares of each component under the sidebar weights
+    total_hot_weight = sum(hot_score_weights.values()) or 1
+    hot_shares = {name: weight / total_hot_weight * 100 for name, weight in hot_score_weights.items()}
+    
     with st.expander("📚 Entendiendo la Puntuación de Calor"):
-        st.markdown("""
+        st.markdown(f"""
         **Componentes de la Puntuación de Calor (0-100):**
-        - 30% - Número de inversores que poseen la acción
-        - 25% - Valor total invertido en todas las carteras
-        - 20% - Peso promedio en cartera
-        - 15% - Actividad reciente de compra (conteo Compra/Añadir)
-        - 10% - Tamaño máximo de posición en cualquier cartera
+        - {hot_shares['Num_Inversores']:.0f}% - Número de inversores que poseen la acción
+        - {hot_shares['Valor_Total']:.0f}% - Valor total invertido en todas las carteras
+        - {hot_shares['Cartera_Promedio']:.0f}% - Peso promedio en cartera
+        - {hot_shares['Conteo_Compra_Añadir']:.0f}% - Actividad reciente de compra (conteo Compra/Añadir)
+        - {hot_shares['Cartera_Max']:.0f}% - Tamaño máximo de posición en cualquier cartera
+        
+        Los pesos se ajustan desde la barra lateral.
         
         **Interpretación de la Puntuación:**
         - 80-100: 🔥 Extremadamente caliente - Fuerte consenso entre múltiples inversores
@@ -1012,36 +1080,10 @@ elif view_mode == "🔥 Matriz de Acciones Calientes":
         - <40: 🔍 Selecciones de nicho - Poseída por pocos inversores o en posiciones pequeñas
         """)
     
-    # Calculate comprehensive metrics - moved outside of heatmap section
-    stock_metrics = filtered_df.groupby('Stock').agg({
-        'Investor': 'nunique',
-        'Value_Clean': 'sum',
-        '% of Portfolio': ['mean', 'max'],
-        'Activity_Type': lambda x: (x.isin(['Compra', 'Añadir'])).sum(),
-        'Activity_Percentage': 'mean'
-    })
-    
-    stock_metrics.columns = ['Num_Inversores', 'Valor_Total', 'Cartera_Promedio', 'Cartera_Max', 'Conteo_Compra_Añadir', 'Actividad_Promedio']
-    
-    # Calculate heat score with multiple factors
-    if not stock_metrics.empty:
-        max_investors = stock_metrics['Num_Inversores'].max() if stock_metrics['Num_Inversores'].max() > 0 else 1
-        max_value = stock_metrics['Valor_Total'].max() if stock_metrics['Valor_Total'].max() > 0 else 1
-        max_avg = stock_metrics['Cartera_Promedio'].max() if stock_metrics['Cartera_Promedio'].max() > 0 else 1
-        max_count = stock_metrics['Conteo_Compra_Añadir'].max() if stock_metrics['Conteo_Compra_Añadir'].max() > 0 else 1
-        max_max = stock_metrics['Cartera_Max'].max() if stock_metrics['Cartera_Max'].max() > 0 else 1
-        
-        stock_metrics['Puntuacion_Calor'] = (
-            stock_metrics['Num_Inversores'] / max_investors * 30 +
-            stock_metrics['Valor_Total'] / max_value * 25 +
-            stock_metrics['Cartera_Promedio'] / max_avg * 20 +
-            stock_metrics['Conteo_Compra_Añadir'] / max_count * 15 +
-            stock_metrics['Cartera_Max'] / max_max * 10
-        ) * 100
-    else:
-        stock_metrics['Puntuacion_Calor'] = 0
-    
-    hot_stocks = stock_metrics.sort_values('Puntuacion_Calor', ascending=False).head(30)
+    # Per-stock aggregates come from the cube and are normalized once per filter state;
+    # the sidebar weights and top-30 cut are applied on top without re-aggregating
+    hot_scorer = derived('hot_scorer', lambda: HotScorer(store.cube.stock_totals(activity_filter, min_portfolio)))
+    hot_stocks = hot_scorer.top(hot_score_weights, 30)
     
     # Create 3D bubble chart
     st.markdown("### 🌐 Universo 3D de Acciones Calientes")
@@ -1068,34 +1110,92 @@ elif view_mode == "🔥 Matriz de Acciones Calientes":
         """)
     
     if not hot_stocks.empty:
-        fig_3d_bubble = px.scatter_3d(
-            hot_stocks.reset_index(),
-            x='Num_Inversores',
-            y='Cartera_Promedio',
-            z='Valor_Total',
-            size='Puntuacion_Calor',
-            color='Puntuacion_Calor',
-            hover_data=['Stock', 'Conteo_Compra_Añadir'],
-            color_continuous_scale='Hot_r',
-            title='Análisis Interactivo 3D de Acciones Calientes'
-        )
+        def build_3d_bubble():
+            fig_3d_bubble = px.scatter_3d(
+                hot_stocks.reset_index(),
+                x='Num_Inversores',
+                y='Cartera_Promedio',
+                z='Valor_Total',
+                size='Puntuacion_Calor',
+                color='Puntuacion_Calor',
+                hover_data=['Stock', 'Conteo_Compra_Añadir'],
+                color_continuous_scale='Hot_r',
+                title='Análisis Interactivo 3D de Acciones Calientes'
+            )
         
-        fig_3d_bubble.update_layout(
-            scene=dict(
-                xaxis_title='Número de Inversores',
-                yaxis_title='% Promedio en Cartera',
-                zaxis_title='Valor Total ($)',
-                camera=dict(eye=dict(x=1.5, y=1.5, z=1.3))
-            ),
-            height=700,
-            paper_bgcolor='rgba(0,0,0,0)',
-            font=dict(color='white')
-        )
+            fig_3d_bubble.update_layout(
+                scene=dict(
+                    xaxis_title='Número de Inversores',
+                    yaxis_title='% Promedio en Cartera',
+                    zaxis_title='Valor Total ($)',
+                    camera=dict(eye=dict(x=1.5, y=1.5, z=1.3))
+                ),
+                height=700,
+                paper_bgcolor='rgba(0,0,0,0)',
+                font=dict(color='white')
+            )
+            return fig_3d_bubble
         
-        st.plotly_chart(fig_3d_bubble, use_container_width=True)
+        show_figure('3d_bubble', build_3d_bubble, hot_stocks)
     else:
         st.info("No hay suficientes datos para mostrar el gráfico 3D de acciones calientes")
     
+    # Investor style map: filtered portfolios folded into the snapshot's latent space
+    st.markdown("### 🧭 Mapa de Estilos de Inversión")
+    
+    with st.expander("📚 Entendiendo el Mapa de Estilos"):
+        st.markdown("""
+        **Qué es:** Cada inversor se sitúa en un espacio de pocas dimensiones obtenido con una SVD truncada de la matriz inversor × acción.
+        
+        **Cómo leerlo:**
+        - **Cercanía:** Inversores cercanos reparten sus pesos entre acciones parecidas
+        - **Ejes:** Dimensiones latentes de estilo, ordenadas por cuánta variación explican
+        - **Tamaño:** Número de posiciones que pasan los filtros
+        - **Color:** % de posiciones de compra o ampliación
+        
+        **Filtros:** Los factores se calculan una vez con las carteras completas; con filtros activos, cada cartera filtrada se proyecta sobre ellos sin recalcular.
+        """)
+    
+    styles = load_styles(store.snapshot)
+    style_dims = st.radio("Dimensiones", ["2D", "3D"], horizontal=True, key="style_map_dims")
+    style_coords = derived('style_coords', lambda: styles.fold_in(holdings_matrix.weights))
+    
+    style_rows = holdings_matrix.investor_codes(investor_totals.index)
+    if len(style_rows) >= 2:
+        explained = styles.explained()
+        axis_titles = [f"Estilo {i + 1} ({explained[i]:.0%})" for i in range(3)]
+        style_df = investor_totals.loc[holdings_matrix.investors[style_rows]].reset_index()
+        style_df[['Estilo_1', 'Estilo_2', 'Estilo_3']] = style_coords[style_rows, :3]
+        
+        def build_styles():
+            style_args = dict(
+                size='Posiciones',
+                color='Ratio_Compra',
+                hover_name='Investor',
+                hover_data={'Valor_Total': ':$,.0f', 'Posiciones': True},
+                color_continuous_scale='Viridis',
+                labels={'Ratio_Compra': '% Compras', 'Estilo_1': axis_titles[0], 'Estilo_2': axis_titles[1], 'Estilo_3': axis_titles[2]},
+                title='Inversores en el Espacio Latente de Estilos'
+            )
+            if style_dims == "3D":
+                fig_styles = px.scatter_3d(style_df, x='Estilo_1', y='Estilo_2', z='Estilo_3', **style_args)
+            else:
+                fig_styles = px.scatter(style_df, x='Estilo_1', y='Estilo_2', render_mode=render_mode(len(style_df)), **style_args)
+        
+            fig_styles.update_layout(
+                height=600,
+                paper_bgcolor='rgba(0,0,0,0)',
+                plot_bgcolor='rgba(0,0,0,0)',
+                font=dict(color='white')
+            )
+            return fig_styles
+        
+        show_figure('styles', build_styles, style_df, style_dims, axis_titles)
+        shown = 3 if style_dims == "3D" else 2
+        st.caption(f"💡 Las {shown} primeras dimensiones explican el {explained[:shown].sum():.0%} de la variación de pesos entre {len(style_df)} inversores")
+    else:
+        st.info("No hay suficientes inversores con los filtros actuales para el mapa de estilos")
+    
     # Heatmap of top stocks vs selected investors
     st.markdown("### 🌡️ Matriz de Propiedad Acción-Inversor")
     
@@ -1104,7 +1204,7 @@ elif view_mode == "🔥 Matriz de Acciones Calientes":
     
     with col_hm1:
         all_investors_hm = sorted(filtered_df['Investor'].unique())
-        default_hm = filtered_df.groupby('Investor')['Value_Clean'].sum().nlargest(15).index.tolist()
+        default_hm = investor_totals['Valor_Total'].nlargest(15).index.tolist()
         
         selected_investors_hm = st.multiselect(
             "🎯 Seleccionar inversores para el mapa de calor:",
@@ -1146,33 +1246,27 @@ elif view_mode == "🔥 Matriz de Acciones Calientes":
     if selected_investors_hm and not hot_stocks.empty:
         top_stocks_hm = hot_stocks.head(num_stocks_hm).index
         
-        heatmap_data = filtered_df[
-            (filtered_df['Stock'].isin(top_stocks_hm)) & 
-            (filtered_df['Investor'].isin(selected_investors_hm))
-        ].pivot_table(
-            values='% of Portfolio',
-            index='Stock',
-            columns='Investor',
-            fill_value=0
-        )
+        heatmap_data = holdings_matrix.pivot(selected_investors_hm, top_stocks_hm)
         
         if not heatmap_data.empty:
-            fig_heatmap = px.imshow(
-                heatmap_data,
-                color_continuous_scale='Turbo',
-                title=f'Mapa de Calor - Top {num_stocks_hm} Acciones vs {len(selected_investors_hm)} Inversores Seleccionados',
-                labels=dict(color="% Cartera"),
-                aspect='auto'
-            )
+            def build_heatmap():
+                fig_heatmap = px.imshow(
+                    heatmap_data,
+                    color_continuous_scale='Turbo',
+                    title=f'Mapa de Calor - Top {num_stocks_hm} Acciones vs {len(selected_investors_hm)} Inversores Seleccionados',
+                    labels=dict(color="% Cartera"),
+                    aspect='auto'
+                )
             
-            fig_heatmap.update_layout(
-                height=600,
-                xaxis_tickangle=-45,
-                paper_bgcolor='rgba(0,0,0,0)',
-                font=dict(color='white', size=9)
-            )
+                fig_heatmap.update_layout(
+                    height=600,
+                    xaxis_tickangle=-45,
+                    paper_bgcolor='rgba(0,0,0,0)',
+                    font=dict(color='white', size=9)
+                )
+                return fig_heatmap
             
-            st.plotly_chart(fig_heatmap, use_container_width=True)
+            show_figure('heatmap', build_heatmap, heatmap_data, num_stocks_hm, len(selected_investors_hm))
             
             # Show some statistics
             st.caption(f"💡 Mostrando {len(heatmap_data.columns)} inversores × {len(heatmap_data.index)} acciones = {len(heatmap_data.columns) * len(heatmap_data.index)} posibles posiciones")
@@ -1180,6 +1274,50 @@ elif view_mode == "🔥 Matriz de Acciones Calientes":
             st.info("No hay datos disponibles para el mapa de calor con los inversores seleccionados")
     else:
         st.warning("Por favor selecciona al menos un inversor para el mapa de calor")
+    
+    # Threshold sweep: the whole slider range at once from weight-sorted prefix sums
+    st.markdown("### 📉 Barrido del Porcentaje Mínimo de Cartera")
+    with st.expander("ℹ️ ¿Qué muestra esto?"):
+        st.markdown("""
+        **Propósito:** Muestra cómo cambian el universo y las acciones más calientes al mover el filtro de porcentaje mínimo de 0% a 50%.
+        **Cómo leer:** La línea discontinua marca el valor actual del slider. Las curvas de las acciones muestran cuántos inversores las mantienen por encima de cada umbral.
+        **Por qué importa:** Las acciones cuya curva cae despacio son apuestas de alta convicción, no solo posiciones pequeñas repartidas.
+        """)
+    
+    sweep_state = ('sweep', store.snapshot, filter_key(activity_filter, min_portfolio)[0])
+    investor_sweep, stock_sweep = derived_cache.get_or_compute(
+        sweep_state, lambda: threshold_sweeps(store.frame, activity_filter)
+    )
+    sweep_df = sweep_summary(investor_sweep, stock_sweep, hot_stocks.head(5).index)
+    
+    if sweep_df['Inversores'].any():
+        def build_sweep():
+            fig_sweep = make_subplots(
+                rows=3, cols=1, shared_xaxes=True, vertical_spacing=0.06,
+                subplot_titles=("Inversores con posiciones", "AUM ($B)", "Inversores por acción caliente")
+            )
+            fig_sweep.add_trace(go.Scatter(x=sweep_df['Umbral'], y=sweep_df['Inversores'], mode='lines',
+                                           name='Inversores', line=dict(color='#667eea', width=3)), row=1, col=1)
+            fig_sweep.add_trace(go.Scatter(x=sweep_df['Umbral'], y=sweep_df['AUM'] / 1e9, mode='lines',
+                                           name='AUM', line=dict(color='#48bb78', width=3)), row=2, col=1)
+            for stock in sweep_df.columns[3:]:
+                fig_sweep.add_trace(go.Scatter(x=sweep_df['Umbral'], y=sweep_df[stock], mode='lines',
+                                               name=stock.split(' - ')[0]), row=3, col=1)
+            fig_sweep.add_vline(x=min_portfolio, line_dash='dash', line_color='white')
+        
+            fig_sweep.update_layout(
+                height=700,
+                paper_bgcolor='rgba(0,0,0,0)',
+                plot_bgcolor='rgba(0,0,0,0)',
+                font=dict(color='white'),
+                legend=dict(orientation='h', y=-0.08)
+            )
+            fig_sweep.update_xaxes(title_text='% Mínimo de Cartera', row=3, col=1)
+            return fig_sweep
+        
+        show_figure('sweep', build_sweep, sweep_df, min_portfolio)
+    else:
+        st.info("Sin datos con los filtros de actividad actuales")
 
 elif view_mode == "📊 Análisis Avanzado":
     st.markdown("## 📊 Análisis Estadístico Avanzado", unsafe_allow_html=True)
@@ -1201,11 +1339,11 @@ elif view_mode == "📊 Análisis Avanzado":
         )
         
         if quick_select_adv == "Top 20 por valor":
-            default_adv = filtered_df.groupby('Investor')['Value_Clean'].sum().nlargest(20).index.tolist()
+            default_adv = investor_totals['Valor_Total'].nlargest(20).index.tolist()
         elif quick_select_adv == "Top 10 por valor":
-            default_adv = filtered_df.groupby('Investor')['Value_Clean'].sum().nlargest(10).index.tolist()
+            default_adv = investor_totals['Valor_Total'].nlargest(10).index.tolist()
         elif quick_select_adv == "Top 5 por valor":
-            default_adv = filtered_df.groupby('Investor')['Value_Clean'].sum().nlargest(5).index.tolist()
+            default_adv = investor_totals['Valor_Total'].nlargest(5).index.tolist()
         else:
             default_adv = []
         
@@ -1221,7 +1359,7 @@ elif view_mode == "📊 Análisis Avanzado":
     with col_sel2:
         st.metric("Inversores seleccionados", len(selected_investors_adv))
         if selected_investors_adv:
-            total_value_selected = filtered_df[filtered_df['Investor'].isin(selected_investors_adv)]['Value_Clean'].sum() / 1e9
+            total_value_selected = portfolios.portfolios(selected_investors_adv)['Value_Clean'].sum() / 1e9
             st.metric("Valor total", f"${total_value_selected:.1f}B")
     
     if not selected_investors_adv:
@@ -1229,13 +1367,15 @@ elif view_mode == "📊 Análisis Avanzado":
         st.stop()
     
     # Filter data for selected investors
-    analysis_df = filtered_df[filtered_df['Investor'].isin(selected_investors_adv)]
+    analysis_stats = investor_stats[investor_stats.index.isin(selected_investors_adv)]
     
     st.markdown("---")
     
-    tab1, tab2, tab3 = st.tabs(["📈 Análisis de Tendencias", "🔄 Matriz de Correlación", "📊 Patrones de Actividad"])
+    tab1, tab2, tab3 = st.tabs(["📈 Análisis de Tendencias", "🔄 Matriz de Correlación", "📊 Patrones de Actividad"], key="advanced_tabs", on_change="rerun")
     
-    with tab1:
+    @st.fragment
+    def trends_tab():
+        """Sentimiento de compra/venta de los inversores seleccionados"""
         st.markdown("### 📈 Análisis de Sentimiento Compra/Venta")
         with st.expander("ℹ️ Entendiendo este gráfico"):
             st.markdown("""
@@ -1254,56 +1394,61 @@ elif view_mode == "📊 Análisis Avanzado":
             **Tamaño de burbuja:** Representa el número total de acciones
             """)
         
-        # Create activity timeline using selected investors
-        activity_summary = analysis_df.groupby(['Investor', 'Activity_Type']).size().unstack(fill_value=0)
-        
-        # Calculate trend metrics
-        if not activity_summary.empty:
+        # Calculate trend metrics using selected investors
+        if not analysis_stats.empty:
             trend_data = pd.DataFrame({
-                'Inversor': activity_summary.index,
-                'Ratio_Compra': ((activity_summary.get('Compra', 0) + activity_summary.get('Añadir', 0)) / 
-                                (activity_summary.sum(axis=1).replace(0, 1)) * 100),
-                'Acciones_Totales': activity_summary.sum(axis=1)
+                'Inversor': analysis_stats.index,
+                'Ratio_Compra': analysis_stats['Ratio_Compra'],
+                'Acciones_Totales': analysis_stats['Posiciones']
             })
             
             if not trend_data.empty and len(trend_data) > 0:
-                fig_trend = px.scatter(
-                    trend_data,
-                    x='Acciones_Totales',
-                    y='Ratio_Compra',
-                    size='Acciones_Totales',
-                    color='Ratio_Compra',
-                    hover_data=['Inversor'],
-                    color_continuous_scale='RdYlGn',
-                    title=f'Sentimiento Compra/Añadir vs Nivel de Actividad - {len(selected_investors_adv)} Inversores',
-                    labels={'Ratio_Compra': 'Actividad Alcista (%)', 'Acciones_Totales': 'Número de Acciones'}
-                )
+                def build_trend():
+                    fig_trend = px.scatter(
+                        trend_data,
+                        x='Acciones_Totales',
+                        y='Ratio_Compra',
+                        size='Acciones_Totales',
+                        color='Ratio_Compra',
+                        hover_data=['Inversor'],
+                        color_continuous_scale='RdYlGn',
+                        render_mode=render_mode(len(trend_data)),
+                        title=f'Sentimiento Compra/Añadir vs Nivel de Actividad - {len(selected_investors_adv)} Inversores',
+                        labels={'Ratio_Compra': 'Actividad Alcista (%)', 'Acciones_Totales': 'Número de Acciones'}
+                    )
                 
-                # Add quadrant lines if we have data
-                if len(trend_data['Acciones_Totales']) > 0:
-                    fig_trend.add_hline(y=50, line_dash="dash", line_color="gray", opacity=0.5)
-                    median_val = trend_data['Acciones_Totales'].median()
-                    if pd.notna(median_val):
-                        fig_trend.add_vline(x=median_val, line_dash="dash", line_color="gray", opacity=0.5)
+                    # Add quadrant lines if we have data
+                    if len(trend_data['Acciones_Totales']) > 0:
+                        fig_trend.add_hline(y=50, line_dash="dash", line_color="gray", opacity=0.5)
+                        median_val = trend_data['Acciones_Totales'].median()
+                        if pd.notna(median_val):
+                            fig_trend.add_vline(x=median_val, line_dash="dash", line_color="gray", opacity=0.5)
                 
-                fig_trend.update_layout(
-                    height=500,
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    font=dict(color='white')
-                )
+                    fig_trend.update_layout(
+                        height=500,
+                        paper_bgcolor='rgba(0,0,0,0)',
+                        plot_bgcolor='rgba(0,0,0,0)',
+                        font=dict(color='white')
+                    )
+                    return fig_trend
                 
-                st.plotly_chart(fig_trend, use_container_width=True)
+                show_figure('trend', build_trend, trend_data, len(selected_investors_adv))
             else:
                 st.info("No hay suficientes datos para el análisis de tendencias")
         else:
             st.info("No hay datos disponibles para el análisis de tendencias con los inversores seleccionados")
     
-    with tab2:
+    with tab1:
+        if tab1.open:
+            trends_tab()
+    
+    @st.fragment
+    def correlation_tab():
+        """Matriz de similitud agrupada entre carteras"""
         st.markdown("### 🔄 Correlación de Carteras de Inversores")
         
         # Use the pre-selected investors but allow further filtering
-        col_select1, col_select2 = st.columns([3, 1])
+        col_select1, col_select2, col_select3 = st.columns([3, 1, 1])
         with col_select1:
             selected_investors_corr = st.multiselect(
                 "Refinar selección para matriz de correlación (opcional):",
@@ -1320,12 +1465,32 @@ elif view_mode == "📊 Análisis Avanzado":
                 value=5,
                 help="Número mínimo de acciones comunes para mostrar correlación"
             )
+        with col_select3:
+            similarity_labels = {
+                'pearson': "Correlación (Pearson)",
+                'cosine': "Coseno",
+                'jaccard': "Jaccard",
+                'weighted_overlap': "Solapamiento ponderado",
+            }
+            similarity_metric = st.selectbox(
+                "Métrica de similitud",
+                list(similarity_labels),
+                format_func=similarity_labels.get,
+                key="similarity_metric",
+                help="Pearson compara pesos centrados; Coseno, pesos sin centrar; Jaccard, solo qué acciones se poseen; Solapamiento ponderado, la fracción de cartera compartida"
+            )
         
         with st.expander("ℹ️ Cómo interpretar la correlación"):
             st.markdown("""
             **Qué muestra:** Qué tan similares son las carteras de diferentes inversores basándose en posiciones comunes y pesos.
             
-            **Escala de color:**
+            **Métricas:**
+            - Correlación (Pearson): Covarianza de los pesos, de -1 a 1
+            - Coseno: Ángulo entre los vectores de pesos, de 0 a 1
+            - Jaccard: Acciones en común / acciones poseídas por alguno, de 0 a 1
+            - Solapamiento ponderado: Suma de los pesos mínimos compartidos, de 0 a 1
+            
+            **Escala de color (Pearson):**
             - Rojo intenso (1.0): Correlación perfecta - carteras idénticas
             - Rojo claro (0.5-1.0): Alta similitud
             - Blanco (0): Sin correlación
@@ -1340,83 +1505,142 @@ elif view_mode == "📊 Análisis Avanzado":
             **Nota:** Alta correlación no significa copiar, podría indicar principios similares de inversión en valor.
             """)
         
+        col_view1, col_view2 = st.columns(2)
+        with col_view1:
+            color_scales = {
+                'auto': "Automática (según métrica)",
+                'RdBu': "Rojo-Azul",
+                'Reds': "Rojos",
+                'Viridis': "Viridis",
+                'RdYlGn': "Rojo-Amarillo-Verde",
+            }
+            corr_color_scale = st.selectbox(
+                "Escala de color",
+                list(color_scales),
+                format_func=color_scales.get,
+                key="corr_color_scale"
+            )
+        with col_view2:
+            n_clusters = st.slider(
+                "Número de grupos",
+                min_value=1,
+                max_value=max(2, min(10, len(selected_investors_corr))),
+                value=min(4, max(1, len(selected_investors_corr))),
+                key="corr_clusters",
+                help="Corta el dendrograma en este número de grupos de inversores con carteras parecidas"
+            )
+        
         if selected_investors_corr and len(selected_investors_corr) >= 2:
-            # Create correlation matrix based on selected investors - using analysis_df
-            corr_pivot = analysis_df[analysis_df['Investor'].isin(selected_investors_corr)].pivot_table(
-                values='% of Portfolio',
-                index='Stock',
-                columns='Investor',
-                fill_value=0
+            selection_key = tuple(sorted(selected_investors_corr))
+            # Similarity straight from the sparse weights, cached per selection, metric and cut
+            correlation_matrix = derived(
+                'similarity',
+                lambda: similarity_matrix(holdings_matrix, selected_investors_corr, similarity_metric, min_common),
+                selection_key, similarity_metric, min_common
+            )
+            # The linkage depends only on the selection and metric, so moving the
+            # min_common cut, the colour scale or the group count reuses it
+            clustering = derived(
+                'clustering',
+                lambda: InvestorClustering(similarity_matrix(holdings_matrix, selected_investors_corr, similarity_metric)),
+                selection_key, similarity_metric
             )
             
-            # Filter for minimum common stocks
-            if not corr_pivot.empty:
-                stock_counts = (corr_pivot > 0).sum(axis=1)
-                stocks_with_min = stock_counts[stock_counts >= min_common].index
-                if len(stocks_with_min) > 0:
-                    corr_pivot_filtered = corr_pivot.loc[stocks_with_min]
-                else:
-                    corr_pivot_filtered = corr_pivot
+            if not correlation_matrix.empty:
+                correlation_matrix = clustering.reorder(correlation_matrix)
+                clusters = clustering.labels(n_clusters).loc[correlation_matrix.index]
                 
-                if not corr_pivot_filtered.empty:
-                    correlation_matrix = corr_pivot_filtered.corr()
-                    
+                # Pearson is signed; the other metrics run from 0 to 1
+                signed = similarity_metric == 'pearson'
+                similarity_label = "Correlación" if signed else "Similitud"
+                if corr_color_scale == 'auto':
+                    corr_color_scale = 'RdBu' if signed else 'Reds'
+                def build_corr():
                     fig_corr = px.imshow(
                         correlation_matrix,
-                        color_continuous_scale='RdBu',
-                        title=f'Matriz de Similitud de Carteras ({len(selected_investors_corr)} inversores seleccionados)',
-                        labels=dict(color="Correlación"),
-                        zmin=-1,
+                        color_continuous_scale=corr_color_scale,
+                        title=f'Matriz de Similitud de Carteras ({len(selected_investors_corr)} inversores seleccionados) - {similarity_labels[similarity_metric]}',
+                        labels=dict(color=similarity_label),
+                        zmin=-1 if signed else 0,
                         zmax=1
                     )
-                    
+                
                     # Add text annotations for values
                     fig_corr.update_traces(text=np.round(correlation_matrix.values, 2), texttemplate='%{text}')
-                    
+                
+                    # Outline each group: leaf order keeps its members contiguous
+                    group_bounds = np.flatnonzero(np.diff(clusters.to_numpy())) + 1
+                    for start, stop in zip(np.r_[0, group_bounds], np.r_[group_bounds, len(clusters)]):
+                        fig_corr.add_shape(
+                            type='rect',
+                            x0=start - 0.5, x1=stop - 0.5, y0=start - 0.5, y1=stop - 0.5,
+                            line=dict(color='white', width=2)
+                        )
+                
                     fig_corr.update_layout(
                         height=600,
                         paper_bgcolor='rgba(0,0,0,0)',
                         font=dict(color='white')
                     )
-                    
-                    st.plotly_chart(fig_corr, use_container_width=True)
-                    
-                    # Show statistics with better error handling
-                    col1_stats, col2_stats, col3_stats = st.columns(3)
-                    with col1_stats:
-                        st.metric("Inversores analizados", len(selected_investors_corr))
-                    with col2_stats:
-                        if correlation_matrix.size > 0:
-                            mask = np.ones(correlation_matrix.shape, dtype=bool)
-                            np.fill_diagonal(mask, False)
-                            non_diag = correlation_matrix.values[mask]
-                            if len(non_diag) > 0:
-                                avg_corr = np.nanmean(non_diag)
-                                st.metric("Correlación promedio", f"{avg_corr:.3f}")
-                            else:
-                                st.metric("Correlación promedio", "N/A")
+                    return fig_corr
+                
+                show_figure('corr', build_corr, correlation_matrix, clusters, corr_color_scale, similarity_metric, len(selected_investors_corr))
+                st.caption("💡 Inversores ordenados por agrupamiento jerárquico; los recuadros marcan cada grupo")
+                
+                # Show statistics with better error handling
+                col1_stats, col2_stats, col3_stats = st.columns(3)
+                with col1_stats:
+                    st.metric("Inversores analizados", len(selected_investors_corr))
+                with col2_stats:
+                    if correlation_matrix.size > 0:
+                        mask = np.ones(correlation_matrix.shape, dtype=bool)
+                        np.fill_diagonal(mask, False)
+                        non_diag = correlation_matrix.values[mask]
+                        if len(non_diag) > 0:
+                            avg_corr = np.nanmean(non_diag)
+                            st.metric(f"{similarity_label} promedio", f"{avg_corr:.3f}")
                         else:
-                            st.metric("Correlación promedio", "N/A")
-                    with col3_stats:
-                        if correlation_matrix.size > 0:
-                            mask = np.ones(correlation_matrix.shape, dtype=bool)
-                            np.fill_diagonal(mask, False)
-                            non_diag = correlation_matrix.values[mask]
-                            if len(non_diag) > 0:
-                                max_corr = np.nanmax(non_diag)
-                                st.metric("Correlación máxima", f"{max_corr:.3f}")
-                            else:
-                                st.metric("Correlación máxima", "N/A")
+                            st.metric(f"{similarity_label} promedio", "N/A")
+                    else:
+                        st.metric(f"{similarity_label} promedio", "N/A")
+                with col3_stats:
+                    if correlation_matrix.size > 0:
+                        mask = np.ones(correlation_matrix.shape, dtype=bool)
+                        np.fill_diagonal(mask, False)
+                        non_diag = correlation_matrix.values[mask]
+                        if len(non_diag) > 0:
+                            max_corr = np.nanmax(non_diag)
+                            st.metric(f"{similarity_label} máxima", f"{max_corr:.3f}")
                         else:
-                            st.metric("Correlación máxima", "N/A")
-                else:
-                    st.info("No hay suficientes datos para calcular correlaciones")
+                            st.metric(f"{similarity_label} máxima", "N/A")
+                    else:
+                        st.metric(f"{similarity_label} máxima", "N/A")
+                
+                # Group membership with the average pairwise similarity inside each group
+                group_rows = []
+                for group, members in clusters.groupby(clusters, sort=True):
+                    block = correlation_matrix.loc[members.index, members.index].to_numpy()
+                    off_diagonal = block[~np.eye(len(block), dtype=bool)]
+                    group_rows.append({
+                        'Grupo': group,
+                        'Inversores': len(members),
+                        f'{similarity_label} Interna': np.nanmean(off_diagonal) if np.isfinite(off_diagonal).any() else np.nan,
+                        'Miembros': ", ".join(members.index),
+                    })
+                st.markdown("#### 🧩 Grupos de Inversores")
+                st.dataframe(pd.DataFrame(group_rows), hide_index=True, use_container_width=True)
             else:
-                st.info("No hay datos disponibles para análisis de correlación")
+                st.info("No hay suficientes datos para calcular correlaciones")
         else:
             st.warning("Por favor selecciona al menos 2 inversores para el análisis de correlación")
     
-    with tab3:
+    with tab2:
+        if tab2.open:
+            correlation_tab()
+    
+    @st.fragment
+    def activity_tab():
+        """Distribución de la actividad por tipo de inversor"""
         st.markdown("### 📊 Distribución de Actividad por Tipo de Inversor")
         
         col1, col2 = st.columns(2)
@@ -1436,33 +1660,36 @@ elif view_mode == "📊 Análisis Avanzado":
                 """)
             
             # Categorize investors using selected data
-            if not analysis_df.empty:
-                investor_activity = analysis_df.groupby('Investor')['Activity_Type'].apply(
-                    lambda x: 'Compradores' if (x.isin(['Compra', 'Añadir'])).mean() > 0.7 
-                    else 'Vendedores' if (x.isin(['Compra', 'Añadir'])).mean() < 0.3 
-                    else 'Balanceados'
-                ).value_counts()
+            if not analysis_stats.empty:
+                buy_share = (analysis_stats['Compra'] + analysis_stats['Añadir']) / analysis_stats['Posiciones']
+                investor_activity = pd.Series(np.select(
+                    [buy_share > 0.7, buy_share < 0.3],
+                    ['Compradores', 'Vendedores'],
+                    default='Balanceados'
+                )).value_counts()
                 
                 if not investor_activity.empty:
-                    fig_activity_pie = px.pie(
-                        values=investor_activity.values,
-                        names=investor_activity.index,
-                        color_discrete_map={
-                            'Compradores': '#10B981',
-                            'Balanceados': '#60A5FA',
-                            'Vendedores': '#F87171'
-                        },
-                        title='Posicionamiento de Inversores',
-                        hole=0.4
-                    )
+                    def build_activity_pie():
+                        fig_activity_pie = px.pie(
+                            values=investor_activity.values,
+                            names=investor_activity.index,
+                            color_discrete_map={
+                                'Compradores': '#10B981',
+                                'Balanceados': '#60A5FA',
+                                'Vendedores': '#F87171'
+                            },
+                            title='Posicionamiento de Inversores',
+                            hole=0.4
+                        )
                     
-                    fig_activity_pie.update_layout(
-                        height=400,
-                        paper_bgcolor='rgba(0,0,0,0)',
-                        font=dict(color='white')
-                    )
+                        fig_activity_pie.update_layout(
+                            height=400,
+                            paper_bgcolor='rgba(0,0,0,0)',
+                            font=dict(color='white')
+                        )
+                        return fig_activity_pie
                     
-                    st.plotly_chart(fig_activity_pie, use_container_width=True)
+                    show_figure('activity_pie', build_activity_pie, investor_activity)
                 else:
                     st.info("No hay datos de actividad disponibles")
             else:
@@ -1483,37 +1710,44 @@ elif view_mode == "📊 Análisis Avanzado":
                 """)
             
             # Concentration categories using selected investors
-            if not analysis_df.empty:
-                concentration_cats = analysis_df.groupby('Investor')['% of Portfolio'].apply(
-                    lambda x: 'Concentrado' if x.nlargest(5).sum() > 60
-                    else 'Diversificado' if x.nlargest(5).sum() < 40
-                    else 'Moderado'
-                ).value_counts()
+            if not analysis_stats.empty:
+                top5 = analysis_stats['Concentracion_Top5']
+                concentration_cats = pd.Series(np.select(
+                    [top5 > 60, top5 < 40],
+                    ['Concentrado', 'Diversificado'],
+                    default='Moderado'
+                )).value_counts()
                 
                 if not concentration_cats.empty:
-                    fig_conc_pie = px.pie(
-                        values=concentration_cats.values,
-                        names=concentration_cats.index,
-                        color_discrete_map={
-                            'Concentrado': '#F87171',
-                            'Moderado': '#60A5FA',
-                            'Diversificado': '#10B981'
-                        },
-                        title='Estilos de Concentración de Cartera',
-                        hole=0.4
-                    )
+                    def build_conc_pie():
+                        fig_conc_pie = px.pie(
+                            values=concentration_cats.values,
+                            names=concentration_cats.index,
+                            color_discrete_map={
+                                'Concentrado': '#F87171',
+                                'Moderado': '#60A5FA',
+                                'Diversificado': '#10B981'
+                            },
+                            title='Estilos de Concentración de Cartera',
+                            hole=0.4
+                        )
                     
-                    fig_conc_pie.update_layout(
-                        height=400,
-                        paper_bgcolor='rgba(0,0,0,0)',
-                        font=dict(color='white')
-                    )
+                        fig_conc_pie.update_layout(
+                            height=400,
+                            paper_bgcolor='rgba(0,0,0,0)',
+                            font=dict(color='white')
+                        )
+                        return fig_conc_pie
                     
-                    st.plotly_chart(fig_conc_pie, use_container_width=True)
+                    show_figure('conc_pie', build_conc_pie, concentration_cats)
                 else:
                     st.info("No hay datos de concentración disponibles")
             else:
                 st.info("No hay datos para analizar")
+    
+    with tab3:
+        if tab3.open:
+            activity_tab()
 
 elif view_mode == "🕸️ Análisis de Red":
     st.markdown("## 🕸️ Análisis de Red de Inversores", unsafe_allow_html=True)
@@ -1525,29 +1759,46 @@ elif view_mode == "🕸️ Análisis de Red":
     with col_net1:
         all_investors_net = sorted(filtered_df['Investor'].unique())
         
+        def quick_select_investors(choice):
+            """Inversores que corresponden a una opción de selección rápida"""
+            if choice == "Todos":
+                return all_investors_net
+            elif choice == "Top 20 por valor":
+                return investor_totals['Valor_Total'].nlargest(20).index.tolist()
+            elif choice == "Top 15 por valor":
+                return investor_totals['Valor_Total'].nlargest(15).index.tolist()
+            elif choice == "Top 10 por valor":
+                return investor_totals['Valor_Total'].nlargest(10).index.tolist()
+            return []
+        
+        def apply_quick_select_net():
+            # A keyed multiselect ignores a new `default` after its first render,
+            # so the radio writes the selection into its state instead
+            choice = st.session_state["quick_select_network"]
+            if choice != "Personalizado":
+                st.session_state["network_investors"] = [
+                    investor for investor in quick_select_investors(choice) if investor in all_investors_net
+                ]
+        
         # Quick selection options
         quick_select_net = st.radio(
             "Selección rápida:",
-            ["Top 20 por valor", "Top 15 por valor", "Top 10 por valor", "Personalizado"],
+            ["Top 20 por valor", "Top 15 por valor", "Top 10 por valor", "Todos", "Personalizado"],
             horizontal=True,
             index=0,
-            key="quick_select_network"
+            key="quick_select_network",
+            on_change=apply_quick_select_net
         )
         
-        if quick_select_net == "Top 20 por valor":
-            default_net = filtered_df.groupby('Investor')['Value_Clean'].sum().nlargest(20).index.tolist()
-        elif quick_select_net == "Top 15 por valor":
-            default_net = filtered_df.groupby('Investor')['Value_Clean'].sum().nlargest(15).index.tolist()
-        elif quick_select_net == "Top 10 por valor":
-            default_net = filtered_df.groupby('Investor')['Value_Clean'].sum().nlargest(10).index.tolist()
-        else:
-            default_net = []
+        default_net = quick_select_investors(quick_select_net)
+        if len(all_investors_net) < len(default_net):
+            default_net = all_investors_net[:min(20, len(all_investors_net))]
         
         selected_investors_net = st.multiselect(
-            "🎯 Seleccionar inversores para análisis de red (máx. 25):",
+            "🎯 Seleccionar inversores para análisis de red:",
             all_investors_net,
-            default=default_net if len(all_investors_net) >= len(default_net) else all_investors_net[:min(20, len(all_investors_net))],
-            max_selections=25,
+            # Only the first render takes the default; afterwards the state rules
+            default=None if "network_investors" in st.session_state else default_net,
             key="network_investors",
             help="Selecciona los inversores para ver sus conexiones basadas en posiciones comunes"
         )
@@ -1561,6 +1812,30 @@ elif view_mode == "🕸️ Análisis de Red":
             value=2,
             help="Número mínimo de acciones comunes para mostrar conexión"
         )
+        approximate_net = st.toggle(
+            "Modo aproximado (MinHash)",
+            value=False,
+            key="network_approximate",
+            help="Estima el solapamiento con firmas MinHash y bandas LSH en lugar de contar todos los pares; pensado para universos muy grandes"
+        )
+        if approximate_net:
+            num_perm = st.select_slider(
+                "Tamaño de firma",
+                options=[64, 128, 256],
+                value=128,
+                key="network_num_perm",
+                help="Más componentes = estimación más precisa (error ~1/√n) pero firmas y consultas más lentas"
+            )
+            # Below this threshold LSH would need single-row bands and prune nothing
+            min_jaccard = min_lsh_threshold(num_perm)
+            if st.session_state.get("network_jaccard", min_jaccard) < min_jaccard:
+                st.session_state["network_jaccard"] = min_jaccard
+            jaccard_threshold = st.slider(
+                "Jaccard mínimo", min_jaccard, 0.9, step=0.05,
+                key="network_jaccard",
+                help="Solo se conectan pares cuyo Jaccard estimado (comunes / unión) alcance este valor; "
+                     "el mínimo depende del tamaño de firma"
+            )
     
     if not selected_investors_net:
         st.warning("⚠️ Por favor selecciona al menos 2 inversores para el análisis de red.")
@@ -1569,9 +1844,6 @@ elif view_mode == "🕸️ Análisis de Red":
         st.warning("⚠️ Necesitas al menos 2 inversores para ver conexiones de red.")
         st.stop()
     
-    # Filter data for selected investors
-    network_df = filtered_df[filtered_df['Investor'].isin(selected_investors_net)]
-    
     st.markdown("---")
     
     st.markdown("### 🌐 Red de Posiciones Comunes")
@@ -1601,62 +1873,68 @@ elif view_mode == "🕸️ Análisis de Red":
         """)
     
     # Find stocks held by multiple investors among selected
-    multi_investor_stocks = network_df.groupby('Stock')['Investor'].nunique()
-    multi_investor_stocks = multi_investor_stocks[multi_investor_stocks >= 2].index
+    network_rows = holdings_matrix.investor_codes(selected_investors_net)
+    multi_investor_stocks = holdings_matrix.ownership[network_rows].getnnz(axis=0) >= 2
     
-    if len(multi_investor_stocks) == 0:
+    if not multi_investor_stocks.any():
         st.warning("No se encontraron posiciones comunes entre los inversores seleccionados.")
     else:
-        network_data = network_df[network_df['Stock'].isin(multi_investor_stocks)]
-        
-        # Create chord diagram data with selected investors
-        chord_data = []
-        investors = selected_investors_net  # Use the selected investors
-        
-        for i, inv1 in enumerate(investors):
-            for j, inv2 in enumerate(investors):
-                if i < j:
-                    inv1_stocks = set(network_data[network_data['Investor'] == inv1]['Stock'])
-                    inv2_stocks = set(network_data[network_data['Investor'] == inv2]['Stock'])
-                    common = len(inv1_stocks.intersection(inv2_stocks))
-                    if common >= min_common_stocks:  # Use the minimum threshold
-                        chord_data.append({'source': inv1, 'target': inv2, 'value': common})
+        if approximate_net:
+            # Signatures are built once per filter state; LSH only verifies candidate pairs
+            signatures = derived('minhash', lambda: MinHashSignatures(holdings_matrix.ownership, num_perm), num_perm)
+            source_idx, target_idx, _, estimated = signatures.similar_pairs(network_rows, jaccard_threshold)
+            common = np.rint(estimated).astype(np.int64)
+            keep = common >= min_common_stocks
+            source_idx, target_idx, common = source_idx[keep], target_idx[keep], common[keep]
+        else:
+            # Common-holdings counts for every pair come from one cached B·Bᵀ product
+            network_overlap = derived('overlap', lambda: common_holdings(holdings_matrix.ownership))[network_rows][:, network_rows]
+            source_idx, target_idx, common = overlap_pairs(network_overlap, min_common_stocks)
+        investors = holdings_matrix.investors[network_rows]
         
         # Create Sankey diagram
-        chord_df = pd.DataFrame(chord_data)
+        chord_df = pd.DataFrame({
+            'source': investors[source_idx],
+            'target': investors[target_idx],
+            'value': common
+        })
         
         if not chord_df.empty:
             st.caption(f"📊 Mostrando {len(chord_df)} conexiones con al menos {min_common_stocks} acciones comunes entre {len(selected_investors_net)} inversores")
+            if approximate_net:
+                st.caption(f"≈ Conteos estimados con firmas MinHash de {num_perm} componentes y Jaccard ≥ {jaccard_threshold:.2f}")
             
             # Get unique nodes
             nodes = list(set(chord_df['source'].unique()) | set(chord_df['target'].unique()))
             node_indices = {node: i for i, node in enumerate(nodes)}
             
-            fig_sankey = go.Figure(data=[go.Sankey(
-                node=dict(
-                    pad=15,
-                    thickness=20,
-                    line=dict(color="black", width=0.5),
-                    label=nodes,
-                    color='rgba(102, 126, 234, 0.8)'
-                ),
-                link=dict(
-                    source=[node_indices[s] for s in chord_df['source']],
-                    target=[node_indices[t] for t in chord_df['target']],
-                    value=chord_df['value'],
-                    color='rgba(102, 126, 234, 0.3)',
-                    label=chord_df['value'].astype(str) + ' acciones comunes'
-                )
-            )])
+            def build_sankey():
+                fig_sankey = go.Figure(data=[go.Sankey(
+                    node=dict(
+                        pad=15,
+                        thickness=20,
+                        line=dict(color="black", width=0.5),
+                        label=nodes,
+                        color='rgba(102, 126, 234, 0.8)'
+                    ),
+                    link=dict(
+                        source=[node_indices[s] for s in chord_df['source']],
+                        target=[node_indices[t] for t in chord_df['target']],
+                        value=chord_df['value'],
+                        color='rgba(102, 126, 234, 0.3)',
+                        label=chord_df['value'].astype(str) + ' acciones comunes'
+                    )
+                )])
             
-            fig_sankey.update_layout(
-                title="Red de Posiciones Comunes entre Inversores",
-                height=700,
-                paper_bgcolor='rgba(0,0,0,0)',
-                font=dict(color='white', size=10)
-            )
+                fig_sankey.update_layout(
+                    title="Red de Posiciones Comunes entre Inversores",
+                    height=700,
+                    paper_bgcolor='rgba(0,0,0,0)',
+                    font=dict(color='white', size=10)
+                )
+                return fig_sankey
             
-            st.plotly_chart(fig_sankey, use_container_width=True)
+            show_figure('sankey', build_sankey, chord_df, nodes)
             
             # Show statistics
             col1, col2, col3 = st.columns(3)
@@ -1687,54 +1965,41 @@ elif view_mode == "🕸️ Análisis de Red":
 
 elif view_mode == "👤 Análisis Individual":
     # Individual investor analysis with advanced visualizations
-    investor_df = filtered_df[filtered_df['Investor'] == selected_investor].copy()
+    investor_df = portfolios.portfolio(selected_investor)
     
     st.markdown(f"## 🎭 {selected_investor} - Análisis Completo de Cartera", unsafe_allow_html=True)
     
     # Metrics row
     col1, col2, col3, col4, col5 = st.columns(5)
     
+    if selected_investor in investor_stats.index:
+        investor_summary = investor_stats.loc[selected_investor]
+    else:
+        investor_summary = pd.Series(0, index=investor_stats.columns)
+    
     with col1:
-        st.metric("Posiciones", f"{len(investor_df)}")
+        st.metric("Posiciones", f"{investor_summary['Posiciones']:.0f}")
     with col2:
-        if not investor_df.empty:
-            total_value = investor_df['Value_Clean'].sum() / 1e6
-        else:
-            total_value = 0
+        total_value = investor_summary['Valor_Total'] / 1e6
         st.metric("Valor Cartera", f"${total_value:.1f}M")
     with col3:
-        if not investor_df.empty:
-            top_holding_df = investor_df.nlargest(1, '% of Portfolio')
-            if not top_holding_df.empty:
-                top_holding = top_holding_df['% of Portfolio'].values[0]
-            else:
-                top_holding = 0
-        else:
-            top_holding = 0
+        top_holding = investor_summary['Top1']
         st.metric("Top Posición", f"{top_holding:.1f}%")
     with col4:
-        if not investor_df.empty:
-            top5_df = investor_df.nlargest(5, '% of Portfolio')
-            if not top5_df.empty:
-                concentration = top5_df['% of Portfolio'].sum()
-            else:
-                concentration = 0
-        else:
-            concentration = 0
+        concentration = investor_summary['Concentracion_Top5']
         st.metric("Conc. Top 5", f"{concentration:.1f}%")
     with col5:
-        if len(investor_df) > 0:
-            buy_ratio = (investor_df['Activity_Type'].isin(['Compra', 'Añadir'])).sum() / len(investor_df) * 100
-        else:
-            buy_ratio = 0
+        buy_ratio = investor_summary['Ratio_Compra']
         st.metric("Ratio Compra/Añadir", f"{buy_ratio:.1f}%")
     
     st.markdown("---")
     
     # Create tabs for different visualizations
-    tab1, tab2, tab3, tab4 = st.tabs(["🍩 Vista General de Cartera", "📊 Análisis de Posiciones", "🎯 Vista Treemap", "📈 Tabla de Posiciones"])
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["🍩 Vista General de Cartera", "📊 Análisis de Posiciones", "🎯 Vista Treemap", "📈 Tabla de Posiciones", "🧭 Inversores Similares"], key="individual_tabs", on_change="rerun")
     
-    with tab1:
+    @st.fragment
+    def overview_tab():
+        """Composición de la cartera del inversor"""
         st.markdown("### 🍩 Composición de Cartera")
         with st.expander("ℹ️ Cómo leer este gráfico de dona"):
             st.markdown("""
@@ -1754,39 +2019,47 @@ elif view_mode == "👤 Análisis Individual":
         
         if not investor_df.empty:
             # Enhanced donut chart
-            fig_donut = px.pie(
-                investor_df.nlargest(20, '% of Portfolio'),
-                values='% of Portfolio',
-                names='Stock',
-                title=f'Distribución de Top 20 Posiciones',
-                hole=0.6
-            )
+            def build_donut():
+                fig_donut = px.pie(
+                    top_k_per_group(investor_df, 20),
+                    values='% of Portfolio',
+                    names='Stock',
+                    title=f'Distribución de Top 20 Posiciones',
+                    hole=0.6
+                )
             
-            fig_donut.update_traces(
-                textposition='inside',
-                textinfo='percent+label',
-                hovertemplate='<b>%{label}</b><br>Cartera: %{percent}<br>Peso: %{value:.2f}%<extra></extra>'
-            )
+                fig_donut.update_traces(
+                    textposition='inside',
+                    textinfo='percent+label',
+                    hovertemplate='<b>%{label}</b><br>Cartera: %{percent}<br>Peso: %{value:.2f}%<extra></extra>'
+                )
             
-            # Add center text
-            fig_donut.add_annotation(
-                text=f"{len(investor_df)}<br>Posiciones",
-                x=0.5, y=0.5,
-                font=dict(size=20, color='white'),
-                showarrow=False
-            )
+                # Add center text
+                fig_donut.add_annotation(
+                    text=f"{len(investor_df)}<br>Posiciones",
+                    x=0.5, y=0.5,
+                    font=dict(size=20, color='white'),
+                    showarrow=False
+                )
             
-            fig_donut.update_layout(
-                height=500,
-                paper_bgcolor='rgba(0,0,0,0)',
-                font=dict(color='white')
-            )
+                fig_donut.update_layout(
+                    height=500,
+                    paper_bgcolor='rgba(0,0,0,0)',
+                    font=dict(color='white')
+                )
+                return fig_donut
             
-            st.plotly_chart(fig_donut, use_container_width=True)
+            show_figure('donut', build_donut, investor_df)
         else:
             st.info("Sin datos de posiciones disponibles para este inversor")
     
-    with tab2:
+    with tab1:
+        if tab1.open:
+            overview_tab()
+    
+    @st.fragment
+    def positions_tab():
+        """Pesos y actividad de cada posición"""
         st.markdown("### 📊 Análisis de Tamaño de Posición y Actividad")
         
         # Add controls for chart display
@@ -1828,7 +2101,8 @@ elif view_mode == "👤 Análisis Individual":
             
             # Select data based on checkbox
             if show_all_positions:
-                chart_data = sorted_df
+                # Past the point budget the smallest positions become one "Otros" bar per activity
+                chart_data = collapse_tail(sorted_df, point_budget, '% of Portfolio', 'Stock', by=['Activity_Type'])
                 title_text = f'Todas las {len(sorted_df)} Posiciones con Actividad Reciente'
             else:
                 chart_data = sorted_df.head(20)
@@ -1842,39 +2116,41 @@ elif view_mode == "👤 Análisis Individual":
                 'Mantener': '#9CA3AF'
             }
             
-            fig_bar = px.bar(
-                chart_data,
-                x='Stock',
-                y='% of Portfolio',
-                color='Activity_Type',
-                title=title_text,
-                color_discrete_map=color_map,
-                hover_data=['Value', 'Shares', 'RecentActivity']
-            )
+            def build_bar():
+                fig_bar = px.bar(
+                    chart_data,
+                    x='Stock',
+                    y='% of Portfolio',
+                    color='Activity_Type',
+                    title=title_text,
+                    color_discrete_map=color_map,
+                    hover_data=['Value', 'Shares', 'RecentActivity']
+                )
             
-            # Adjust layout based on number of positions
-            fig_height = 500 if len(chart_data) <= 30 else 600
+                # Adjust layout based on number of positions
+                fig_height = 500 if len(chart_data) <= 30 else 600
             
-            fig_bar.update_layout(
-                height=fig_height,
-                xaxis_tickangle=-45,
-                paper_bgcolor='rgba(0,0,0,0)',
-                plot_bgcolor='rgba(0,0,0,0)',
-                font=dict(color='white', size=9 if len(chart_data) > 30 else 10),
-                showlegend=True,
-                legend=dict(
-                    orientation="h",
-                    yanchor="bottom",
-                    y=1.02,
-                    xanchor="right",
-                    x=1
-                ),
-                xaxis=dict(
-                    tickmode='linear' if len(chart_data) <= 30 else 'auto'
+                fig_bar.update_layout(
+                    height=fig_height,
+                    xaxis_tickangle=-45,
+                    paper_bgcolor='rgba(0,0,0,0)',
+                    plot_bgcolor='rgba(0,0,0,0)',
+                    font=dict(color='white', size=9 if len(chart_data) > 30 else 10),
+                    showlegend=True,
+                    legend=dict(
+                        orientation="h",
+                        yanchor="bottom",
+                        y=1.02,
+                        xanchor="right",
+                        x=1
+                    ),
+                    xaxis=dict(
+                        tickmode='linear' if len(chart_data) <= 30 else 'auto'
+                    )
                 )
-            )
+                return fig_bar
             
-            st.plotly_chart(fig_bar, use_container_width=True)
+            show_figure('bar', build_bar, chart_data, title_text)
             
             # Show summary statistics
             col_stat1, col_stat2, col_stat3, col_stat4 = st.columns(4)
@@ -1893,7 +2169,13 @@ elif view_mode == "👤 Análisis Individual":
         else:
             st.info("Sin datos de posiciones disponibles")
     
-    with tab3:
+    with tab2:
+        if tab2.open:
+            positions_tab()
+    
+    @st.fragment
+    def treemap_tab():
+        """Treemap de la cartera"""
         st.markdown("### 🎯 Treemap Interactivo de Cartera")
         with st.expander("ℹ️ Cómo navegar el treemap"):
             st.markdown("""
@@ -1911,27 +2193,38 @@ elif view_mode == "👤 Análisis Individual":
             """)
         
         if not investor_df.empty:
-            # Treemap of portfolio
-            fig_treemap = px.treemap(
-                investor_df,
-                path=['Activity_Type', 'Stock'],
-                values='% of Portfolio',
-                color='Activity_Percentage',
-                color_continuous_scale='RdYlGn',
-                title='Jerarquía de Cartera por Actividad'
-            )
+            # Treemap of portfolio, smallest positions summed per activity above the point budget
+            treemap_df = collapse_tail(investor_df, point_budget, '% of Portfolio', 'Stock',
+                                       by=['Activity_Type'], means=['Activity_Percentage'])
+            
+            def build_treemap():
+                fig_treemap = px.treemap(
+                    treemap_df,
+                    path=['Activity_Type', 'Stock'],
+                    values='% of Portfolio',
+                    color='Activity_Percentage',
+                    color_continuous_scale='RdYlGn',
+                    title='Jerarquía de Cartera por Actividad'
+                )
             
-            fig_treemap.update_layout(
-                height=600,
-                paper_bgcolor='rgba(0,0,0,0)',
-                font=dict(color='white')
-            )
+                fig_treemap.update_layout(
+                    height=600,
+                    paper_bgcolor='rgba(0,0,0,0)',
+                    font=dict(color='white')
+                )
+                return fig_treemap
             
-            st.plotly_chart(fig_treemap, use_container_width=True)
+            show_figure('treemap', build_treemap, treemap_df)
         else:
             st.info("Sin datos de posiciones disponibles")
     
-    with tab4:
+    with tab3:
+        if tab3.open:
+            treemap_tab()
+    
+    @st.fragment
+    def holdings_table_tab():
+        """Tabla de posiciones"""
         st.markdown("### 📋 Tabla Detallada de Posiciones")
         with st.expander("ℹ️ Características de la tabla"):
             st.markdown("""
@@ -1942,6 +2235,9 @@ elif view_mode == "👤 Análisis Individual":
             - **Valor:** Valor en dólares de la posición
             - **Actividad Reciente:** Última acción de trading
             - **Tipo Actividad:** Actividad categorizada
+            - **Precio Actual:** Último precio de la acción
+            - **Desde Reporte:** Variación del precio desde el precio reportado en el 13F
+            - **Rango 52S:** Posición del precio actual entre el mínimo (0%) y el máximo (100%) de 52 semanas
             
             **Ordenamiento:** Clic en encabezados de columna para ordenar
             **Búsqueda:** Usa búsqueda del navegador (Ctrl+F) para encontrar acciones específicas
@@ -1949,7 +2245,8 @@ elif view_mode == "👤 Análisis Individual":
         
         if not investor_df.empty:
             # Enhanced table
-            display_cols = ['Stock', '% of Portfolio', 'Shares', 'Value', 'RecentActivity', 'Activity_Type']
+            display_cols = ['Stock', '% of Portfolio', 'Shares', 'Value', 'RecentActivity', 'Activity_Type',
+                            'Current_Price', 'Unrealized_Move_Pct', 'Range_Position_52W']
             display_df = investor_df[display_cols].sort_values('% of Portfolio', ascending=False)
             
             st.dataframe(
@@ -1962,7 +2259,7 @@ elif view_mode == "👤 Análisis Individual":
                         "% Cartera",
                         format="%.2f%%",
                         min_value=0,
-                        max_value=display_df['% of Portfolio'].max(),
+                        max_value=float(display_df['% of Portfolio'].max()),
                     ),
                     "Shares": st.column_config.NumberColumn(
                         "Acciones",
@@ -1971,21 +2268,87 @@ elif view_mode == "👤 Análisis Individual":
                     "Activity_Type": st.column_config.TextColumn(
                         "Actividad",
                         help="Compra/Añadir/Reducir/Mantener"
+                    ),
+                    "Current_Price": st.column_config.NumberColumn(
+                        "Precio Actual",
+                        format="$%.2f"
+                    ),
+                    "Unrealized_Move_Pct": st.column_config.NumberColumn(
+                        "Desde Reporte",
+                        format="%+.2f%%",
+                        help="Variación del precio desde el precio reportado"
+                    ),
+                    "Range_Position_52W": st.column_config.ProgressColumn(
+                        "Rango 52S",
+                        format="%.0f%%",
+                        min_value=0,
+                        max_value=100,
+                        help="0% = mínimo de 52 semanas, 100% = máximo"
                     )
                 }
             )
         else:
             st.info("Sin datos de posiciones disponibles")
+    
+    with tab4:
+        if tab4.open:
+            holdings_table_tab()
+    
+    @st.fragment
+    def similar_investors_tab():
+        """Inversores con carteras más parecidas"""
+        st.markdown("### 🧭 Inversores Más Similares")
+        with st.expander("ℹ️ Cómo se calcula"):
+            st.markdown("""
+            **Similitud:** Coseno entre los vectores de pesos de cartera (1 = misma cartera con los mismos pesos, 0 = ninguna acción en común).
+            **Alcance:** Se compara la cartera completa de cada inversor, sin los filtros globales, contra todo el universo.
+            **Uso:** Encuentra inversores con un estilo parecido para descubrir ideas afines o comparar sus carteras en la vista comparativa.
+            """)
+        
+        num_neighbors = st.slider("Número de inversores similares", 5, 25, 10, key="num_neighbors")
+        neighbors_df = load_neighbors(store.snapshot).query(selected_investor, num_neighbors)
+        
+        if not neighbors_df.empty:
+            neighbors_df.insert(0, 'Rango', np.arange(1, len(neighbors_df) + 1))
+            st.dataframe(
+                neighbors_df,
+                use_container_width=True,
+                hide_index=True,
+                column_config={
+                    "Investor": st.column_config.TextColumn("Inversor"),
+                    "Similitud": st.column_config.ProgressColumn(
+                        "Similitud",
+                        format="%.3f",
+                        min_value=0,
+                        max_value=1
+                    ),
+                    "Acciones_Comunes": st.column_config.NumberColumn(
+                        "Acciones en Común",
+                        format="%d"
+                    )
+                }
+            )
+        else:
+            st.info("Ningún otro inversor comparte acciones con esta cartera")
+    
+    with tab5:
+        if tab5.open:
+            similar_investors_tab()
 
 elif view_mode == "🎭 Análisis Comparativo":
     st.markdown("## 🎭 Análisis Comparativo de Carteras", unsafe_allow_html=True)
     
     if selected_investors:
-        comparison_df = filtered_df[filtered_df['Investor'].isin(selected_investors)]
+        comparison_df = portfolios.portfolios(selected_investors)
         
         if comparison_df.empty:
             st.warning("Sin datos disponibles para los inversores seleccionados con los filtros actuales.")
         else:
+            # Each held stock's holder set as a bitmask over the selection; every
+            # overlap figure below reads from its intersection regions
+            holder_masks = derived('holder_masks', lambda: HolderMasks(holdings_matrix, selected_investors), tuple(selected_investors))
+            unique_positions = holder_masks.unique_counts()
+            
             # Comparison metrics
             col1, col2 = st.columns(2)
             
@@ -2006,43 +2369,47 @@ elif view_mode == "🎭 Análisis Comparativo":
                     """)
                 
                 # Portfolio size comparison
-                portfolio_sizes = comparison_df.groupby('Investor').agg({
-                    'Stock': 'nunique',
-                    'Value_Clean': lambda x: x.sum() / 1e9  # Convert to billions
-                }).reset_index()
+                comparison_stats = investor_stats[investor_stats.index.isin(selected_investors)]
+                portfolio_sizes = pd.DataFrame({
+                    'Investor': comparison_stats.index,
+                    'Stock': comparison_stats['Num_Acciones'].to_numpy(),
+                    'Value_Clean': comparison_stats['Valor_Total'].to_numpy() / 1e9  # Convert to billions
+                })
                 
                 portfolio_sizes.columns = ['Inversor', 'Número de Posiciones', 'Valor de Cartera ($B)']
                 
-                fig_comparison = px.bar(
-                    portfolio_sizes.melt(id_vars='Inversor'),
-                    x='Inversor',
-                    y='value',
-                    color='variable',
-                    title='Tamaño y Diversificación de Cartera',
-                    barmode='group',
-                    labels={'value': 'Conteo/Valor', 'variable': 'Métrica'},
-                    color_discrete_map={
-                        'Número de Posiciones': '#60A5FA',
-                        'Valor de Cartera ($B)': '#F87171'
-                    }
-                )
+                def build_comparison():
+                    fig_comparison = px.bar(
+                        portfolio_sizes.melt(id_vars='Inversor'),
+                        x='Inversor',
+                        y='value',
+                        color='variable',
+                        title='Tamaño y Diversificación de Cartera',
+                        barmode='group',
+                        labels={'value': 'Conteo/Valor', 'variable': 'Métrica'},
+                        color_discrete_map={
+                            'Número de Posiciones': '#60A5FA',
+                            'Valor de Cartera ($B)': '#F87171'
+                        }
+                    )
                 
-                fig_comparison.update_layout(
-                    height=400,
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    font=dict(color='white'),
-                    xaxis_tickangle=-45,
-                    legend=dict(
-                        orientation="h",
-                        yanchor="bottom",
-                        y=1.02,
-                        xanchor="right",
-                        x=1
+                    fig_comparison.update_layout(
+                        height=400,
+                        paper_bgcolor='rgba(0,0,0,0)',
+                        plot_bgcolor='rgba(0,0,0,0)',
+                        font=dict(color='white'),
+                        xaxis_tickangle=-45,
+                        legend=dict(
+                            orientation="h",
+                            yanchor="bottom",
+                            y=1.02,
+                            xanchor="right",
+                            x=1
+                        )
                     )
-                )
+                    return fig_comparison
                 
-                st.plotly_chart(fig_comparison, use_container_width=True)
+                show_figure('comparison', build_comparison, portfolio_sizes)
             
             with col2:
                 st.markdown("### 🔗 Análisis de Posiciones Comunes")
@@ -2060,16 +2427,11 @@ elif view_mode == "🎭 Análisis Comparativo":
                     - Posiciones comunes = Ideas de alta convicción
                     """)
                 
-                common_holdings = {}
-                for investor in selected_investors:
-                    holdings = set(comparison_df[comparison_df['Investor'] == investor]['Stock'])
-                    common_holdings[investor] = holdings
-                
                 # Calculate overlaps
                 if len(selected_investors) == 2:
-                    overlap = len(common_holdings[selected_investors[0]] & common_holdings[selected_investors[1]])
-                    unique_1 = len(common_holdings[selected_investors[0]] - common_holdings[selected_investors[1]])
-                    unique_2 = len(common_holdings[selected_investors[1]] - common_holdings[selected_investors[0]])
+                    overlap = len(holder_masks.common())
+                    unique_1 = int(unique_positions[selected_investors[0]])
+                    unique_2 = int(unique_positions[selected_investors[1]])
                     
                     # Create metrics
                     st.metric("🤝 Posiciones Comunes", overlap)
@@ -2085,108 +2447,227 @@ elif view_mode == "🎭 Análisis Comparativo":
                         'Conteo': [overlap, unique_1, unique_2]
                     })
                     
-                    fig_venn = px.pie(
-                        overlap_data,
-                        values='Conteo',
-                        names='Categoría',
-                        title='Distribución de Posiciones',
-                        hole=0.4,
-                        color_discrete_map={
-                            'Comunes': '#764ba2',
-                            f'{selected_investors[0][:15]} Solo': '#667eea',
-                            f'{selected_investors[1][:15]} Solo': '#00d2ff'
-                        }
-                    )
+                    def build_venn():
+                        fig_venn = px.pie(
+                            overlap_data,
+                            values='Conteo',
+                            names='Categoría',
+                            title='Distribución de Posiciones',
+                            hole=0.4,
+                            color_discrete_map={
+                                'Comunes': '#764ba2',
+                                f'{selected_investors[0][:15]} Solo': '#667eea',
+                                f'{selected_investors[1][:15]} Solo': '#00d2ff'
+                            }
+                        )
                     
-                    fig_venn.update_layout(
-                        height=300,
-                        paper_bgcolor='rgba(0,0,0,0)',
-                        font=dict(color='white')
-                    )
+                        fig_venn.update_layout(
+                            height=300,
+                            paper_bgcolor='rgba(0,0,0,0)',
+                            font=dict(color='white')
+                        )
+                        return fig_venn
                     
-                    st.plotly_chart(fig_venn, use_container_width=True)
+                    show_figure('venn', build_venn, overlap_data)
                     
                 elif len(selected_investors) >= 3:
-                    all_common = set.intersection(*common_holdings.values()) if common_holdings else set()
-                    st.metric("🤝 Posiciones en Todas las Carteras", len(all_common))
+                    st.metric("🤝 Posiciones en Todas las Carteras", len(holder_masks.common()))
                     
-                    unique_counts = []
-                    for investor in selected_investors[:5]:  # Limit to 5 for display
-                        if investor in common_holdings:
-                            unique = len(common_holdings[investor] - set.union(*[h for k, h in common_holdings.items() if k != investor]))
-                            unique_counts.append({'Inversor': investor[:20], 'Posiciones Únicas': unique})
+                    unique_counts = [{'Inversor': investor[:20], 'Posiciones Únicas': int(unique)}
+                                     for investor, unique in unique_positions.items()]
                     
                     if unique_counts:
                         unique_df = pd.DataFrame(unique_counts)
                         
-                        fig_unique = px.bar(
-                            unique_df,
-                            x='Inversor',
-                            y='Posiciones Únicas',
-                            title='Posiciones Únicas por Inversor',
-                            color='Posiciones Únicas',
-                            color_continuous_scale='Viridis'
-                        )
+                        def build_unique():
+                            fig_unique = px.bar(
+                                unique_df,
+                                x='Inversor',
+                                y='Posiciones Únicas',
+                                title='Posiciones Únicas por Inversor',
+                                color='Posiciones Únicas',
+                                color_continuous_scale='Viridis'
+                            )
                         
-                        fig_unique.update_layout(
-                            height=300,
-                            paper_bgcolor='rgba(0,0,0,0)',
-                            plot_bgcolor='rgba(0,0,0,0)',
-                            font=dict(color='white'),
-                            xaxis_tickangle=-45,
-                            showlegend=False
-                        )
+                            fig_unique.update_layout(
+                                height=300,
+                                paper_bgcolor='rgba(0,0,0,0)',
+                                plot_bgcolor='rgba(0,0,0,0)',
+                                font=dict(color='white'),
+                                xaxis_tickangle=-45,
+                                showlegend=False
+                            )
+                            return fig_unique
                         
-                        st.plotly_chart(fig_unique, use_container_width=True)
+                        show_figure('unique', build_unique, unique_df)
+            
+            # Exact intersection regions, UpSet-style: region sizes over a membership matrix
+            if len(selected_investors) >= 3:
+                st.markdown("### 🧮 Regiones de Intersección")
+                with st.expander("ℹ️ Cómo leer el gráfico UpSet"):
+                    st.markdown("""
+                    **Qué muestra:** Cada columna es una región exacta: las acciones que tienen exactamente los inversores marcados debajo y ninguno más.
+                    
+                    **Cómo leerlo:**
+                    - **Barras:** Número de acciones en la región
+                    - **Puntos unidos:** Inversores que forman la región
+                    - **Un solo punto:** Posiciones únicas de ese inversor
+                    
+                    A diferencia de un diagrama de Venn, escala a cualquier número de inversores.
+                    """)
+                
+                regions = holder_masks.regions()
+                max_regions = len(regions)
+                if len(regions) > 5:
+                    max_regions = st.slider(
+                        "Regiones a mostrar",
+                        min_value=5,
+                        max_value=min(60, len(regions)),
+                        value=min(20, len(regions)),
+                        key="upset_regions"
+                    )
+                shown_regions = regions.head(max_regions)
+                member_matrix = shown_regions[holder_masks.investors].to_numpy()
+                region_x = np.arange(len(shown_regions))
+                
+                region_hover = []
+                for region in shown_regions.index:
+                    stocks = holder_masks.region_stocks(region)
+                    listed = ", ".join(stocks[:8]) + (f" y {len(stocks) - 8} más" if len(stocks) > 8 else "")
+                    region_hover.append(listed)
+                
+                def build_upset():
+                    fig_upset = make_subplots(rows=2, cols=1, shared_xaxes=True, row_heights=[0.55, 0.45], vertical_spacing=0.03)
+                    fig_upset.add_trace(go.Bar(
+                        x=region_x,
+                        y=shown_regions['Acciones'],
+                        text=shown_regions['Acciones'],
+                        textposition='outside',
+                        customdata=region_hover,
+                        hovertemplate='%{y} acciones<br>%{customdata}<extra></extra>',
+                        marker_color='#667eea',
+                        name='Acciones'
+                    ), row=1, col=1)
+                
+                    # Membership grid: grey dots everywhere, filled dots joined by a line per region
+                    grid_x, grid_y = np.meshgrid(region_x, np.arange(len(holder_masks.investors)), indexing='ij')
+                    fig_upset.add_trace(go.Scatter(
+                        x=grid_x.ravel(), y=grid_y.ravel(), mode='markers',
+                        marker=dict(size=9, color='rgba(160, 174, 192, 0.25)'),
+                        hoverinfo='skip', showlegend=False
+                    ), row=2, col=1)
+                
+                    line_x, line_y = [], []
+                    for x, members in zip(region_x, member_matrix):
+                        positions = np.flatnonzero(members)
+                        line_x += [x, x, None]
+                        line_y += [positions.min(), positions.max(), None]
+                    fig_upset.add_trace(go.Scatter(
+                        x=line_x, y=line_y, mode='lines',
+                        line=dict(color='#764ba2', width=3),
+                        hoverinfo='skip', showlegend=False
+                    ), row=2, col=1)
+                
+                    filled_x, filled_y = np.nonzero(member_matrix)
+                    fig_upset.add_trace(go.Scatter(
+                        x=region_x[filled_x], y=filled_y, mode='markers',
+                        marker=dict(size=11, color='#764ba2'),
+                        hoverinfo='skip', showlegend=False
+                    ), row=2, col=1)
+                
+                    fig_upset.update_xaxes(showticklabels=False, showgrid=False)
+                    fig_upset.update_yaxes(title_text='Acciones', row=1, col=1)
+                    fig_upset.update_yaxes(
+                        tickvals=np.arange(len(holder_masks.investors)),
+                        ticktext=[investor[:25] for investor in holder_masks.investors],
+                        autorange='reversed', showgrid=False, row=2, col=1
+                    )
+                    fig_upset.update_layout(
+                        title=f'Intersecciones Exactas entre {len(selected_investors)} Inversores ({len(regions)} regiones)',
+                        height=450 + 22 * len(holder_masks.investors),
+                        paper_bgcolor='rgba(0,0,0,0)',
+                        plot_bgcolor='rgba(0,0,0,0)',
+                        font=dict(color='white'),
+                        showlegend=False
+                    )
+                    return fig_upset
+                
+                show_figure('upset', build_upset, shown_regions, region_hover, len(regions), len(selected_investors))
             
             # Common stocks table
             if len(selected_investors) >= 2:
                 st.markdown("### 📋 Análisis Detallado de Superposición")
                 
-                # Find common stocks
-                all_holdings = [common_holdings[inv] for inv in selected_investors if inv in common_holdings]
-                if all_holdings:
-                    common_stocks = set.intersection(*all_holdings)
+                # Stocks every selected investor holds: the full-mask region
+                common_stocks = holder_masks.common()
+                
+                if len(common_stocks):
+                    st.markdown(f"#### Acciones poseídas por los {len(selected_investors)} inversores seleccionados:")
                     
-                    if common_stocks:
-                        st.markdown(f"#### Acciones poseídas por los {len(selected_investors)} inversores seleccionados:")
-                        
-                        common_details = []
-                        for stock in common_stocks:
-                            stock_data = comparison_df[comparison_df['Stock'] == stock]
-                            avg_weight = stock_data['% of Portfolio'].mean()
-                            total_value = stock_data['Value_Clean'].sum() / 1e6
-                            common_details.append({
-                                'Acción': stock,
-                                'Peso Promedio': avg_weight,
-                                'Valor Total ($M)': total_value,
-                                'Inversores': len(stock_data)
-                            })
-                        
-                        common_df = pd.DataFrame(common_details).sort_values('Peso Promedio', ascending=False)
-                        
-                        st.dataframe(
-                            common_df,
-                            use_container_width=True,
-                            hide_index=True,
-                            column_config={
-                                "Peso Promedio": st.column_config.ProgressColumn(
-                                    "Peso Promedio %",
-                                    format="%.2f%%",
-                                    min_value=0,
-                                    max_value=common_df['Peso Promedio'].max()
-                                ),
-                                "Valor Total ($M)": st.column_config.NumberColumn(
-                                    "Valor Total ($M)",
-                                    format="%.1f"
-                                )
-                            }
-                        )
-                    else:
-                        st.info("No hay acciones poseídas por todos los inversores seleccionados")
+                    # Each common stock's rows come straight from its posting list
+                    selected_codes = holdings_matrix.investor_codes(selected_investors)
+                    weights = df['% of Portfolio'].to_numpy()
+                    values = df['Value_Clean'].to_numpy()
+                    common_details = []
+                    for stock in common_stocks:
+                        holders, rows = stock_index.postings(stock)
+                        rows = rows[np.isin(holders, selected_codes)]
+                        common_details.append({
+                            'Acción': stock,
+                            'Peso Promedio': weights[rows].mean(),
+                            'Valor Total ($M)': values[rows].sum() / 1e6,
+                            'Inversores': len(rows)
+                        })
+                    
+                    common_df = pd.DataFrame(common_details).sort_values('Peso Promedio', ascending=False)
+                    
+                    st.dataframe(
+                        common_df,
+                        use_container_width=True,
+                        hide_index=True,
+                        column_config={
+                            "Peso Promedio": st.column_config.ProgressColumn(
+                                "Peso Promedio %",
+                                format="%.2f%%",
+                                min_value=0,
+                                max_value=float(common_df['Peso Promedio'].max())
+                            ),
+                            "Valor Total ($M)": st.column_config.NumberColumn(
+                                "Valor Total ($M)",
+                                format="%.1f"
+                            )
+                        }
+                    )
+                else:
+                    st.info("No hay acciones poseídas por todos los inversores seleccionados")
     else:
         st.info("Por favor selecciona al menos un inversor desde la barra lateral para comenzar la comparación")
 
+# Cache statistics go last so they include this rerun's lookups
+with st.sidebar.expander("⚙️ Caché de Datos Derivados"):
+    cache_stats = derived_cache.stats()
+    st.metric("Tasa de Aciertos", f"{cache_stats['hit_rate']:.0%}",
+              help=f"{cache_stats['hits']} aciertos / {cache_stats['misses']} fallos")
+    st.metric("Memoria Residente",
+              f"{cache_stats['resident_bytes'] / 1024 ** 2:.1f} / {cache_stats['max_bytes'] / 1024 ** 2:.0f} MB")
+    st.caption(f"{cache_stats['entries']} artefactos en caché · {cache_stats['evictions']} expulsiones")
+
+with st.sidebar.expander("🖼️ Caché de Figuras"):
+    figure_stats = figure_cache.stats()
+    if figure_stats.empty:
+        st.caption("Aún no se ha dibujado ningún gráfico")
+    else:
+        st.dataframe(
+            figure_stats.assign(bytes=figure_stats['bytes'] / 1024)
+                        .rename(columns={'hits': 'Aciertos', 'misses': 'Fallos', 'hit_rate': 'Tasa', 'bytes': 'Envío'}),
+            use_container_width=True,
+            column_config={
+                "Tasa": st.column_config.NumberColumn("Tasa", format="percent"),
+                "Envío": st.column_config.NumberColumn("Envío", format="%.1f KB", help="Tamaño de la figura enviada al navegador")
+            }
+        )
+        st.caption(f"📦 {figure_stats['bytes'].sum() / 1024:,.0f} KB en las últimas figuras servidas • Presupuesto: {point_budget} posiciones por gráfico")
+
 # Footer with attribution
 st.markdown("---")
 st.markdown("""
@@ -0,0 +1,133 @@
+"""Solapamiento aproximado entre carteras con firmas MinHash y bandas LSH"""
+import numpy as np
+
+# Universal hashing h(x) = (a·x + b) mod p with a Mersenne prime; a·x stays below 2**62
+_PRIME = (1 << 31) - 1
+_EMPTY = np.iinfo(np.uint32).max
+
+# Chance that a pair right at the Jaccard threshold becomes an LSH candidate
+TARGET_RECALL = 0.95
+
+# One row per band makes any single shared min-hash a candidate, i.e. nearly all pairs
+MIN_BAND_ROWS = 2
+
+
+def lsh_bands(num_perm, threshold, recall=TARGET_RECALL):
+    """(bandas, filas por banda) con la banda más estricta que aún detecta el umbral con `recall`
+
+    None si ni siquiera MIN_BAND_ROWS filas por banda lo consiguen: a ese umbral LSH
+    no poda pares y conviene el recuento exacto B·Bᵀ.
+    """
+    best = None
+    for rows in range(MIN_BAND_ROWS, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        # P(candidate | J) = 1 - (1 - J^r)^b; wider rows cut false candidates
+        if 1 - (1 - threshold ** rows) ** bands >= recall:
+            best = (bands, rows)
+    return best
+
+
+def min_lsh_threshold(num_perm, step=0.05, recall=TARGET_RECALL):
+    """Menor umbral de Jaccard, múltiplo de `step`, para el que lsh_bands encuentra bandas"""
+    for k in range(1, int(round(1 / step))):
+        threshold = round(k * step, 10)
+        if lsh_bands(num_perm, threshold, recall) is not None:
+            return threshold
+    return None
+
+
+def _pairs_within_groups(members, group_sizes):
+    """Todos los pares (i, j) de cada grupo de `members` (grupos contiguos de tamaños dados)"""
+    # Each member pairs with the members after it in its own group
+    position = np.arange(len(members)) - np.repeat(np.cumsum(group_sizes) - group_sizes, group_sizes)
+    partners = np.repeat(group_sizes, group_sizes) - 1 - position
+    first = np.repeat(np.arange(len(members)), partners)
+    offset = np.arange(len(first)) - np.repeat(np.cumsum(partners) - partners, partners)
+    return members[first], members[first + offset + 1]
+
+
+class MinHashSignatures:
+    """Firma MinHash de tamaño fijo por inversor sobre la matriz de propiedad"""
+
+    def __init__(self, ownership, num_perm=128, seed=0, chunk_entries=1 << 16):
+        self.num_perm = num_perm
+        ownership = ownership.tocsr()
+        self.sizes = ownership.getnnz(axis=1)
+
+        rng = np.random.default_rng(seed)
+        a = rng.integers(1, _PRIME, num_perm, dtype=np.uint64)
+        b = rng.integers(0, _PRIME, num_perm, dtype=np.uint64)
+        stocks = np.arange(ownership.shape[1], dtype=np.uint64)
+        stock_hashes = ((stocks[:, None] * a[None, :] + b[None, :]) % _PRIME).astype(np.uint32)
+
+        # Row minimum of the holders' hashes, in investor blocks so memory stays bounded
+        self.signatures = np.full((ownership.shape[0], num_perm), _EMPTY, dtype=np.uint32)
+        indptr = ownership.indptr
+        row = 0
+        while row < ownership.shape[0]:
+            stop = max(np.searchsorted(indptr, indptr[row] + chunk_entries, side='right') - 1, row + 1)
+            stop = min(stop, ownership.shape[0])
+            block = slice(indptr[row], indptr[stop])
+            nonempty = np.flatnonzero(self.sizes[row:stop]) + row
+            if len(nonempty):
+                hashes = stock_hashes[ownership.indices[block]]
+                self.signatures[nonempty] = np.minimum.reduceat(hashes, indptr[nonempty] - indptr[row], axis=0)
+            row = stop
+
+    def jaccard(self, rows_a, rows_b):
+        """Jaccard estimado: fracción de componentes de la firma que coinciden"""
+        matches = self.signatures[rows_a] == self.signatures[rows_b]
+        any_empty = (self.sizes[rows_a] == 0) | (self.sizes[rows_b] == 0)
+        return np.where(any_empty, 0.0, matches.mean(axis=1))
+
+    def common(self, rows_a, rows_b, jaccard=None):
+        """Acciones en común estimadas a partir del Jaccard y los tamaños exactos: J·(|A|+|B|)/(1+J)"""
+        jaccard = self.jaccard(rows_a, rows_b) if jaccard is None else jaccard
+        return jaccard * (self.sizes[rows_a] + self.sizes[rows_b]) / (1 + jaccard)
+
+    def candidate_pairs(self, rows, bands):
+        """Pares (i, j), i < j en posiciones de `rows`, que coinciden en alguna banda LSH"""
+        band_rows = self.num_perm // bands
+        signatures = self.signatures[rows, :bands * band_rows].astype(np.uint64)
+
+        # Each band slice folds into one 64-bit bucket key (wrapping multiply-add);
+        # a rare key collision only adds a candidate that verification drops
+        multipliers = np.random.default_rng(1).integers(1, 1 << 63, band_rows, dtype=np.uint64) | np.uint64(1)
+        keys = (signatures.reshape(len(rows), bands, band_rows) * multipliers).sum(axis=2, dtype=np.uint64)
+
+        found_i, found_j = [], []
+        for band in range(bands):
+            order = np.argsort(keys[:, band], kind='stable')
+            bounds = np.flatnonzero(np.diff(keys[order, band])) + 1
+            counts = np.diff(np.concatenate(([0], bounds, [len(rows)])))
+            if counts.max(initial=0) < 2:
+                continue
+            i, j = _pairs_within_groups(order, counts)
+            found_i.append(i)
+            found_j.append(j)
+
+        if not found_i:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        i, j = np.concatenate(found_i), np.concatenate(found_j)
+        lo, hi = np.minimum(i, j), np.maximum(i, j)
+        keys = np.unique(lo * len(rows) + hi)
+        return keys // len(rows), keys % len(rows)
+
+    def similar_pairs(self, rows, threshold, bands=None):
+        """Pares con Jaccard estimado >= `threshold` y sus acciones en común estimadas, ordenados por fila"""
+        if bands is None:
+            banding = lsh_bands(self.num_perm, threshold)
+            if banding is None:
+                raise ValueError(f"Jaccard threshold {threshold} is too low for LSH with {self.num_perm} "
+                                 "permutations; count overlaps exactly instead")
+            bands, _ = banding
+        rows = np.asarray(rows)
+        i, j = self.candidate_pairs(rows, bands)
+
+        # Candidates are verified on the full signature, never on the raw sets
+        jaccard = self.jaccard(rows[i], rows[j])
+        keep = jaccard >= threshold
+        i, j, jaccard = i[keep], j[keep], jaccard[keep]
+        return i, j, jaccard, self.common(rows[i], rows[j], jaccard)
@@ -0,0 +1,125 @@
+"""Presupuesto de carga útil: lo que cada figura Plotly envía al navegador"""
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+
+# Plotly's default hover and tick formats show at most six significant digits
+DISPLAY_DIGITS = 6
+
+# Above this many points a 2D scatter is drawn with WebGL instead of SVG
+WEBGL_POINTS = 500
+
+# Plotly.js refuses a node whose value falls below the sum of its children (to 1e-9),
+# which float32 rounding of separately summed parents breaks; these stay float64
+HIERARCHY_TRACES = ('sunburst', 'treemap', 'icicle')
+
+
+def _significant(values, digits):
+    """`values` redondeados a `digits` cifras significativas (los no finitos, intactos)"""
+    magnitude = np.floor(np.log10(np.abs(values), where=values != 0, out=np.zeros_like(values)))
+    scale = 10.0 ** (digits - 1 - magnitude)
+    return np.round(values * scale) / scale
+
+
+def _faithful(values, trimmed, digits):
+    """Si `trimmed` se muestra igual que `values` con `digits` cifras y en unidades enteras
+
+    Lo segundo cubre los formatos explícitos como ',.0f' o '$,.0f', que enseñan todas
+    las cifras enteras de un valor grande y no solo las seis del formato por defecto.
+    """
+    with np.errstate(invalid='ignore', over='ignore'):
+        same_units = np.abs(trimmed - values) < 0.5
+        return (same_units & (_significant(trimmed, digits) == _significant(values, digits))) | ~np.isfinite(values)
+
+
+def _narrow(values, digits):
+    """Array con la precisión de pantalla, o el mismo objeto si recortarlo cambiaría lo mostrado"""
+    if values.dtype.kind == 'f' and values.dtype.itemsize > 4 and digits <= 6:
+        # Plotly ships numeric arrays as typed binary; float32 keeps ~7 significant digits,
+        # but only integers below 2**24 exactly, so large amounts stay float64
+        narrowed = values.astype(np.float32)
+        if _faithful(values, narrowed.astype(values.dtype), digits).all():
+            return narrowed
+        return values
+    if values.dtype == object:
+        # Mixed arrays (customdata) go out as JSON text, where every extra digit is a byte
+        positions = np.flatnonzero(np.fromiter((isinstance(v, float) for v in values.flat), dtype=bool, count=values.size))
+        floats = np.array([values.flat[i] for i in positions], dtype=np.float64)
+        trimmed = np.array([float(f"{v:.{digits}g}") for v in floats], dtype=np.float64)
+        changed = (trimmed != floats) & _faithful(floats, trimmed, digits)
+        if changed.any():
+            result = values.copy()
+            result.flat[positions[changed]] = trimmed[changed].tolist()
+            return result
+    return values
+
+
+def _trimmed(props, digits):
+    """Subconjunto de `props` (anidado) cuyos arrays cambian al recortar la precisión"""
+    changed = {}
+    for key, value in props.items():
+        if isinstance(value, dict):
+            inner = _trimmed(value, digits)
+            if inner:
+                changed[key] = inner
+        elif isinstance(value, np.ndarray):
+            narrowed = _narrow(value, digits)
+            if narrowed is not value:
+                changed[key] = narrowed
+    return changed
+
+
+def _cleared(props):
+    """Mismo anidamiento que `props` con None en cada array"""
+    return {key: _cleared(value) if isinstance(value, dict) else None for key, value in props.items()}
+
+
+def trim_precision(figure, digits=DISPLAY_DIGITS):
+    """Recortar en su sitio los arrays numéricos de cada traza a `digits` cifras significativas"""
+    for trace in figure.data:
+        if trace.type in HIERARCHY_TRACES:
+            continue
+        changed = _trimmed(trace.to_plotly_json(), digits)
+        if changed:
+            # Plotly skips an assignment equal to the current value, and float32 arrays of
+            # exactly representable numbers compare equal: clear the properties first
+            trace.update(_cleared(changed))
+            trace.update(changed)
+    return figure
+
+
+def render_mode(points):
+    """'webgl' para nubes de puntos grandes, 'svg' para las pequeñas (texto y exportación nítidos)"""
+    return 'webgl' if points > WEBGL_POINTS else 'svg'
+
+
+def collapse_tail(frame, budget, weight, label, by=(), sums=(), means=(), other='Otros'):
+    """Las `budget` filas de más `weight`; el resto, sumado en una fila `other` por grupo `by`
+
+    `sums` se suman y `means` se promedian ponderadas por `weight` dentro de cada
+    cubo; el resto de columnas queda vacío en las filas `other`.
+    """
+    if len(frame) <= budget:
+        return frame
+    order = np.argsort(-frame[weight].to_numpy(dtype=np.float64), kind='stable')
+    kept, tail = frame.iloc[np.sort(order[:budget])], frame.iloc[order[budget:]]
+
+    by = list(by)
+    tail = tail.assign(**{f"_{column}": tail[column] * tail[weight] for column in means})
+    keys = tail.groupby(by, observed=True, sort=False) if by else tail.groupby(np.zeros(len(tail)), sort=False)
+    buckets = keys[[weight, *sums, *(f"_{column}" for column in means)]].sum()
+    for column in means:
+        buckets[column] = buckets.pop(f"_{column}") / buckets[weight].where(buckets[weight] > 0)
+    buckets = buckets.reset_index(drop=not by)
+    buckets[label] = other
+
+    # Categorical labels need the bucket name as a category before concatenating
+    if isinstance(frame[label].dtype, pd.CategoricalDtype) and other not in frame[label].cat.categories:
+        kept = kept.assign(**{label: kept[label].cat.add_categories([other])})
+        buckets[label] = pd.Categorical(buckets[label], categories=kept[label].cat.categories)
+    return pd.concat([kept, buckets], ignore_index=True)
+
+
+def payload_bytes(figure):
+    """Tamaño del JSON que Streamlit envía al navegador para `figure`"""
+    return len(pio.to_json(figure, validate=False))
@@ -0,0 +1,220 @@
+"""Comparaciones entre pares de inversores sobre la matriz dispersa de carteras"""
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from analytics import top_k
+
+
+def common_holdings(ownership):
+    """Matriz inversor × inversor con el número de acciones en común (B·Bᵀ)"""
+    owned = ownership.astype(np.int32)
+    return (owned @ owned.T).tocsr()
+
+
+def overlap_pairs(counts, min_common=1):
+    """Pares (i, j) con i < j y al menos `min_common` acciones en común, ordenados por fila"""
+    upper = sparse.triu(counts, k=1).tocoo()
+    keep = upper.data >= min_common
+    rows, cols, common = upper.row[keep], upper.col[keep], upper.data[keep]
+
+    order = np.lexsort((cols, rows))
+    return rows[order], cols[order], common[order]
+
+
+def _pairwise_min(shares, max_pairs=1 << 22):
+    """Σ_k min(p_ik, p_jk) para todos los pares, expandiendo los pares dentro de cada acción"""
+    by_stock = shares.tocsc()
+    size = shares.shape[0]
+    sizes = np.diff(by_stock.indptr).astype(np.int64)
+    cost = np.cumsum(sizes ** 2)
+    overlap = np.zeros(size * size)
+
+    # Every entry is paired with every entry of its own stock column (Σ holders² pairs),
+    # expanded in batches of columns so memory stays bounded on large universes
+    start = 0
+    while start < len(sizes):
+        done = cost[start - 1] if start else 0
+        stop = max(np.searchsorted(cost, done + max_pairs, side='right'), start + 1)
+
+        batch = sizes[start:stop]
+        holders = np.repeat(batch, batch)
+        first = by_stock.indptr[start]
+        left = first + np.repeat(np.arange(holders.size), holders)
+        block_start = np.repeat(np.cumsum(holders) - holders, holders)
+        column_start = np.repeat(np.repeat(by_stock.indptr[start:stop], batch), holders)
+        right = np.arange(len(left)) - block_start + column_start
+
+        # bincount over the batch's span of flat pair keys instead of np.add.at, which
+        # is unbuffered and far slower on older NumPy; the temporary spans only that range
+        pairs = by_stock.indices[left].astype(np.int64) * size + by_stock.indices[right]
+        low = pairs.min()
+        sums = np.bincount(pairs - low, weights=np.minimum(by_stock.data[left], by_stock.data[right]))
+        overlap[low:low + len(sums)] += sums
+        start = stop
+
+    return overlap.reshape(size, size)
+
+
+def _pearson(weights, n_stocks):
+    # Sparse covariance: (XᵀX - n·μμᵀ) / (n - 1) never densifies the zero cells
+    gram = (weights @ weights.T).toarray()
+    sums = np.asarray(weights.sum(axis=1)).ravel()
+    cov = (gram - np.outer(sums, sums) / n_stocks) / (n_stocks - 1)
+    std = np.sqrt(np.clip(np.diag(cov), 0, None))
+    corr = cov / np.outer(std, std)
+    np.fill_diagonal(corr, np.where(std > 0, 1.0, np.nan))
+    return corr
+
+
+def _cosine(weights, n_stocks):
+    gram = (weights @ weights.T).toarray()
+    norms = np.sqrt(np.diag(gram))
+    return gram / np.outer(norms, norms)
+
+
+def _jaccard(weights, n_stocks):
+    # Held positions that round to 0.00% still count, as in the ownership matrix
+    owned = sparse.csr_matrix(
+        (np.ones(weights.nnz, dtype=np.int32), weights.indices, weights.indptr), shape=weights.shape
+    )
+    common = (owned @ owned.T).toarray()
+    sizes = np.diag(common)
+    return common / (sizes[:, None] + sizes[None, :] - common)
+
+
+def _weighted_overlap(weights, n_stocks):
+    # Shares of each portfolio (inside the filtered stocks) so identical portfolios score 1
+    totals = np.asarray(weights.sum(axis=1)).ravel()
+    scale = np.divide(1.0, totals, out=np.zeros_like(totals), where=totals > 0)
+    overlap = _pairwise_min(sparse.diags(scale) @ weights)
+
+    # Like the other metrics, a portfolio with nothing left in the filtered stocks is undefined
+    empty = totals <= 0
+    overlap[empty, :] = np.nan
+    overlap[:, empty] = np.nan
+    return overlap
+
+
+# Metric name -> function(weights CSR investors × stocks, number of stocks)
+SIMILARITY_METRICS = {
+    'pearson': _pearson,
+    'cosine': _cosine,
+    'jaccard': _jaccard,
+    'weighted_overlap': _weighted_overlap,
+}
+
+# Metrics over held positions, where a 0.00% weight still counts as a holder
+OWNERSHIP_METRICS = ('jaccard', 'weighted_overlap')
+
+
+def similarity_matrix(matrix, investors, metric='pearson', min_common=1):
+    """Matriz inversor × inversor de similitud entre carteras calculada sobre la matriz dispersa
+
+    Como la antigua pivot_table + corr(): solo entran los inversores con alguna posición
+    y las acciones que al menos `min_common` de ellos tienen (todas las poseídas si
+    ninguna llega al mínimo). Pearson y coseno cuentan solo los pesos positivos; las
+    métricas de OWNERSHIP_METRICS, toda posición.
+    """
+    rows = np.sort(matrix.investor_codes(investors))
+    owned = matrix.ownership[rows]
+    active = owned.getnnz(axis=1) > 0
+    rows, owned = rows[active], owned[active]
+    weights = matrix.weights[rows].astype(np.float64)
+
+    # The min_common cut is a column mask on the sparse slice, applied before any product
+    holders = owned.getnnz(axis=0) if metric in OWNERSHIP_METRICS else (weights > 0).getnnz(axis=0)
+    cols = np.flatnonzero(holders >= min_common)
+    if len(cols) == 0:
+        cols = np.flatnonzero(owned.getnnz(axis=0) > 0)
+    weights = weights[:, cols].tocsr()
+
+    names = pd.Index(matrix.investors[rows], name='Investor')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values = SIMILARITY_METRICS[metric](weights, len(cols))
+    return pd.DataFrame(values, index=names, columns=names)
+
+
+class InvestorNeighbors:
+    """Índice de vecinos más cercanos sobre los vectores de pesos normalizados por fila"""
+
+    def __init__(self, matrix):
+        self.investors = matrix.investors
+        self.ownership = matrix.ownership.astype(np.int32)
+
+        # Unit-length rows turn every dot product into a cosine similarity
+        weights = matrix.weights.astype(np.float64)
+        norms = np.sqrt(np.asarray(weights.multiply(weights).sum(axis=1)).ravel())
+        scale = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+        self.vectors = (sparse.diags(scale) @ weights).tocsr()
+
+    def query(self, investor, k=10):
+        """Los k inversores más parecidos a `investor`, con su similitud y acciones en común"""
+        code = self.investors.get_loc(investor)
+
+        # One sparse mat-vec scores the whole universe; cost is the nnz it touches
+        scores = (self.vectors @ self.vectors[code].T).toarray().ravel()
+        scores[code] = -np.inf
+        neighbours = top_k(scores, k)
+        neighbours = neighbours[scores[neighbours] > 0]
+
+        common = (self.ownership[neighbours] @ self.ownership[code].T).toarray().ravel()
+        return pd.DataFrame({
+            'Investor': self.investors[neighbours],
+            'Similitud': scores[neighbours],
+            'Acciones_Comunes': common,
+        })
+
+
+class HolderMasks:
+    """Máscara de bits de poseedores por acción sobre un grupo de inversores (regiones UpSet)
+
+    El bit i de una acción está activo si la tiene el i-ésimo inversor del grupo. Las
+    acciones con la misma máscara forman una región exacta de intersección, así que
+    comunes, únicas y cualquier combinación salen de una sola agrupación.
+    """
+
+    def __init__(self, matrix, investors):
+        rows = matrix.investor_codes(investors)
+        self.investors = pd.Index(matrix.investors[rows], name='Investor')
+        held = matrix.ownership[rows].tocoo()
+
+        # One 64-bit word per 64 investors, so the group size is not capped by the mask width
+        words = max(1, -(-len(rows) // 64))
+        masks = np.zeros((matrix.ownership.shape[1], words), dtype=np.uint64)
+        bits = np.left_shift(np.uint64(1), (held.row % 64).astype(np.uint64))
+        np.bitwise_or.at(masks, (held.col, held.row // 64), bits)
+
+        held_stocks = np.flatnonzero(masks.any(axis=1))
+        self.stocks = matrix.stocks[held_stocks]
+        regions, self.stock_region, self.counts = np.unique(
+            masks[held_stocks], axis=0, return_inverse=True, return_counts=True
+        )
+        self.stock_region = self.stock_region.ravel()
+
+        # Decode each distinct mask back into a region × investor membership table
+        positions = np.arange(len(rows))
+        self.membership = ((regions[:, positions // 64] >> (positions % 64).astype(np.uint64)) & np.uint64(1)).astype(bool)
+        self.degree = self.membership.sum(axis=1)
+
+    def regions(self):
+        """Una fila por región: quién la forma, cuántas acciones tiene y su grado, de mayor a menor"""
+        table = pd.DataFrame(self.membership, columns=self.investors)
+        table['Acciones'] = self.counts
+        table['Grado'] = self.degree
+        return table.sort_values(['Acciones', 'Grado'], ascending=[False, False], kind='stable')
+
+    def region_stocks(self, region):
+        """Acciones de una región"""
+        return self.stocks[self.stock_region == region]
+
+    def common(self):
+        """Acciones que tienen todos los inversores del grupo"""
+        full = np.flatnonzero(self.degree == len(self.investors))
+        return self.region_stocks(full[0]) if len(full) else self.stocks[:0]
+
+    def unique_counts(self):
+        """Acciones que solo tiene cada inversor del grupo"""
+        single = self.degree == 1
+        counts = self.membership[single].T.astype(np.int64) @ self.counts[single]
+        return pd.Series(counts, index=self.investors, name='Posiciones Únicas')
@@ -0,0 +1,117 @@
+"""Mapa de estilos: SVD truncada aleatorizada de la matriz dispersa inversor × acción"""
+import os
+
+import numpy as np
+from scipy import sparse
+
+from data_loader import SNAPSHOT_DIR, write_atomic
+
+# Latent dimensions kept on disk; the map shows the first two or three
+STYLE_RANK = 8
+
+
+def _unit_rows(weights):
+    """Pesos con cada fila escalada a norma 1, para que el estilo no dependa del tamaño de la cartera"""
+    weights = sparse.csr_matrix(weights, dtype=np.float64)
+    norms = np.sqrt(np.asarray(weights.multiply(weights).sum(axis=1)).ravel())
+    scale = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    return (sparse.diags(scale) @ weights).tocsr()
+
+
+def randomized_svd(matrix, rank, oversample=10, n_iter=4, seed=0):
+    """(U, s, Vᵀ) de rango `rank` por proyección aleatoria (Halko et al.), sin densificar `matrix`"""
+    rng = np.random.default_rng(seed)
+    sketch = min(rank + oversample, *matrix.shape)
+
+    # Range finder: only sparse × dense products, re-orthonormalised every power step
+    basis, _ = np.linalg.qr(matrix @ rng.standard_normal((matrix.shape[1], sketch)))
+    for _ in range(n_iter):
+        basis, _ = np.linalg.qr(matrix.T @ basis)
+        basis, _ = np.linalg.qr(matrix @ basis)
+
+    small_u, s, vt = np.linalg.svd((matrix.T @ basis).T, full_matrices=False)
+    u = basis @ small_u
+    rank = min(rank, len(s))
+
+    # Fix each component's sign so refits and reloads agree: largest loading positive
+    signs = np.sign(vt[np.arange(len(vt)), np.abs(vt).argmax(axis=1)])
+    signs[signs == 0] = 1
+    return u[:, :rank] * signs[:rank], s[:rank], vt[:rank] * signs[:rank, None]
+
+
+class StyleFactors:
+    """Factores latentes de estilo por inversor y cargas por acción
+
+    Las coordenadas de un inversor son su fila de pesos normalizada proyectada sobre
+    las cargas (x·V = u·s), así que una cartera nueva o filtrada se sitúa en el mismo
+    mapa con un solo producto disperso, sin volver a factorizar.
+    """
+
+    def __init__(self, investors, stocks, loadings, singular_values, total_energy):
+        self.investors = investors
+        self.stocks = stocks
+        self.loadings = loadings
+        self.singular_values = singular_values
+        self.total_energy = total_energy
+
+    @classmethod
+    def fit(cls, matrix, rank=STYLE_RANK, seed=0):
+        """Factorizar los pesos de un HoldingsMatrix"""
+        weights = _unit_rows(matrix.weights)
+        _, s, vt = randomized_svd(weights, rank, seed=seed)
+        return cls(np.asarray(matrix.investors, dtype=str), np.asarray(matrix.stocks, dtype=str),
+                   vt.T, s, float(weights.multiply(weights).sum()))
+
+    def fold_in(self, weights):
+        """Coordenadas latentes de filas de pesos sobre las mismas columnas de acciones"""
+        return _unit_rows(weights) @ self.loadings
+
+    def explained(self):
+        """Fracción de la energía (norma de Frobenius²) que recoge cada dimensión"""
+        if self.total_energy <= 0:
+            return np.zeros_like(self.singular_values)
+        return self.singular_values ** 2 / self.total_energy
+
+    def save(self, path):
+        def write(tmp_path):
+            # A file handle keeps np.savez from appending ".npz" to the temp name
+            with open(tmp_path, 'wb') as fh:
+                np.savez(fh, investors=self.investors, stocks=self.stocks, loadings=self.loadings,
+                         singular_values=self.singular_values, total_energy=self.total_energy)
+        write_atomic(path, write)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['investors'], data['stocks'], data['loadings'],
+                       data['singular_values'], float(data['total_energy']))
+
+
+def load_style_factors(store, rank=STYLE_RANK, snapshot_dir=SNAPSHOT_DIR):
+    """Factores de la instantánea del store, leídos de disco o calculados y guardados una vez"""
+    path = os.path.join(snapshot_dir, f"styles-{store.snapshot}-k{rank}.npz")
+    investors = np.asarray(store.matrix.investors, dtype=str)
+    stocks = np.asarray(store.matrix.stocks, dtype=str)
+
+    if os.path.exists(path):
+        try:
+            factors = StyleFactors.load(path)
+            # The snapshot key already pins the data; the labels guard against a hand-copied file
+            if np.array_equal(factors.investors, investors) and np.array_equal(factors.stocks, stocks):
+                return factors
+        except (OSError, ValueError, KeyError):
+            pass
+
+    factors = StyleFactors.fit(store.matrix, rank)
+    try:
+        os.makedirs(snapshot_dir, exist_ok=True)
+        factors.save(path)
+
+        # Drop factorizations of older snapshots
+        for name in os.listdir(snapshot_dir):
+            if name.startswith('styles-') and name.endswith('.npz') and name != os.path.basename(path):
+                os.remove(os.path.join(snapshot_dir, name))
+    except OSError:
+        # A read-only checkout just refits once per process
+        pass
+    return factors
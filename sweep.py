@@ -0,0 +1,75 @@
+"""Barrido del umbral de peso mínimo con pesos ordenados y sumas prefijas"""
+import numpy as np
+import pandas as pd
+
+# Thresholds the sweep chart evaluates: the slider's whole 0-50% range in its 0.5 steps
+SWEEP_THRESHOLDS = np.arange(0, 50.5, 0.5)
+
+
+class ThresholdSweep:
+    """Pesos ordenados dentro de cada grupo con sumas prefijas de posiciones y valor
+
+    Las posiciones de un grupo con peso >= t son las que quedan a la derecha de
+    searchsorted(t) en su tramo, así que cualquier umbral (o una rejilla entera de
+    umbrales) se responde sin volver a filtrar las filas.
+    """
+
+    def __init__(self, group_codes, groups, weights, values):
+        self.groups = groups
+        keep = ~np.isnan(weights) & (group_codes >= 0)
+        group_codes, weights, values = group_codes[keep], weights[keep], values[keep]
+
+        # One sorted key per row, group * span + weight, so a single searchsorted
+        # call answers every (group, threshold) pair at once
+        order = np.lexsort((weights, group_codes))
+        self._span = float(np.ceil(weights.max()) + 1) if len(weights) else 1.0
+        self._keys = group_codes[order] * self._span + weights[order]
+        self._ends = np.searchsorted(self._keys, (np.arange(len(groups)) + 1) * self._span, side='left')
+        self._value_prefix = np.concatenate(([0.0], np.cumsum(values[order])))
+
+    def _starts(self, thresholds):
+        """Primera posición con peso >= umbral de cada grupo: matriz grupos × umbrales"""
+        thresholds = np.atleast_1d(np.asarray(thresholds, dtype=np.float64))
+        # Weights are never negative and stay below the span, so clipping keeps every
+        # target inside its own group's stretch of keys
+        thresholds = np.clip(thresholds, 0, self._span)
+        targets = np.arange(len(self.groups))[:, None] * self._span + thresholds[None, :]
+        return np.searchsorted(self._keys, targets, side='left')
+
+    def counts(self, thresholds):
+        """Posiciones con peso >= cada umbral, por grupo (grupos × umbrales)"""
+        return self._ends[:, None] - self._starts(thresholds)
+
+    def values(self, thresholds):
+        """Valor de las posiciones con peso >= cada umbral, por grupo (grupos × umbrales)"""
+        return self._value_prefix[self._ends][:, None] - self._value_prefix[self._starts(thresholds)]
+
+
+def threshold_sweeps(frame, activity_filter):
+    """Barridos por inversor y por acción para las actividades seleccionadas"""
+    rows = frame['Activity_Type'].isin(activity_filter).to_numpy()
+    weights = frame['% of Portfolio'].to_numpy(dtype=np.float64)[rows]
+    values = np.nan_to_num(frame['Value_Clean'].to_numpy(dtype=np.float64)[rows])
+
+    sweeps = {}
+    for column in ('Investor', 'Stock'):
+        codes = frame[column].cat.codes.to_numpy().astype(np.int64)[rows]
+        groups = pd.Index(frame[column].cat.categories, name=column)
+        sweeps[column] = ThresholdSweep(codes, groups, weights, values)
+    return sweeps['Investor'], sweeps['Stock']
+
+
+def sweep_summary(investor_sweep, stock_sweep, stocks, thresholds=SWEEP_THRESHOLDS):
+    """Inversores, AUM y posiciones de las acciones dadas en cada umbral, en una sola pasada"""
+    investor_counts = investor_sweep.counts(thresholds)
+    summary = pd.DataFrame({
+        'Umbral': thresholds,
+        'Inversores': np.count_nonzero(investor_counts, axis=0),
+        'AUM': investor_sweep.values(thresholds).sum(axis=0),
+    })
+
+    stock_codes = stock_sweep.groups.get_indexer(stocks)
+    holders = stock_sweep.counts(thresholds)[stock_codes[stock_codes >= 0]]
+    for stock, counts in zip(stock_sweep.groups[stock_codes[stock_codes >= 0]], holders):
+        summary[stock] = counts
+    return summary
@@ -0,0 +1,45 @@
+"""Posiciones repetidas: el cubo, la matriz y el índice de acciones las cuentan igual"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_loader import ACTIVITY_TYPES, CSV_PATH, clean_holdings
+from holdings_store import HoldingsStore
+
+
+@pytest.fixture(scope='module')
+def raw():
+    return pd.read_csv(CSV_PATH)
+
+
+@pytest.fixture(scope='module')
+def repeated(raw):
+    """Frame limpio con 50 posiciones declaradas dos veces, la copia con otro peso"""
+    copies = raw.sample(50, random_state=0)
+    copies = copies.assign(**{'% of Portfolio': copies['% of Portfolio'] * 2})
+    return clean_holdings(pd.concat([raw, copies], ignore_index=True))
+
+
+def test_structures_share_one_holder_count(repeated):
+    store = HoldingsStore(repeated, 'test')
+    counts = store.cube.stock_totals(ACTIVITY_TYPES, 0)['Num_Inversores']
+    distinct = repeated.groupby('Stock', observed=True)['Investor'].nunique()
+
+    assert len(store) == len(repeated.drop_duplicates(['Investor', 'Stock']))
+    assert counts.to_dict() == distinct.to_dict()
+    held = store.stocks.get_indexer(counts.index)
+    assert (store.stock_index.holder_counts[held] == counts.to_numpy()).all()
+    assert (store.matrix.ownership.getnnz(axis=0)[held] == counts.to_numpy()).all()
+
+
+def test_repeated_positions_keep_the_mean_weight(repeated):
+    store = HoldingsStore(repeated, 'test')
+    expected = repeated.pivot_table(index='Investor', columns='Stock', values='% of Portfolio',
+                                    aggfunc='mean', observed=True)
+    weights = store.matrix.pivot(expected.index).reindex(index=expected.columns, columns=expected.index)
+    assert np.allclose(weights.to_numpy(), expected.fillna(0).T.to_numpy(), rtol=1e-6)
+
+
+def test_clean_file_is_left_as_is(raw):
+    frame = clean_holdings(raw)
+    assert len(HoldingsStore(frame, 'test')) == len(frame)
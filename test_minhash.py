@@ -0,0 +1,95 @@
+"""MinHash/LSH frente al recuento exacto de solapamientos B·Bᵀ"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_loader import CSV_PATH, clean_holdings
+from holdings_store import HoldingsStore
+from minhash import MIN_BAND_ROWS, TARGET_RECALL, MinHashSignatures, lsh_bands, min_lsh_threshold
+from similarity import common_holdings
+
+
+@pytest.fixture(scope='module')
+def ownership():
+    """Propiedad del CSV más tres clones que conservan cada uno la mitad de sus posiciones"""
+    raw = pd.read_csv(CSV_PATH)
+    rng = np.random.default_rng(0)
+    clones = [raw.assign(Investor=raw['Investor'] + f" #{copy}")[rng.random(len(raw)) < 0.5] for copy in range(3)]
+    frame = clean_holdings(pd.concat([raw, *clones], ignore_index=True))
+    return HoldingsStore(frame, 'test').matrix.ownership
+
+
+def _exact_jaccard(ownership):
+    common = common_holdings(ownership).toarray().astype(np.float64)
+    sizes = np.diag(common)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return common / (sizes[:, None] + sizes[None, :] - common)
+
+
+@pytest.mark.parametrize('num_perm', [64, 128, 256])
+def test_lsh_bands_never_use_single_row_bands(num_perm):
+    for threshold in np.arange(0.05, 0.95, 0.05):
+        banding = lsh_bands(num_perm, threshold)
+        if banding is None:
+            continue
+        bands, rows = banding
+        assert rows >= MIN_BAND_ROWS and bands * rows == num_perm
+        assert 1 - (1 - threshold ** rows) ** bands >= TARGET_RECALL
+
+
+def test_low_threshold_refuses_lsh(ownership):
+    signatures = MinHashSignatures(ownership, 64)
+    assert lsh_bands(64, 0.1) is None
+    with pytest.raises(ValueError):
+        signatures.similar_pairs(np.arange(ownership.shape[0]), 0.1)
+
+
+@pytest.mark.parametrize('num_perm', [64, 128, 256])
+def test_min_lsh_threshold_is_the_first_supported(num_perm):
+    threshold = min_lsh_threshold(num_perm)
+    assert lsh_bands(num_perm, threshold) is not None
+    assert lsh_bands(num_perm, round(threshold - 0.05, 10)) is None
+
+
+def test_candidates_are_the_band_collisions(ownership):
+    signatures = MinHashSignatures(ownership, 128)
+    rows = np.arange(ownership.shape[0])
+    bands, band_rows = lsh_bands(128, 0.3)
+
+    expected = set()
+    for band in range(bands):
+        buckets = {}
+        for row in rows:
+            key = signatures.signatures[row, band * band_rows:(band + 1) * band_rows].tobytes()
+            buckets.setdefault(key, []).append(row)
+        expected.update((a, b) for members in buckets.values() for k, a in enumerate(members) for b in members[k + 1:])
+
+    i, j = signatures.candidate_pairs(rows, bands)
+    assert set(zip(i.tolist(), j.tolist())) == expected
+    # Candidate generation must prune: far fewer than all pairs
+    assert len(expected) < len(rows) * (len(rows) - 1) / 2 / 4
+
+
+@pytest.mark.parametrize('num_perm', [128, 256])
+def test_similar_pairs_match_exact_overlap(ownership, num_perm):
+    threshold = 0.3
+    exact = _exact_jaccard(ownership)
+    signatures = MinHashSignatures(ownership, num_perm)
+    rows = np.arange(ownership.shape[0])
+    upper_i, upper_j = np.triu_indices(len(rows), k=1)
+
+    # The estimator's standard error is at most 0.5/sqrt(num_perm)
+    error = np.abs(signatures.jaccard(upper_i, upper_j) - np.nan_to_num(exact[upper_i, upper_j]))
+    assert error.mean() <= 1 / np.sqrt(num_perm)
+
+    i, j, jaccard, common = signatures.similar_pairs(rows, threshold)
+    assert (jaccard >= threshold).all()
+    assert np.allclose(jaccard, signatures.jaccard(i, j))
+
+    # Pairs clearly above the threshold are all found; their common counts are close
+    found = set(zip(i.tolist(), j.tolist()))
+    clear = exact[upper_i, upper_j] >= threshold + 0.1
+    assert clear.any()
+    assert set(zip(upper_i[clear].tolist(), upper_j[clear].tolist())) <= found
+    exact_common = common_holdings(ownership).toarray()[i, j]
+    assert np.median(np.abs(common - exact_common) / exact_common) < 0.15
@@ -0,0 +1,66 @@
+"""Recorte de precisión de las figuras: jerarquías válidas para Plotly.js"""
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+import pytest
+
+from analytics import top_k_per_group
+from data_loader import CSV_PATH, clean_holdings
+from hierarchy import sunburst_hierarchy
+from payload import collapse_tail, trim_precision
+
+# Plotly.js ALMOST_EQUAL: a parent may fall short of its children's sum by 1e-9 at most
+ALMOST_EQUAL = 1 - 1e-9
+
+
+@pytest.fixture(scope='module')
+def holdings():
+    return clean_holdings(pd.read_csv(CSV_PATH))
+
+
+def _short_parents(trace):
+    """Ids de los nodos cuyo valor queda por debajo de la suma de sus hijos"""
+    ids, values = np.asarray(trace.ids), np.asarray(trace.values, dtype=np.float64)
+    children = pd.Series(values).groupby(np.asarray(trace.parents)).sum()
+    children = children[children.index != '']
+    parent_values = pd.Series(values, index=ids).loc[children.index]
+    return list(children.index[parent_values < children * ALMOST_EQUAL])
+
+
+@pytest.mark.parametrize('n_investors', [5, 10, 20])
+def test_trimmed_sunburst_parents_cover_children(holdings, n_investors):
+    investors = list(holdings['Investor'].cat.categories[:n_investors])
+    nodes = sunburst_hierarchy(top_k_per_group(holdings[holdings['Investor'].isin(investors)], 15, groups=investors))
+    figure = trim_precision(go.Figure(go.Sunburst(
+        ids=nodes['ids'], parents=nodes['parents'], labels=nodes['labels'], values=nodes['values'],
+        branchvalues='total'
+    )))
+    assert _short_parents(figure.data[0]) == []
+
+
+def test_trimmed_treemaps_parents_cover_children(holdings):
+    for investor, positions in holdings.groupby('Investor', observed=True):
+        # Same frame as the individual view's treemap, "Otros" buckets included
+        treemap_df = collapse_tail(positions, 150, '% of Portfolio', 'Stock',
+                                   by=['Activity_Type'], means=['Activity_Percentage'])
+        figure = trim_precision(px.treemap(treemap_df, path=['Activity_Type', 'Stock'], values='% of Portfolio'))
+        assert _short_parents(figure.data[0]) == [], investor
+
+
+def test_cartesian_arrays_are_narrowed():
+    figure = trim_precision(go.Figure(go.Scatter(x=np.array([1.5, 2.5, 3.5]), y=np.array([0.1, 0.2, 0.3]))))
+    assert figure.data[0].x.dtype == np.float32 and figure.data[0].y.dtype == np.float32
+
+
+def test_large_dollar_values_survive_trimming():
+    # Shown with ':$,.0f', so every integer digit is on screen
+    frame = pd.DataFrame({'Posiciones': [3, 40, 12], 'HHI': [0.25, 0.5, 0.125],
+                          'Valor_Total': [123456789012.0, 98765432.0, 1500.0]})
+    figure = trim_precision(px.scatter(frame, x='Posiciones', y='HHI', hover_data={'Valor_Total': ':$,.0f'}))
+    assert np.array_equal(np.asarray(figure.data[0].customdata, dtype=np.float64).ravel(), frame['Valor_Total'].to_numpy())
+
+    mixed = np.array([['Berkshire', 123456789012.0], ['Pershing', 0.1234567891]], dtype=object)
+    figure = trim_precision(go.Figure(go.Scatter(x=[1, 2], y=[1, 2], customdata=mixed)))
+    assert figure.data[0].customdata[0][1] == 123456789012.0
+    assert figure.data[0].customdata[1][1] == 0.123457
@@ -0,0 +1,44 @@
+"""Similitud entre carteras frente a una referencia con conjuntos de acciones"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_loader import CSV_PATH, clean_holdings
+from holdings_store import HoldingsStore
+from similarity import similarity_matrix
+
+
+@pytest.fixture(scope='module')
+def holdings():
+    return clean_holdings(pd.read_csv(CSV_PATH))
+
+
+@pytest.fixture(scope='module')
+def matrix(holdings):
+    return HoldingsStore(holdings, 'test').matrix
+
+
+def _set_jaccard(holdings, investors, min_common):
+    """Jaccard sobre las acciones que al menos `min_common` del grupo poseen, peso 0 incluido"""
+    group = holdings[holdings['Investor'].isin(investors)]
+    holders = group.groupby('Stock', observed=True)['Investor'].nunique()
+    stocks = set(holders.index[holders >= min_common])
+    held = {investor: set(positions['Stock']) & stocks for investor, positions in group.groupby('Investor', observed=True)}
+    names = sorted(held)
+    return pd.DataFrame(
+        [[len(held[a] & held[b]) / len(held[a] | held[b]) if held[a] | held[b] else np.nan for b in names] for a in names],
+        index=names, columns=names
+    )
+
+
+@pytest.mark.parametrize('min_common', [1, 2, 3])
+def test_jaccard_matches_set_overlap(holdings, matrix, min_common):
+    # Investors with 0.00% positions are the case where weights and ownership disagree
+    zero = holdings.loc[holdings['% of Portfolio'] == 0, 'Investor'].unique()
+    assert len(zero)
+    investors = list(dict.fromkeys([*zero[:10], *holdings['Investor'].cat.categories[:20]]))
+
+    result = similarity_matrix(matrix, investors, 'jaccard', min_common)
+    expected = _set_jaccard(holdings, investors, min_common)
+    result = result.loc[expected.index, expected.columns]
+    assert np.allclose(result.to_numpy(), expected.to_numpy(), equal_nan=True)